@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Rayvn backend comparison
+
+Compiles every program in benchmarks/programs/ for each backend from
+the same optimized AST, checks that they print the same output, and
+times compile and run separately:
+
+    stack      Compiler + Peephole + assemble, run on VM
+    tiered     the same bytecode, run on VM with tiering (hot code
+               moves to closures; its compile is part of the run time)
+    register   RegisterCompiler, run on RegisterVM
+    closure    ClosureCompiler, run as nested Python closures
+    python     Transpiler, run as a compiled Python module
+
+Each time is the best of --repeat runs; run times are also shown as a
+speedup over the stack VM. Exits with status 1 if any program's output
+differs between the backends.
+
+    python3 benchmarks/backends.py
+    python3 benchmarks/backends.py -k fib --repeat 10 -O 0
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+from compiler.optimizer import Optimizer, DEFAULT_OPT_LEVEL
+from compiler.ByteCode.compiler import Compiler
+from compiler.ByteCode.peephole import Peephole
+from compiler.ByteCode.code_object import assemble
+from compiler.ByteCode.vm import VM
+from compiler.ByteCode.tiering import Tiering
+from compiler.Register.compiler import RegisterCompiler
+from compiler.Register.vm import RegisterVM
+from compiler.Closure.compiler import ClosureCompiler
+from compiler.Transpiler.transpiler import Transpiler
+
+
+PROGRAM_DIR = os.path.join(BENCH_DIR, "programs")
+
+
+# ---------------------------------------------------------
+# Backends
+# ---------------------------------------------------------
+
+def compile_stack(ast, opt_level):
+    compiler = Compiler()
+    compiler.compile(ast)
+
+    code = compiler.code
+    if opt_level >= 1:
+        code = Peephole().optimize(code, compiler.functions, compiler.loops)
+
+    return assemble(code, compiler.functions, compiler.globals, compiler.loops)
+
+
+def compile_tiered(ast, opt_level):
+    # Tier 1 gets the AST the bytecode came from (already folded at
+    # -O1 and up) instead of parsing the file again
+    return compile_stack(ast, opt_level), ast
+
+
+def run_tiered(compiled):
+    program, ast = compiled
+    return VM(program, tiering=Tiering(lambda: ast), memo_size=0).run()
+
+
+def compile_register(ast, opt_level):
+    return RegisterCompiler().compile(ast)
+
+
+def compile_closure(ast, opt_level):
+    return ClosureCompiler().compile(ast)
+
+
+def compile_python(ast, opt_level):
+    # Includes CPython's compile(); the .rvpy cache skips both
+    return Transpiler().compile(ast)
+
+
+# name -> (compile, run). The stack VM runs without memoization, which
+# the other backends don't have, so all of them do the same work.
+BACKENDS = {
+    "stack": (compile_stack, lambda program: VM(program, memo_size=0).run()),
+    "tiered": (compile_tiered, run_tiered),
+    "register": (compile_register, lambda code: RegisterVM(code).run()),
+    "closure": (compile_closure, lambda program: program.run()),
+    "python": (compile_python, lambda program: program.run()),
+}
+
+
+# ---------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def measure(ast, backend, opt_level, repeat):
+    """
+    Best compile and run times and the printed output.
+    """
+    compile_fn, run_fn = BACKENDS[backend]
+    best_compile = best_run = None
+
+    for _ in range(repeat):
+        # No compiler modifies the AST, so it is shared by all runs
+        program, compile_time = timed(lambda: compile_fn(ast, opt_level))
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            _, run_time = timed(lambda: run_fn(program))
+
+        best_compile = compile_time if best_compile is None else min(best_compile, compile_time)
+        best_run = run_time if best_run is None else min(best_run, run_time)
+
+    return best_compile, best_run, out.getvalue()
+
+
+# ---------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Rayvn backends.")
+    parser.add_argument("-k", dest="filter", help="only run programs whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per backend, best is kept (default 5)")
+    parser.add_argument("-O", dest="opt_level", type=int, default=DEFAULT_OPT_LEVEL, help="optimization level")
+    args = parser.parse_args(argv)
+
+    header = f"{'program':<16}" + "".join(f"{name + ' cc':>13}" for name in BACKENDS)
+    header += "".join(f"{name + ' run':>19}" for name in BACKENDS)
+    print(header)
+    print("-" * len(header))
+
+    mismatches = []
+    for filename in sorted(os.listdir(PROGRAM_DIR)):
+        name = filename[:-3]
+        if not filename.endswith(".rv") or (args.filter and args.filter not in name):
+            continue
+
+        with open(os.path.join(PROGRAM_DIR, filename)) as f:
+            source = f.read()
+        ast = Optimizer(args.opt_level).optimize(Parser(Lexer(source).tokenize()).parse())
+
+        results = {backend: measure(ast, backend, args.opt_level, args.repeat) for backend in BACKENDS}
+        if len({out for _, _, out in results.values()}) > 1:
+            mismatches.append(name)
+
+        row = f"{name:<16}"
+        for compile_time, _, _ in results.values():
+            row += f"{compile_time * 1000:>11.2f}ms"
+        base = results["stack"][1]
+        for _, run_time, _ in results.values():
+            row += f"{run_time * 1000:>10.1f}ms ({base / run_time:>4.1f}x)"
+        print(row)
+
+    if mismatches:
+        print(f"\nOUTPUT MISMATCH: {', '.join(mismatches)}")
+        return 1
+
+    print("\noutputs identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
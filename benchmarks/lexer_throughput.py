@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Lexer throughput: tokens/sec of compiler.lexer.Lexer against the
+original character-at-a-time implementation (reference_lexer.py).
+
+Every input is first checked to produce an identical token stream
+(type and value) from both lexers.
+
+--memory adds the bytes each token of the Lexer output keeps alive
+(the Token plus its value and position ints), measured with
+tracemalloc in a separate, untimed run.
+
+    python3 benchmarks/lexer_throughput.py
+    python3 benchmarks/lexer_throughput.py --scale 10 --repeat 3
+    python3 benchmarks/lexer_throughput.py --memory
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from compiler.lexer import Lexer
+from reference_lexer import ReferenceLexer
+from run import GENERATED, PROGRAM_DIR
+
+
+def stream(tokens):
+    return [(tok.type, tok.value) for tok in tokens]
+
+
+def best_time(lexer_class, source, repeat):
+    best = None
+    tokens = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = lexer_class(source).tokenize()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, tokens
+
+
+def bytes_per_token(source):
+    tracemalloc.start()
+    try:
+        tokens = Lexer(source).tokenize()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size / len(tokens)
+
+
+def inputs(scale):
+    programs = []
+    for filename in sorted(os.listdir(PROGRAM_DIR)):
+        if filename.endswith(".rv"):
+            with open(os.path.join(PROGRAM_DIR, filename)) as f:
+                programs.append(f.read())
+
+    yield "programs x200", "\n".join(programs) * 200 * scale
+
+    for name, make in GENERATED.items():
+        yield name, make(scale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="input size multiplier")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per lexer, best is kept")
+    parser.add_argument("--memory", action="store_true", help="also report bytes per token")
+    args = parser.parse_args(argv)
+
+    header = f"{'input':<18}{'MB':>7}{'tokens':>10}{'reference tok/s':>18}{'lexer tok/s':>14}{'speedup':>9}"
+    if args.memory:
+        header += f"{'B/token':>9}"
+    print(header)
+
+    for name, source in inputs(args.scale):
+        ref_time, ref_tokens = best_time(ReferenceLexer, source, args.repeat)
+        new_time, new_tokens = best_time(Lexer, source, args.repeat)
+
+        if stream(ref_tokens) != stream(new_tokens):
+            raise SystemExit(f"{name}: token streams differ")
+
+        count = len(new_tokens)
+        del ref_tokens, new_tokens
+
+        row = (
+            f"{name:<18}{len(source) / 1e6:>7.2f}{count:>10}"
+            f"{count / ref_time:>18,.0f}{count / new_time:>14,.0f}{ref_time / new_time:>8.1f}x"
+        )
+        if args.memory:
+            row += f"{bytes_per_token(source):>9.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
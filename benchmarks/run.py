@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Rayvn benchmark runner
+
+Times every pipeline phase separately for each benchmark:
+
+    tokenize   Lexer.tokenize
+    parse      Parser.parse
+    optimize   Optimizer.optimize
+    compile    Compiler.compile
+    peephole   Peephole.optimize
+    assemble   code_object.assemble
+    run        VM.run
+
+Benchmarks are the .rv programs in benchmarks/programs/ plus large
+machine-generated sources that stress the front end (their run phase
+is skipped).
+
+Each phase reports the best of --repeat runs. Results are written as
+JSON and, when a baseline exists, compared phase by phase. A phase
+that is slower than the baseline by more than its threshold counts as
+a regression and the runner exits with status 1.
+
+    python3 benchmarks/run.py                       # run + compare
+    python3 benchmarks/run.py --save-baseline       # record a baseline
+    python3 benchmarks/run.py -k fib --repeat 10    # just fib
+    python3 benchmarks/run.py --threshold 0.05 --phase-threshold run=0.02
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+from compiler.optimizer import Optimizer, DEFAULT_OPT_LEVEL
+from compiler.ByteCode.compiler import Compiler, COMPILER_VERSION
+from compiler.ByteCode.peephole import Peephole
+from compiler.ByteCode.code_object import assemble
+from compiler.ByteCode.vm import VM
+
+
+PROGRAM_DIR = os.path.join(BENCH_DIR, "programs")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+PHASES = ("tokenize", "parse", "optimize", "compile", "peephole", "assemble", "run")
+
+
+# ---------------------------------------------------------
+# Generated front-end workloads
+# ---------------------------------------------------------
+
+def generate_expressions(count):
+    """
+    Many statements with long arithmetic/comparison expressions.
+    """
+    lines = ["let acc = 0"]
+    for i in range(count):
+        lines.append(
+            f"let v{i} = (acc + {i}) * 3 - {i} / 7 + (acc * {i % 13} - 2) * (1 + {i % 5})"
+        )
+        lines.append(f"acc = v{i} > {i} and acc < {i * 2} or acc == {i}")
+    lines.append("log acc")
+    return "\n".join(lines) + "\n"
+
+
+def generate_functions(count):
+    """
+    Many small functions with if/elseif chains, loops and calls.
+    """
+    chunks = []
+    for i in range(count):
+        chunks.append(f"""
+fn f{i}(a, b) {{
+    let t = [a, b, {i}]
+    if a > b {{
+        return t[0] - b
+    }} elseif a == b {{
+        for k in range(0, 3) {{
+            t[k] = t[k] * 2
+        }}
+        return t[2]
+    }} else {{
+        while a < b {{
+            a = a + 1
+        }}
+    }}
+    return "f{i}" + "done"
+}}
+log f{i}({i}, {i % 7})
+""")
+    return "".join(chunks)
+
+
+GENERATED = {
+    "gen_expressions": lambda scale: generate_expressions(2000 * scale),
+    "gen_functions": lambda scale: generate_functions(400 * scale),
+}
+
+
+def load_benchmarks(scale):
+    """
+    [(name, source, run?)]
+    """
+    benches = []
+
+    for filename in sorted(os.listdir(PROGRAM_DIR)):
+        if filename.endswith(".rv"):
+            with open(os.path.join(PROGRAM_DIR, filename)) as f:
+                benches.append((filename[:-3], f.read(), True))
+
+    for name, make in GENERATED.items():
+        benches.append((name, make(scale), False))
+
+    return benches
+
+
+# ---------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def measure_once(source, run, opt_level):
+    times = {}
+
+    tokens, times["tokenize"] = timed(lambda: Lexer(source).tokenize())
+    ast, times["parse"] = timed(lambda: Parser(tokens).parse())
+    ast, times["optimize"] = timed(lambda: Optimizer(opt_level).optimize(ast))
+
+    compiler = Compiler()
+    _, times["compile"] = timed(lambda: compiler.compile(ast))
+
+    code = compiler.code
+    if opt_level >= 1:
+        code, times["peephole"] = timed(lambda: Peephole().optimize(code, compiler.functions, compiler.loops))
+    else:
+        times["peephole"] = 0.0
+
+    program, times["assemble"] = timed(lambda: assemble(code, compiler.functions, compiler.globals, compiler.loops))
+
+    info = {"tokens": len(tokens), "instructions": len(program)}
+
+    if run:
+        # Memoization would time cache lookups, not the VM
+        vm = VM(program, memo_size=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, times["run"] = timed(vm.run)
+
+    return times, info
+
+
+def measure(source, run, opt_level, repeat):
+    best = {}
+    info = {}
+
+    for _ in range(repeat):
+        times, info = measure_once(source, run, opt_level)
+        for phase, seconds in times.items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+
+    best["total"] = sum(best.values())
+    return best, info
+
+
+# ---------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------
+
+# Phases faster than this are all noise; never flag them
+MIN_COMPARABLE_SECONDS = 0.001
+
+
+def compare(results, baseline, threshold, phase_thresholds):
+    """
+    Return a list of (benchmark, phase, base, now, change) regressions.
+    """
+    regressions = []
+
+    for name, entry in results["benchmarks"].items():
+        base_entry = baseline.get("benchmarks", {}).get(name)
+        if base_entry is None:
+            continue
+
+        for phase, now in entry["phases"].items():
+            base = base_entry["phases"].get(phase)
+            if base is None or max(base, now) < MIN_COMPARABLE_SECONDS:
+                continue
+
+            change = (now - base) / base if base else 0.0
+            if change > phase_thresholds.get(phase, threshold):
+                regressions.append((name, phase, base, now, change))
+
+    return regressions
+
+
+def print_table(results, baseline):
+    base_benches = baseline.get("benchmarks", {}) if baseline else {}
+
+    header = f"{'benchmark':<16}" + "".join(f"{phase:>11}" for phase in PHASES + ("total",))
+    print(header)
+    print("-" * len(header))
+
+    for name, entry in results["benchmarks"].items():
+        row = f"{name:<16}"
+        for phase in PHASES + ("total",):
+            seconds = entry["phases"].get(phase)
+            row += f"{seconds * 1000:>9.1f}ms" if seconds is not None else f"{'-':>11}"
+        print(row)
+
+        base_entry = base_benches.get(name)
+        if base_entry:
+            row = f"{'  vs baseline':<16}"
+            for phase in PHASES + ("total",):
+                now = entry["phases"].get(phase)
+                base = base_entry["phases"].get(phase)
+                if now is None or not base:
+                    row += f"{'':>11}"
+                else:
+                    row += f"{(now - base) / base * 100:>+10.1f}%"
+            print(row)
+
+
+def parse_phase_thresholds(values):
+    thresholds = {}
+    for value in values:
+        phase, _, limit = value.partition("=")
+        if phase not in PHASES + ("total",) or not limit:
+            raise SystemExit(f"bad --phase-threshold {value!r}, expected PHASE=FRACTION")
+        thresholds[phase] = float(limit)
+    return thresholds
+
+
+# ---------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Rayvn benchmark suite.")
+    parser.add_argument("-k", dest="filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, best is kept (default 5)")
+    parser.add_argument("--scale", type=int, default=1, help="size multiplier for generated sources")
+    parser.add_argument("-O", dest="opt_level", type=int, default=DEFAULT_OPT_LEVEL, help="optimization level")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"), help="results JSON path")
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "baseline.json"), help="baseline JSON path")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown per phase as a fraction (default 0.10)")
+    parser.add_argument("--phase-threshold", action="append", default=[], metavar="PHASE=FRACTION",
+                        help="override the threshold for one phase, e.g. run=0.05")
+    args = parser.parse_args(argv)
+
+    phase_thresholds = parse_phase_thresholds(args.phase_threshold)
+
+    results = {
+        "meta": {
+            "compiler_version": COMPILER_VERSION,
+            "opt_level": args.opt_level,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "scale": args.scale,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": {},
+    }
+
+    for name, source, run in load_benchmarks(args.scale):
+        if args.filter and args.filter not in name:
+            continue
+
+        phases, info = measure(source, run, args.opt_level, args.repeat)
+        results["benchmarks"][name] = {"phases": phases, **info}
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    status = 0
+    if baseline and not args.save_baseline:
+        regressions = compare(results, baseline, args.threshold, phase_thresholds)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for name, phase, base, now, change in regressions:
+                print(f"  {name}.{phase}: {base * 1000:.1f}ms -> {now * 1000:.1f}ms ({change * 100:+.1f}%)")
+            status = 1
+        else:
+            print("no regressions against baseline")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Rayvn bytecode cache (.rvc)
+
+Stores the assembled CodeObject of a program so repeated runs of an
+unchanged script skip the lexer, parser and compiler entirely.
+
+A cache file is only used when it was written by the same compiler
+version, at the same optimization level and AST mode (--flat-ast), for
+byte-identical source. The mode matters to tiering, which parses the
+source again the way the bytecode was compiled.
+Anything else (missing file, corrupt file, stale hash) is treated as a
+miss and recompiled.
+
+By default `foo.rv` caches to `foo.rvc` next to it. Set
+RAYVN_CACHE_DIR to collect cache files in one directory instead.
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+
+from compiler.ByteCode.code_object import CodeObject
+from compiler.ByteCode.compiler import COMPILER_VERSION
+
+
+MAGIC = "RAYVN-RVC"
+CACHE_DIR_ENV = "RAYVN_CACHE_DIR"
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def file_hash(path, chunk_size=1 << 16):
+    """
+    source_hash of a file's text, read a chunk at a time.
+    """
+    digest = hashlib.sha256()
+    with open(path, "r") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_path(path, suffix=".rvc"):
+    """
+    Where the cache for a given source file lives.
+    """
+    path = os.path.abspath(path)
+    base, _ = os.path.splitext(path)
+
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return base + suffix
+
+    # Keep files from different directories apart
+    tag = hashlib.sha256(path.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(base)}-{tag}{suffix}")
+
+
+# ---------------------------------------------------------
+# Serialization
+# ---------------------------------------------------------
+
+def serialize(digest, opt_level, flat, code):
+    return marshal.dumps({
+        "magic": MAGIC,
+        "version": COMPILER_VERSION,
+        "python": sys.implementation.cache_tag,
+        "opt": opt_level,
+        "flat": flat,
+        "hash": digest,
+        "code": code.to_dict(),
+    })
+
+
+def deserialize(data, digest, opt_level, flat):
+    """
+    Return the CodeObject if the blob is valid for the source with this
+    hash, compiler, optimization level and AST mode, otherwise None.
+    """
+    try:
+        blob = marshal.loads(data)
+    except (EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(blob, dict):
+        return None
+    if blob.get("magic") != MAGIC:
+        return None
+    if blob.get("version") != COMPILER_VERSION:
+        return None
+    if blob.get("python") != sys.implementation.cache_tag:
+        return None
+    if blob.get("opt") != opt_level:
+        return None
+    if blob.get("flat") != flat:
+        return None
+    if blob.get("hash") != digest:
+        return None
+
+    try:
+        return CodeObject.from_dict(blob["code"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------
+# File access
+# ---------------------------------------------------------
+
+def load(path, digest, opt_level, flat=False):
+    """
+    Load cached bytecode for `path`, or None on a miss. `digest` is the
+    source_hash/file_hash of the current source.
+    """
+    data = read(cache_path(path))
+    return None if data is None else deserialize(data, digest, opt_level, flat)
+
+
+def store(path, digest, opt_level, code, flat=False):
+    """
+    Write the cache for `path`.
+    """
+    write(cache_path(path), serialize(digest, opt_level, flat, code))
+
+
+def read(target):
+    try:
+        with open(target, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write(target, data):
+    """
+    Failures (read-only directory, full disk) are ignored; the cache
+    is an optimization, never a requirement.
+    """
+    tmp = f"{target}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        # Atomic so a concurrent run never reads a half-written file
+        os.replace(tmp, target)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
@@ -0,0 +1,146 @@
+"""
+Rayvn code objects
+
+A CodeObject is the compact, self-contained form of a compiled
+program. The compiler and peephole pass work on a list of
+(OpCode, arg) tuples; assemble() turns that list into:
+
+    ops        bytes, one opcode number (OpCode.value) per instruction
+    args       array('i'), one integer operand per instruction
+    consts     constant pool, each distinct constant stored once
+    names      global slot names, in slot order
+    functions  function records {name, entry, params, locals, varnames},
+               in definition order
+    loops      the compiler's loop table {id, function, kind, start,
+               backedge, exit}, for the VM's tiering
+
+Operands are plain integers for every instruction:
+
+    PUSH_CONST   index into consts
+    FOR_RANGE    index into consts of its (exit, var, state) tuple
+    CALL         index into consts of its (function index, argc) pair
+    TAIL_CALL    likewise
+    others       the compiler's int arg (slot, jump target, count), or 0
+
+Nothing in a CodeObject refers to live compiler state, so it marshals
+as-is (see cache.py) and many programs can stay loaded cheaply.
+"""
+
+import sys
+from array import array
+
+from compiler.ByteCode.opcodes import OpCode
+
+
+# Instructions whose arg lives in the constant pool
+CONST_OPS = frozenset({
+    OpCode.PUSH_CONST,
+    OpCode.FOR_RANGE,
+    OpCode.CALL,
+    OpCode.TAIL_CALL,
+})
+
+
+class CodeObject:
+    def __init__(self, ops, args, consts, names, functions, loops=()):
+        self.ops = ops
+        self.args = args
+        self.consts = consts
+        self.names = names
+        self.functions = functions
+        self.loops = loops
+
+    def __len__(self):
+        return len(self.ops)
+
+    def nbytes(self):
+        """
+        Size of the instruction stream itself.
+        """
+        return len(self.ops) + self.args.itemsize * len(self.args)
+
+    def opcode(self, i):
+        return OpCode(self.ops[i])
+
+    def operand(self, i):
+        """
+        The instruction's arg as the compiler emitted it: the pooled
+        constant itself for PUSH_CONST / FOR_RANGE / (TAIL_)CALL.
+        """
+        arg = self.args[i]
+        if OpCode(self.ops[i]) in CONST_OPS:
+            return self.consts[arg]
+        return arg
+
+    def instructions(self):
+        """
+        [(OpCode, arg)] in the compiler's format.
+        """
+        return [(self.opcode(i), self.operand(i)) for i in range(len(self.ops))]
+
+    # ---------------------------------------------------------
+    # Serialization
+    # ---------------------------------------------------------
+
+    def to_dict(self):
+        """
+        Marshal-safe form. The operand array is stored as raw bytes
+        in this machine's byte order.
+        """
+        return {
+            "ops": bytes(self.ops),
+            "args": self.args.tobytes(),
+            "byteorder": sys.byteorder,
+            "consts": self.consts,
+            "names": self.names,
+            "functions": self.functions,
+            "loops": self.loops,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Inverse of to_dict. Raises ValueError if the data doesn't fit
+        this machine or is malformed.
+        """
+        if data["byteorder"] != sys.byteorder:
+            raise ValueError("code object written with another byte order")
+
+        args = array("i")
+        args.frombytes(data["args"])
+        if len(args) != len(data["ops"]):
+            raise ValueError("code object ops / args length mismatch")
+
+        return cls(data["ops"], args, data["consts"], data["names"], data["functions"], data["loops"])
+
+
+def assemble(code, functions, global_names, loops=()):
+    """
+    Build a CodeObject from compiler output: the (OpCode, arg) list,
+    the function table, the name -> slot globals and the loop table.
+    """
+    consts = []
+    const_index = {}
+
+    def const(value):
+        # Keyed by type and repr, so 1 / 1.0 / True and 0.0 / -0.0 stay distinct
+        key = (type(value), repr(value))
+        index = const_index.get(key)
+        if index is None:
+            index = const_index[key] = len(consts)
+            consts.append(value)
+        return index
+
+    ops = bytearray()
+    args = array("i")
+
+    for op, arg in code:
+        if op in CONST_OPS:
+            arg = const(arg)
+        elif arg is None:
+            arg = 0
+
+        ops.append(op.value)
+        args.append(arg)
+
+    return CodeObject(bytes(ops), args, tuple(consts), tuple(global_names), list(functions), list(loops))
@@ -1,6 +1,36 @@
 from compiler.ByteCode.opcodes import OpCode
 from compiler.rayvn_ast import *
 from compiler.lexer import TokenType
+from compiler.analysis import assigned_names, function_defs
+from compiler.codegen import FunctionTable
+
+
+# Bump whenever the emitted bytecode changes shape, so stale .rvc
+# caches are rejected instead of being run.
+COMPILER_VERSION = 13
+
+
+# Logical operators compile to jumps rather than a binary opcode
+SHORT_CIRCUIT = {
+    TokenType.AND: OpCode.JUMP_IF_FALSE_OR_POP,
+    TokenType.ANDAND: OpCode.JUMP_IF_FALSE_OR_POP,
+    TokenType.OR: OpCode.JUMP_IF_TRUE_OR_POP,
+    TokenType.OROR: OpCode.JUMP_IF_TRUE_OR_POP,
+}
+
+BINARY_OPS = {
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUB,
+    TokenType.STAR: OpCode.MUL,
+    TokenType.SLASH: OpCode.DIV,
+
+    TokenType.GT: OpCode.GT,
+    TokenType.GTE: OpCode.GTE,
+    TokenType.LT: OpCode.LT,
+    TokenType.LTE: OpCode.LTE,
+    TokenType.EQEQ: OpCode.EQ,
+    TokenType.NOTEQ: OpCode.NEQ,
+}
 
 
 class Compiler:
@@ -12,14 +42,59 @@ class Compiler:
     Responsibilities:
     - Traverse AST nodes
     - Emit OpCode instructions
-    - Track function entry points
+    - Declare every function up front and track entry points
     - Track loop state for break / continue
+    - Record every loop in a loop table, for the VM's tiering
+    - Mark the `memo fn` functions, for the VM to memoize
+    - Resolve variables to integer slots (frame locals / globals)
     """
 
     def __init__(self):
         self.code = []         # Final bytecode: list of (OpCode, arg)
-        self.functions = {}    # Function table: name -> { entry, params }
+        self.functions = []    # Function table, by index: { name, entry, params, locals, varnames, memo }
+        self.function_table = FunctionTable()   # which function a call runs
         self.loop_stack = []   # Stack of active loops (for break/continue)
+        self.loops = []        # Loop table, in source order: { id, function, kind, start, backedge, exit }
+        self.current = None    # Index of the function being compiled (None at top level)
+        self.globals = {}      # Global table: name -> slot
+        self.scope = None      # Current function scope: name -> slot (None at top level)
+        self.work = []         # Pending nodes / actions (see compile)
+
+        # Node type -> handler
+        self.handlers = {
+            Program: self.compile_program,
+
+            Number: self.compile_constant,
+            Boolean: self.compile_constant,
+            String: self.compile_constant,
+            Var: self.compile_var,
+
+            LetStmt: self.compile_binding,
+            AssignStmt: self.compile_binding,
+            PrintStmt: self.compile_print,
+            ExprStmt: self.compile_expr_stmt,
+
+            Unary: self.compile_unary,
+            Not: self.compile_not,
+            Binary: self.compile_binary,
+            Logical: self.compile_logical,
+
+            IfChain: self.compile_if_chain,
+            WhileStmt: self.compile_while,
+            ForInLoop: self.compile_for_in,
+            RangeExpr: self.compile_range,
+
+            FunctionDef: self.compile_function_def,
+            CallExpr: self.compile_call,
+            ReturnStmt: self.compile_return,
+
+            BreakStmt: self.compile_break,
+            ContinueStmt: self.compile_continue,
+
+            ArrayLiteral: self.compile_array,
+            IndexExpr: self.compile_index,
+            IndexAssign: self.compile_index_assign,
+        }
 
     # ---------------------------------------------------------
     # Low-level bytecode helpers
@@ -45,275 +120,479 @@ class Compiler:
         self.code[index] = (op, value)
 
     # ---------------------------------------------------------
-    # Main compilation dispatcher
+    # Scope resolution
     # ---------------------------------------------------------
 
-    def compile(self, node):
-        """
-        Recursively compile an AST node into bytecode.
-        """
-
-        # =========================
-        # Program root
-        # =========================
-
-        if isinstance(node, Program):
-            for stmt in node.statements:
-                self.compile(stmt)
-            self.emit(OpCode.HALT)
-
-        # =========================
-        # Literals
-        # =========================
-
-        elif isinstance(node, Number):
-            self.emit(OpCode.PUSH_CONST, node.value)
-
-        elif isinstance(node, Boolean):
-            self.emit(OpCode.PUSH_CONST, node.value)
-
-        elif isinstance(node, String):
-            self.emit(OpCode.PUSH_CONST, node.value)
-
-        # =========================
-        # Variables
-        # =========================
-
-        elif isinstance(node, Var):
-            self.emit(OpCode.LOAD_VAR, node.name)
-
-        elif isinstance(node, LetStmt):
-            self.compile(node.value)
-            self.emit(OpCode.STORE_VAR, node.name)
+    def global_slot(self, name):
+        if name not in self.globals:
+            self.globals[name] = len(self.globals)
+        return self.globals[name]
 
-        elif isinstance(node, AssignStmt):
-            self.compile(node.value)
-            self.emit(OpCode.STORE_VAR, node.name)
+    def local_slot(self, name):
+        if name not in self.scope:
+            self.scope[name] = len(self.scope)
+        return self.scope[name]
 
-        # =========================
-        # Output
-        # =========================
-
-        elif isinstance(node, PrintStmt):
-            self.compile(node.expr)
-            self.emit(OpCode.PRINT)
-
-        # =========================
-        # Unary expressions
-        # =========================
-
-        elif isinstance(node, Unary):
-            self.compile(node.expr)
-            if node.op == TokenType.MINUS:
-                self.emit(OpCode.NEG)
-
-        elif isinstance(node, Not):
-            self.compile(node.expr)
-            self.emit(OpCode.NOT)
-
-        # =========================
-        # Binary expressions
-        # =========================
-
-        elif isinstance(node, Binary):
-            self.compile(node.left)
-            self.compile(node.right)
-            self.emit(self.map_binary(node.op))
-
-        # =========================
-        # Expression statements
-        # =========================
-
-        elif isinstance(node, ExprStmt):
-            self.compile(node.expr)
-            self.emit(OpCode.POP)
-
-        # =========================
-        # Conditionals
-        # =========================
-
-        elif isinstance(node, IfChain):
-            end_jumps = []
-
-            for condition, body in node.branches:
-                self.compile(condition)
-                jump_false = self.emit(OpCode.JUMP_IF_FALSE, None)
-
-                for stmt in body:
-                    self.compile(stmt)
-
-                end_jumps.append(self.emit(OpCode.JUMP, None))
-                self.patch(jump_false, len(self.code))
-
-            if node.else_body:
-                for stmt in node.else_body:
-                    self.compile(stmt)
-
-            for j in end_jumps:
-                self.patch(j, len(self.code))
-
-        # =========================
-        # While loops
-        # =========================
+    def frame_slot(self, name):
+        """
+        Slot of a variable in the current frame. At top level the
+        frame is the global table itself.
+        """
+        if self.scope is None:
+            return self.global_slot(name)
+        return self.local_slot(name)
 
-        elif isinstance(node, WhileStmt):
-            loop_start = len(self.code)
+    def hidden_slots(self, count):
+        """
+        Reserve `count` consecutive frame slots for compiler-internal
+        state. The names can't clash with Rayvn identifiers.
+        """
+        first = None
+        for _ in range(count):
+            table = self.globals if self.scope is None else self.scope
+            slot = self.frame_slot(f"<hidden {len(table)}>")
+            if first is None:
+                first = slot
+        return first
+
+    def emit_load(self, name):
+        """
+        Emit the indexed load for a variable.
 
-            self.compile(node.condition)
-            exit_jump = self.emit(OpCode.JUMP_IF_FALSE, None)
+        Inside a function: locals first, then globals. A name that is
+        neither gets a fresh local slot, which reads as 0 like an
+        unset variable always has.
+        """
+        if self.scope is None:
+            self.emit(OpCode.LOAD_GLOBAL, self.global_slot(name))
+        elif name in self.scope:
+            self.emit(OpCode.LOAD_LOCAL, self.scope[name])
+        elif name in self.globals:
+            self.emit(OpCode.LOAD_GLOBAL, self.globals[name])
+        else:
+            self.emit(OpCode.LOAD_LOCAL, self.local_slot(name))
 
-            self.loop_stack.append({
-                "start": loop_start,
-                "breaks": [],
-                "continues": []
-            })
+    def emit_store(self, name):
+        """
+        Emit the indexed store for a variable.
 
-            for stmt in node.body:
-                self.compile(stmt)
+        Assignments inside a function always bind a local.
+        """
+        if self.scope is None:
+            self.emit(OpCode.STORE_GLOBAL, self.frame_slot(name))
+        else:
+            self.emit(OpCode.STORE_LOCAL, self.frame_slot(name))
 
-            self.emit(OpCode.JUMP, loop_start)
+    # ---------------------------------------------------------
+    # Main compilation dispatcher
+    # ---------------------------------------------------------
 
-            loop = self.loop_stack.pop()
-            loop_end = len(self.code)
+    def compile(self, node):
+        """
+        Compile an AST node, and everything under it, into bytecode.
+
+        Nothing recurses. The handler for a node type (self.handlers)
+        pushes the node's parts onto self.work in reverse emit order:
+        child nodes, and (method, *args) actions for the instructions
+        and jump patches in between. The loop below pops and runs them
+        until this node's share of the stack is done, so nesting depth
+        is bounded by memory, not the Python recursion limit.
+        """
+        work = self.work
+        base = len(work)
+        handlers = self.handlers
 
-            self.patch(exit_jump, loop_end)
+        work.append(node)
 
-            for br in loop["breaks"]:
-                self.patch(br, loop_end)
+        while len(work) > base:
+            item = work.pop()
 
-            for ct in loop["continues"]:
-                self.patch(ct, loop_start)
+            if type(item) is tuple:
+                item[0](*item[1:])
+                continue
 
-        # =========================
-        # For-in loops
-        # =========================
+            handler = handlers.get(type(item))
+            if handler is None:
+                raise Exception(f"Compiler missing node: {type(item)}")
+            handler(item)
 
-        elif isinstance(node, ForInLoop):
-            self.compile(node.iterable)
-            self.emit(OpCode.ITER_INIT)
+    def schedule(self, *items):
+        """
+        Queue nodes / actions to run next, in the order given.
+        """
+        self.work.extend(reversed(items))
 
-            loop_start = len(self.code)
-            self.emit(OpCode.ITER_NEXT)
-            exit_jump = self.emit(OpCode.JUMP_IF_FALSE, None)
+    def compile_flat(self, flat):
+        """
+        Compile a flat_ast.FlatAST like a Program, rebuilding one
+        top-level statement as objects at a time.
+        """
+        for name in flat.global_names:
+            self.global_slot(name)
+        for name, params in flat.functions:
+            self.declare_function(name, params)
+        for stmt in flat:
+            self.compile(stmt)
+        self.emit(OpCode.HALT)
 
-            self.emit(OpCode.STORE_VAR, node.var)
+    # ---------------------------------------------------------
+    # Jump labels
+    # ---------------------------------------------------------
+    # A label is a list of jump indices that all land on the same,
+    # not yet emitted, position.
 
-            self.loop_stack.append({
-                "start": loop_start,
-                "breaks": [],
-                "continues": []
-            })
+    def emit_jump(self, op, label):
+        label.append(self.emit(op, None))
 
-            for stmt in node.body:
-                self.compile(stmt)
+    def place(self, label):
+        """
+        Point every jump in `label` at the next instruction.
+        """
+        for index in label:
+            self.patch(index, len(self.code))
 
-            self.emit(OpCode.JUMP, loop_start)
+    # =========================
+    # Program root
+    # =========================
 
-            loop = self.loop_stack.pop()
-            loop_end = len(self.code)
+    def compile_program(self, node):
+        # Reserve every top-level name up front so functions defined
+        # before a global's first assignment still resolve it.
+        for name in assigned_names(node.statements):
+            self.global_slot(name)
 
-            self.patch(exit_jump, loop_end)
+        # Likewise every function, so calls may precede the definition
+        for fn in function_defs(node.statements):
+            self.declare_function(fn.name, fn.params)
 
-            for br in loop["breaks"]:
-                self.patch(br, loop_end)
+        self.schedule(*node.statements, (self.emit, OpCode.HALT))
 
-            for ct in loop["continues"]:
-                self.patch(ct, loop_start)
+    # =========================
+    # Literals & variables
+    # =========================
 
-            self.emit(OpCode.ITER_END)
+    def compile_constant(self, node):
+        self.emit(OpCode.PUSH_CONST, node.value)
 
-        # =========================
-        # Range expression
-        # =========================
+    def compile_var(self, node):
+        self.emit_load(node.name)
 
-        elif isinstance(node, RangeExpr):
-            self.compile(node.start)
-            self.compile(node.end)
+    def compile_binding(self, node):
+        # let x = ... / x = ...
+        self.schedule(node.value, (self.emit_store, node.name))
 
-            if node.step:
-                self.compile(node.step)
-            else:
-                self.emit(OpCode.PUSH_CONST, 1)
+    # =========================
+    # Output & expression statements
+    # =========================
 
-            self.emit(OpCode.BUILD_RANGE)
+    def compile_print(self, node):
+        self.schedule(node.expr, (self.emit, OpCode.PRINT))
 
-        # =========================
-        # Functions
-        # =========================
+    def compile_expr_stmt(self, node):
+        self.schedule(node.expr, (self.emit, OpCode.POP))
 
-        elif isinstance(node, FunctionDef):
-            skip_jump = self.emit(OpCode.JUMP, None)
+    # =========================
+    # Unary & binary expressions
+    # =========================
 
-            entry = len(self.code)
-            self.functions[node.name] = {
-                "entry": entry,
-                "params": node.params
-            }
+    def compile_unary(self, node):
+        if node.op == TokenType.MINUS:
+            self.schedule(node.expr, (self.emit, OpCode.NEG))
+        else:
+            self.schedule(node.expr)
+
+    def compile_not(self, node):
+        self.schedule(node.expr, (self.emit, OpCode.NOT))
+
+    def compile_binary(self, node):
+        if node.op in SHORT_CIRCUIT:
+            # a and b  ->  a; JUMP_IF_FALSE_OR_POP end; b; end:
+            # The deciding operand is left on the stack as the result.
+            end = []
+            self.schedule(
+                node.left,
+                (self.emit_jump, SHORT_CIRCUIT[node.op], end),
+                node.right,
+                (self.place, end),
+            )
+        else:
+            self.schedule(node.left, node.right, (self.emit, self.map_binary(node.op)))
 
-            for stmt in node.body:
-                self.compile(stmt)
+    def compile_logical(self, node):
+        if node.op not in SHORT_CIRCUIT:
+            raise Exception(f"Compiler missing node: {type(node)}")
+        self.compile_binary(node)
+
+    # =========================
+    # Conditionals
+    # =========================
+
+    def compile_if_chain(self, node):
+        end = []
+        items = []
+
+        for condition, body in node.branches:
+            skip = []
+            items.append(condition)
+            items.append((self.emit_jump, OpCode.JUMP_IF_FALSE, skip))
+            items.extend(body)
+            items.append((self.emit_jump, OpCode.JUMP, end))
+            items.append((self.place, skip))
+
+        if node.else_body:
+            items.extend(node.else_body)
+
+        items.append((self.place, end))
+        self.schedule(*items)
+
+    # =========================
+    # Loops
+    # =========================
+    # loop = {"kind", "start", "breaks", "continues", "record"};
+    # break / continue add their jumps to it and end_loop patches them.
+    #
+    # record is the loop's entry in self.loops: kind ("while", "for"
+    # or "range"), the function it is in, where it starts (continues
+    # and the backedge jump there), its backedge JUMP and its exit.
+    # Loops are numbered in source order, the order every backend's
+    # compiler reaches them in.
+
+    def new_loop(self, kind):
+        return {"kind": kind, "start": None, "breaks": [], "continues": [], "record": None}
+
+    def begin_loop(self, loop):
+        loop["start"] = len(self.code)
+        self.loop_stack.append(loop)
+
+        loop["record"] = {
+            "id": len(self.loops),
+            "function": self.current,
+            "kind": loop["kind"],
+            "start": loop["start"],
+            "backedge": None,
+            "exit": None,
+        }
+        self.loops.append(loop["record"])
+
+    def end_loop(self, loop, exits):
+        """
+        Jump back to the top, then point exits and breaks past the
+        loop and continues at its top.
+        """
+        record = loop["record"]
+        record["backedge"] = self.emit(OpCode.JUMP, loop["start"])
+        record["exit"] = len(self.code)
+        self.loop_stack.pop()
+
+        self.place(exits)
+        self.place(loop["breaks"])
+
+        for ct in loop["continues"]:
+            self.patch(ct, loop["start"])
+
+    def compile_while(self, node):
+        loop = self.new_loop("while")
+        exits = []
+
+        self.schedule(
+            (self.begin_loop, loop),
+            node.condition,
+            (self.emit_jump, OpCode.JUMP_IF_FALSE, exits),
+            *node.body,
+            (self.end_loop, loop, exits),
+        )
+
+    def compile_for_in(self, node):
+        if isinstance(node.iterable, RangeExpr):
+            self.compile_range_loop(node)
+            return
+
+        loop = self.new_loop("for")
+        exits = []
+
+        self.schedule(
+            node.iterable,
+            (self.emit, OpCode.ITER_INIT),
+            (self.begin_loop, loop),
+            (self.emit, OpCode.ITER_NEXT),
+            (self.emit_jump, OpCode.JUMP_IF_FALSE, exits),
+            (self.emit_store, node.var),
+            *node.body,
+            (self.end_loop, loop, exits),
+            (self.emit, OpCode.ITER_END),
+        )
+
+    # =========================
+    # Range expression
+    # =========================
+
+    def compile_range(self, node):
+        step = node.step if node.step else (self.emit, OpCode.PUSH_CONST, 1)
+        self.schedule(node.start, node.end, step, (self.emit, OpCode.BUILD_RANGE))
+
+    # =========================
+    # Functions
+    # =========================
+    # Declared up front, and calls resolved, by the FunctionTable (see
+    # compiler/codegen.py).
+
+    def declare_function(self, name, params):
+        self.function_table.declare(name, params)
+        self.functions.append({
+            "name": name,
+            "entry": None,
+            "params": list(params),
+            "locals": 0,
+            "memo": False,
+        })
+
+    def compile_function_def(self, node):
+        skip = []
+        self.emit_jump(OpCode.JUMP, skip)
+
+        index = self.function_table.define(node.name)
+
+        func = self.functions[index]
+        func["entry"] = len(self.code)
+        func["memo"] = node.memo   # checked pure by the front end (analysis.Purity)
+
+        # Params occupy the first slots, then every name the body binds
+        outer_scope = self.scope
+        outer_function = self.current
+        self.scope = {}
+        self.current = index
+
+        for name in node.params:
+            self.local_slot(name)
+        for name in assigned_names(node.body):
+            self.local_slot(name)
+
+        self.schedule(
+            *node.body,
+            (self.emit, OpCode.PUSH_CONST, None),
+            (self.emit, OpCode.RETURN),
+            (self.end_function, func, outer_scope, outer_function, skip),
+        )
+
+    def end_function(self, func, outer_scope, outer_function, skip):
+        func["locals"] = len(self.scope)
+        func["varnames"] = list(self.scope)   # slot order, for the disassembler
+        self.scope = outer_scope
+        self.current = outer_function
+        self.place(skip)
+
+    def compile_call(self, node):
+        self.schedule(*node.args, (self.emit_call, node.name, len(node.args)))
+
+    def emit_call(self, name, argc, op=OpCode.CALL):
+        """
+        CALL / TAIL_CALL (function index, argc).
+        """
+        self.emit(op, (self.function_table.resolve(name, argc), argc))
 
-            self.emit(OpCode.PUSH_CONST, None)
-            self.emit(OpCode.RETURN)
+    def compile_return(self, node):
+        value = node.value
 
-            self.patch(skip_jump, len(self.code))
+        if isinstance(value, CallExpr) and self.scope is not None:
+            # return f(...) in a function: the callee takes over this
+            # frame and returns straight to our caller
+            self.schedule(*value.args, (self.emit_call, value.name, len(value.args), OpCode.TAIL_CALL))
+            return
 
-        elif isinstance(node, CallExpr):
-            for arg in node.args:
-                self.compile(arg)
-            self.emit(OpCode.CALL, self.functions[node.name])
+        value = value if value else (self.emit, OpCode.PUSH_CONST, None)
+        self.schedule(value, (self.emit, OpCode.RETURN))
 
-        elif isinstance(node, ReturnStmt):
-            if node.value:
-                self.compile(node.value)
-            else:
-                self.emit(OpCode.PUSH_CONST, None)
-            self.emit(OpCode.RETURN)
+    # =========================
+    # Loop control
+    # =========================
 
-        # =========================
-        # Loop control
-        # =========================
+    def compile_break(self, node):
+        if not self.loop_stack:
+            raise Exception("break outside loop")
 
-        elif isinstance(node, BreakStmt):
-            if not self.loop_stack:
-                raise Exception("break outside loop")
+        if self.loop_stack[-1]["kind"] == "for":
+            # The loop's iterator is on top of the stack; the normal
+            # exit has already consumed it, so a break must too
+            self.emit(OpCode.POP)
 
-            jump = self.emit(OpCode.JUMP, None)
-            self.loop_stack[-1]["breaks"].append(jump)
+        jump = self.emit(OpCode.JUMP, None)
+        self.loop_stack[-1]["breaks"].append(jump)
 
-        elif isinstance(node, ContinueStmt):
-            if not self.loop_stack:
-                raise Exception("continue outside loop")
+    def compile_continue(self, node):
+        if not self.loop_stack:
+            raise Exception("continue outside loop")
 
-            jump = self.emit(OpCode.JUMP, None)
-            self.loop_stack[-1]["continues"].append(jump)
+        jump = self.emit(OpCode.JUMP, None)
+        self.loop_stack[-1]["continues"].append(jump)
 
-        # =========================
-        # Arrays & indexing
-        # =========================
+    # =========================
+    # Arrays & indexing
+    # =========================
 
-        elif isinstance(node, ArrayLiteral):
-            for elem in node.elements:
-                self.compile(elem)
-            self.emit(OpCode.BUILD_ARRAY, len(node.elements))
+    def compile_array(self, node):
+        self.schedule(*node.elements, (self.emit, OpCode.BUILD_ARRAY, len(node.elements)))
 
-        elif isinstance(node, IndexExpr):
-            self.compile(node.array)
-            self.compile(node.index)
-            self.emit(OpCode.INDEX_GET)
+    def compile_index(self, node):
+        self.schedule(node.array, node.index, (self.emit, OpCode.INDEX_GET))
 
-        elif isinstance(node, IndexAssign):
-            self.compile(node.array)
-            self.compile(node.index)
-            self.compile(node.value)
-            self.emit(OpCode.INDEX_SET)
+    def compile_index_assign(self, node):
+        # a[i] = v is a statement; INDEX_SET leaves v for nothing to
+        # use, and inside a for-in loop it would sit on the iterator
+        self.schedule(
+            node.array, node.index, node.value,
+            (self.emit, OpCode.INDEX_SET),
+            (self.emit, OpCode.POP),
+        )
 
-        # =========================
-        # Fallback
-        # =========================
+    # ---------------------------------------------------------
+    # Counted loops
+    # ---------------------------------------------------------
 
-        else:
-            raise Exception(f"Compiler missing node: {type(node)}")
+    def compile_range_loop(self, node):
+        """
+        Compile `for i in range(...)` to a counted loop.
+
+            <start> <end> <step>
+            RANGE_INIT state
+        loop:
+            FOR_RANGE (exit, var, state)
+            <body>
+            JUMP loop
+        exit:
+
+        RANGE_INIT validates the bounds exactly like range() and keeps
+        the next value, the remaining count and the step in three hidden
+        frame slots. FOR_RANGE does the test, the store into the loop
+        variable and the increment in a single dispatch.
+        """
+        rng = node.iterable
+        step = rng.step if rng.step else (self.emit, OpCode.PUSH_CONST, 1)
+        loop = self.new_loop("range")
+
+        self.schedule(
+            rng.start,
+            rng.end,
+            step,
+            (self.begin_range_loop, node, loop),
+            *node.body,
+            (self.end_range_loop, loop),
+        )
+
+    def begin_range_loop(self, node, loop):
+        # Slots are taken only now, after the bounds are compiled
+        state = self.hidden_slots(3)
+        var = self.frame_slot(node.var)
+
+        self.emit(OpCode.RANGE_INIT, state)
+        self.begin_loop(loop)
+
+        loop["for_range"] = (self.emit(OpCode.FOR_RANGE, None), var, state)
+
+    def end_range_loop(self, loop):
+        step, var, state = loop["for_range"]
+        exits = []
+        self.end_loop(loop, exits)
+        self.patch(step, (len(self.code), var, state))
 
     # ---------------------------------------------------------
     # Operator mapping
@@ -323,21 +602,4 @@ class Compiler:
         """
         Convert parser TokenType operators into VM opcodes.
         """
-        return {
-            TokenType.PLUS: OpCode.ADD,
-            TokenType.MINUS: OpCode.SUB,
-            TokenType.STAR: OpCode.MUL,
-            TokenType.SLASH: OpCode.DIV,
-
-            TokenType.GT: OpCode.GT,
-            TokenType.GTE: OpCode.GTE,
-            TokenType.LT: OpCode.LT,
-            TokenType.LTE: OpCode.LTE,
-            TokenType.EQEQ: OpCode.EQ,
-            TokenType.NOTEQ: OpCode.NEQ,
-
-            TokenType.AND: OpCode.AND,
-            TokenType.ANDAND: OpCode.AND,
-            TokenType.OR: OpCode.OR,
-            TokenType.OROR: OpCode.OR,
-        }[op]
\ No newline at end of file
+        return BINARY_OPS[op]
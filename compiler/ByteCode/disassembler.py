@@ -0,0 +1,131 @@
+"""
+Rayvn disassembler
+
+Renders a CodeObject as text, one instruction per line:
+
+    fn fib(n)  [entry 1, 1 local]
+           1  LOAD_LOCAL               0  (n)
+           2  PUSH_CONST               0  (2)
+           3  LT
+           4  JUMP_IF_FALSE            7
+           5  LOAD_LOCAL               0  (n)
+           6  RETURN
+    >>     7  LOAD_LOCAL               0  (n)
+
+">>" marks jump targets. Operands are followed by what they refer to:
+the constant, the variable in that slot, the called function or the
+counted-loop fields. Instructions are listed in offset order under the
+function (or <main>) whose code they are.
+
+    ./rayvn --dis example.rv
+"""
+
+from compiler.ByteCode.opcodes import OpCode, NO_ARG_OPS, TERMINAL_OPS, jump_target
+
+
+MAIN = "<main>"
+
+
+def disassemble(code):
+    instructions = code.instructions()
+    owners = owner_indices(instructions, code.functions)
+    targets = {jump_target(op, arg) for op, arg in instructions} - {None}
+
+    lines = []
+    current = MAIN       # matches no owner, so the first header is written
+
+    for i, (op, arg) in enumerate(instructions):
+        owner = owners[i]
+        if owner != current:
+            current = owner
+            func = code.functions[owner] if owner is not None else None
+            lines.append(header(func))
+
+        varnames = func.get("varnames", ()) if func else code.names
+
+        marker = ">>" if i in targets else "  "
+        raw = code.args[i] if op not in NO_ARG_OPS else ""
+        text = f"{marker} {i:>5}  {op.name:<20} {raw:>5}"
+
+        note = describe(op, arg, varnames, code.names, code.functions)
+        if note:
+            text += f"  ({note})"
+
+        lines.append(text.rstrip())
+
+    return "\n".join(lines)
+
+
+def header(func):
+    if func is None:
+        return MAIN
+
+    params = ", ".join(func["params"])
+    count = func["locals"]
+    memo = ", memo" if func.get("memo") else ""
+    return f"fn {func['name']}({params})  [entry {func['entry']}, {count} local{'s' if count != 1 else ''}{memo}]"
+
+
+def describe(op, arg, varnames, global_names, functions):
+    """
+    What an operand refers to, or "" if the raw number says it all.
+    """
+    if op is OpCode.PUSH_CONST:
+        return repr(arg)
+
+    if op in (OpCode.LOAD_LOCAL, OpCode.STORE_LOCAL):
+        return slot_name(varnames, arg)
+
+    if op in (OpCode.LOAD_GLOBAL, OpCode.STORE_GLOBAL):
+        return slot_name(global_names, arg)
+
+    if op is OpCode.RANGE_INIT:
+        return f"state {slot_name(varnames, arg)}"
+
+    if op is OpCode.FOR_RANGE:
+        exit_, var, state = arg
+        return f"exit {exit_}, var {slot_name(varnames, var)}, state {state}"
+
+    if op in (OpCode.CALL, OpCode.TAIL_CALL):
+        index, argc = arg
+        return f"{functions[index]['name']}/{argc}"
+
+    return ""
+
+
+def slot_name(names, slot):
+    return names[slot] if 0 <= slot < len(names) else f"slot {slot}"
+
+
+def owner_indices(instructions, functions):
+    """
+    Which function (index, or None for <main>) each offset belongs to:
+    flood fill from <main>'s start and every function entry, following
+    jumps and fallthrough but not calls.
+    """
+    unset = MAIN
+    owners = [unset] * len(instructions)
+    roots = [(None, 0)] + [(index, func["entry"]) for index, func in enumerate(functions)]
+
+    for owner, entry in roots:
+        pending = [entry]
+        while pending:
+            i = pending.pop()
+            if i >= len(instructions) or owners[i] is not unset:
+                continue
+            owners[i] = owner
+
+            op, arg = instructions[i]
+            target = jump_target(op, arg)
+            if target is not None:
+                pending.append(target)
+            if op not in TERMINAL_OPS:
+                pending.append(i + 1)
+
+    # Unreachable leftovers (only at -O0) go with what precedes them
+    for i in range(len(owners)):
+        if owners[i] is unset:
+            owners[i] = owners[i - 1] if i else None
+
+    return owners
+
@@ -0,0 +1,84 @@
+"""
+Rayvn memoization
+
+The compiler marks the functions declared `memo fn`, which the front
+end has checked are pure (see Purity in compiler/analysis.py); the VM
+gives each of them a MemoCache and answers repeated calls from it
+instead of running the body.
+
+A cache is keyed by the argument values together with their types,
+so f(1), f(1.0) and f(true) stay distinct. Calls with an array
+argument are not cached (arrays are mutable and unhashable), and
+neither are array results: every call must return a fresh array the
+caller may change. Entries are evicted least recently used first
+once a cache holds `limit` of them.
+"""
+
+from collections import OrderedDict
+
+
+MEMO_SIZE = 65536    # default entries per function
+
+MISS = object()      # lookup(): not cached yet; store the result
+SKIP = object()      # lookup(): can't be cached; don't store
+
+
+def make_key(args):
+    return (*args, *map(type, args))
+
+
+class MemoCache:
+    """
+    One function's results, least recently used first.
+    """
+
+    def __init__(self, name, limit=MEMO_SIZE):
+        self.name = name
+        self.limit = limit
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0     # calls or results that couldn't be cached
+
+    def lookup(self, key):
+        """
+        The cached result for `key`, or MISS / SKIP.
+        """
+        try:
+            value = self.entries.get(key, MISS)
+        except TypeError:
+            # an array among the arguments
+            self.skipped += 1
+            return SKIP
+
+        if value is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        if type(value) is list:
+            self.skipped += 1
+            return
+
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.limit:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+
+def report(caches):
+    lines = [f"{'memo fn':<24}{'hits':>10}{'misses':>10}{'size':>8}{'evicted':>9}{'skipped':>9}"]
+    for cache in caches:
+        lines.append(
+            f"{cache.name:<24}{cache.hits:>10}{cache.misses:>10}"
+            f"{len(cache.entries):>8}{cache.evictions:>9}{cache.skipped:>9}"
+        )
+    if len(lines) == 1:
+        lines.append("(no memoized functions)")
+    return "\n".join(lines)
@@ -8,8 +8,10 @@ class OpCode(Enum):
     DUP = auto()             # duplicate top value
 
     # --- Variables ---
-    LOAD_VAR = auto()        # push variable value
-    STORE_VAR = auto()       # store stack top into variable
+    LOAD_LOCAL = auto()      # push frame slot value
+    STORE_LOCAL = auto()     # store stack top into frame slot
+    LOAD_GLOBAL = auto()     # push global slot value
+    STORE_GLOBAL = auto()    # store stack top into global slot
 
     # --- Arithmetic ---
     ADD = auto()             # addition
@@ -27,23 +29,26 @@ class OpCode(Enum):
     LTE = auto()             # less than or equal
 
     # --- Boolean / Logic ---
-    NOT = auto()
-    AND = auto()             # short-circuit handled by jumps
-    OR = auto() 
+    NOT = auto()             # and / or short-circuit via the jumps below
 
     # --- Control Flow ---
     JUMP = auto()            # unconditional jump
     JUMP_IF_FALSE = auto()   # pop condition, jump if false
     JUMP_IF_TRUE = auto()    # pop condition, jump if true
+    JUMP_IF_FALSE_OR_POP = auto()  # keep top and jump if false, else pop
+    JUMP_IF_TRUE_OR_POP = auto()   # keep top and jump if true, else pop
 
     # --- Functions ---
     CALL = auto()            # call function
+    TAIL_CALL = auto()       # call function in place of the current one
     RETURN = auto()
 
     # --- Loops ---
     ITER_INIT = auto()       # initialize iterator
     ITER_NEXT = auto()       # get next value
     ITER_END = auto()        # stop iteration
+    RANGE_INIT = auto()      # pop start/end/step into counted-loop slots
+    FOR_RANGE = auto()       # counted-loop step: store var or jump to exit
 
     # --- Arrays ---
     BUILD_ARRAY = auto()     # build array from N stack values
@@ -55,4 +60,59 @@ class OpCode(Enum):
     PRINT = auto()           # print top of stack   
 
     # --- Program ---
-    HALT = auto()            # stop execution
\ No newline at end of file
+    HALT = auto()            # stop execution
+
+
+# Instructions whose arg is an absolute jump target
+JUMP_OPS = frozenset({
+    OpCode.JUMP,
+    OpCode.JUMP_IF_FALSE,
+    OpCode.JUMP_IF_TRUE,
+    OpCode.JUMP_IF_FALSE_OR_POP,
+    OpCode.JUMP_IF_TRUE_OR_POP,
+})
+
+# Instructions whose arg is a tuple starting with a jump target
+LOOP_OPS = frozenset({
+    OpCode.FOR_RANGE,
+})
+
+# Instructions that never fall through to the next one
+TERMINAL_OPS = frozenset({
+    OpCode.JUMP,
+    OpCode.TAIL_CALL,
+    OpCode.RETURN,
+    OpCode.HALT,
+})
+
+# Instructions whose operand is unused (always 0)
+NO_ARG_OPS = frozenset({
+    OpCode.POP, OpCode.DUP,
+    OpCode.ADD, OpCode.SUB, OpCode.MUL, OpCode.DIV, OpCode.NEG,
+    OpCode.EQ, OpCode.NEQ, OpCode.GT, OpCode.GTE, OpCode.LT, OpCode.LTE,
+    OpCode.NOT,
+    OpCode.RETURN,
+    OpCode.ITER_INIT, OpCode.ITER_NEXT, OpCode.ITER_END,
+    OpCode.BUILD_RANGE, OpCode.INDEX_GET, OpCode.INDEX_SET,
+    OpCode.PRINT, OpCode.HALT,
+})
+
+
+def jump_target(op, arg):
+    """
+    Return the jump target carried by an instruction, or None.
+    """
+    if op in JUMP_OPS:
+        return arg
+    if op in LOOP_OPS:
+        return arg[0]
+    return None
+
+
+def retarget(op, arg, target):
+    """
+    Return `arg` with its jump target replaced.
+    """
+    if op in LOOP_OPS:
+        return (target,) + tuple(arg[1:])
+    return target
@@ -0,0 +1,347 @@
+"""
+Rayvn peephole optimizer
+
+Rewrites the (OpCode, arg) list produced by Compiler after the fact,
+then relocates every jump target, function entry point and loop table
+entry.
+
+Rewrites:
+    JUMP a ... a: JUMP b          ->  JUMP b           (jump threading)
+    JUMP a ... a: RETURN / HALT   ->  RETURN / HALT
+    JUMP_IF_x_OR_POP a ... a: JUMP_IF_y b
+                                  ->  JUMP_IF_x b, or past a
+    JUMP to the next instruction  ->  (removed)
+    ITER_END                      ->  (removed, it is a no-op)
+    STORE_x n; LOAD_x n           ->  DUP; STORE_x n
+    STORE_x n; LOAD_x n; POP      ->  STORE_x n
+    PUSH_CONST / LOAD_x; POP      ->  (removed)
+    NOT; JUMP_IF_FALSE a          ->  JUMP_IF_TRUE a
+    NOT; JUMP_IF_TRUE a           ->  JUMP_IF_FALSE a
+    JUMP_IF_xxx a; JUMP b; a:     ->  JUMP_IF_yyy b
+    PUSH_CONST c; JUMP_IF_xxx a   ->  JUMP a, or nothing
+    unreachable instructions      ->  (removed)
+
+A pair is only rewritten when nothing jumps to its second
+instruction, since that would change what the jump lands on.
+"""
+
+from compiler.ByteCode.opcodes import OpCode, TERMINAL_OPS, jump_target, retarget
+
+
+PURE_PUSH = (OpCode.PUSH_CONST, OpCode.LOAD_LOCAL, OpCode.LOAD_GLOBAL)
+
+STORE_LOAD = {
+    OpCode.STORE_LOCAL: OpCode.LOAD_LOCAL,
+    OpCode.STORE_GLOBAL: OpCode.LOAD_GLOBAL,
+}
+
+# A value-keeping jump that lands on another test of the same value can
+# go straight to where that test would send it:
+#   (jump, landing) -> (new jump, True: landing's target / False: past it)
+J_F, J_T = OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE
+J_F_POP, J_T_POP = OpCode.JUMP_IF_FALSE_OR_POP, OpCode.JUMP_IF_TRUE_OR_POP
+
+SHORT_CIRCUIT_THREADING = {
+    (J_F_POP, J_F): (J_F, True),
+    (J_F_POP, J_T): (J_F, False),
+    (J_F_POP, J_F_POP): (J_F_POP, True),
+    (J_F_POP, J_T_POP): (J_F, False),
+
+    (J_T_POP, J_T): (J_T, True),
+    (J_T_POP, J_F): (J_T, False),
+    (J_T_POP, J_T_POP): (J_T_POP, True),
+    (J_T_POP, J_F_POP): (J_T, False),
+}
+
+NEGATED_JUMP = {
+    OpCode.JUMP_IF_FALSE: OpCode.JUMP_IF_TRUE,
+    OpCode.JUMP_IF_TRUE: OpCode.JUMP_IF_FALSE,
+}
+
+
+class Peephole:
+    """
+    Peephole
+    --------
+    Runs rewrite rounds until the code stops changing.
+
+    stats records instruction counts before/after and how often each
+    rewrite fired, for the per-program report.
+    """
+
+    def __init__(self):
+        self.stats = {
+            "before": 0,
+            "after": 0,
+            "threaded": 0,
+            "dead": 0,
+            "noop": 0,
+            "store_load": 0,
+            "push_pop": 0,
+            "not_jump": 0,
+            "inverted_jump": 0,
+            "const_jump": 0,
+        }
+
+    def optimize(self, code, functions, loops=None):
+        """
+        Return optimized code. Function entry points in `functions`
+        and the compiler's loop table `loops` are updated in place.
+        """
+        loops = [] if loops is None else loops
+        code = list(code)
+        self.stats["before"] = len(code)
+
+        while True:
+            threaded = self.thread_jumps(code)
+            replace = self.rewrites(code, functions)
+
+            if not threaded and not replace:
+                break
+
+            if replace:
+                code = self.relocate(code, functions, loops, replace)
+
+        for loop in loops:
+            loop["exit"] = self.loop_exit(code, loop)
+
+        self.stats["after"] = len(code)
+        return code
+
+    def report(self):
+        before = self.stats["before"]
+        after = self.stats["after"]
+        removed = before - after
+        percent = (removed / before * 100) if before else 0.0
+
+        details = ", ".join(
+            f"{name}={count}"
+            for name, count in self.stats.items()
+            if name not in ("before", "after") and count
+        )
+
+        line = f"peephole: {before} -> {after} instructions (-{removed}, {percent:.1f}%)"
+        if details:
+            line += f" [{details}]"
+        return line
+
+    # ---------------------------------------------------------
+    # Analysis
+    # ---------------------------------------------------------
+
+    def jump_targets(self, code, functions):
+        targets = {func["entry"] for func in functions}
+        for op, arg in code:
+            target = jump_target(op, arg)
+            if target is not None:
+                targets.add(target)
+        return targets
+
+    def reachable(self, code, functions):
+        """
+        Flood fill from the program start and every function entry.
+        """
+        seen = set()
+        pending = [0] + [func["entry"] for func in functions]
+
+        while pending:
+            i = pending.pop()
+            if i in seen or i >= len(code):
+                continue
+            seen.add(i)
+
+            op, arg = code[i]
+            target = jump_target(op, arg)
+            if target is not None:
+                pending.append(target)
+            if op not in TERMINAL_OPS:
+                pending.append(i + 1)
+
+        return seen
+
+    # ---------------------------------------------------------
+    # Rewrites
+    # ---------------------------------------------------------
+
+    def thread_jumps(self, code):
+        """
+        Retarget jumps that land on an unconditional JUMP, in place.
+        Returns True if anything changed.
+        """
+        changed = False
+
+        for i, (op, arg) in enumerate(code):
+            original = jump_target(op, arg)
+            if original is None:
+                continue
+
+            target = self.follow(code, original)
+
+            if op is OpCode.JUMP and target < len(code) and code[target][0] in (OpCode.RETURN, OpCode.HALT):
+                # Jumping to a return is just a return
+                code[i] = code[target]
+                self.stats["threaded"] += 1
+                changed = True
+
+            elif target < len(code) and (op, code[target][0]) in SHORT_CIRCUIT_THREADING:
+                new_op, follow = SHORT_CIRCUIT_THREADING[(op, code[target][0])]
+                code[i] = (new_op, code[target][1] if follow else target + 1)
+                self.stats["threaded"] += 1
+                changed = True
+
+            elif target != original:
+                code[i] = (op, retarget(op, arg, target))
+                self.stats["threaded"] += 1
+                changed = True
+
+        return changed
+
+    def follow(self, code, target):
+        """
+        Where execution really goes from `target`: past any chain of
+        unconditional JUMPs.
+        """
+        seen = set()
+        while target < len(code) and code[target][0] is OpCode.JUMP and target not in seen:
+            seen.add(target)
+            target = code[target][1]
+        return target
+
+    def loop_exit(self, code, loop):
+        """
+        Where a loop table entry's exit now is: wherever the jumps out
+        of its code land (its test, breaks, FOR_RANGE), and where its
+        last instruction falls through to if it can (a test threaded
+        into the backedge). Those are threaded like any other jump, so
+        they stay right when the code after the loop is rewritten.
+        None if nothing leaves the loop, or the ways out disagree.
+        """
+        start, backedge = loop["start"], loop["backedge"]
+        if backedge < start:
+            return None
+
+        targets = set()
+        for op, arg in code[start:backedge + 1]:
+            target = jump_target(op, arg)
+            if target is not None and not start <= target <= backedge:
+                targets.add(target)
+        if code[backedge][0] not in TERMINAL_OPS:
+            targets.add(backedge + 1)
+
+        return targets.pop() if len(targets) == 1 else None
+
+    def rewrites(self, code, functions):
+        """
+        Find local rewrites. Returns {index: [replacement instructions]}.
+        """
+        targets = self.jump_targets(code, functions)
+        live = self.reachable(code, functions)
+        replace = {}
+
+        i = 0
+        n = len(code)
+
+        while i < n:
+            op, arg = code[i]
+
+            if i not in live:
+                replace[i] = []
+                self.stats["dead"] += 1
+                i += 1
+                continue
+
+            if op is OpCode.ITER_END or (op is OpCode.JUMP and arg == i + 1):
+                replace[i] = []
+                self.stats["noop"] += 1
+                i += 1
+                continue
+
+            if i + 1 < n and (i + 1) not in targets and (i + 1) in live:
+                next_op, next_arg = code[i + 1]
+
+                if op in PURE_PUSH and next_op is OpCode.POP:
+                    replace[i] = []
+                    replace[i + 1] = []
+                    self.stats["push_pop"] += 1
+                    i += 2
+                    continue
+
+                if op is OpCode.NOT and next_op in NEGATED_JUMP:
+                    replace[i] = []
+                    replace[i + 1] = [(NEGATED_JUMP[next_op], next_arg)]
+                    self.stats["not_jump"] += 1
+                    i += 2
+                    continue
+
+                if op is OpCode.PUSH_CONST and next_op in NEGATED_JUMP:
+                    taken = (not arg) if next_op is OpCode.JUMP_IF_FALSE else bool(arg)
+                    replace[i] = []
+                    replace[i + 1] = [(OpCode.JUMP, next_arg)] if taken else []
+                    self.stats["const_jump"] += 1
+                    i += 2
+                    continue
+
+                if op in NEGATED_JUMP and next_op is OpCode.JUMP and arg == i + 2:
+                    replace[i] = [(NEGATED_JUMP[op], next_arg)]
+                    replace[i + 1] = []
+                    self.stats["inverted_jump"] += 1
+                    i += 2
+                    continue
+
+                if op in STORE_LOAD and next_op is STORE_LOAD[op] and next_arg == arg:
+                    if i + 2 < n and (i + 2) not in targets and code[i + 2][0] is OpCode.POP:
+                        # Reload only to discard it
+                        replace[i + 1] = []
+                        replace[i + 2] = []
+                        self.stats["push_pop"] += 1
+                        i += 3
+                        continue
+
+                    replace[i] = [(OpCode.DUP, None)]
+                    replace[i + 1] = [(op, arg)]
+                    self.stats["store_load"] += 1
+                    i += 2
+                    continue
+
+            i += 1
+
+        return replace
+
+    # ---------------------------------------------------------
+    # Relocation
+    # ---------------------------------------------------------
+
+    def relocate(self, code, functions, loops, replace):
+        """
+        Apply replacements and remap every jump target and entry point.
+
+        A target that pointed at a removed instruction moves to
+        whatever now follows it. A loop whose backedge was removed
+        (unreachable once a conditional jump is threaded back to the
+        start in its place) ends at its last instruction left. Its
+        exit is only worked out at the end (see loop_exit).
+        """
+        new_index = []
+        out = []
+
+        for i, instr in enumerate(code):
+            new_index.append(len(out))
+            out.extend(replace.get(i, [instr]))
+        new_index.append(len(out))
+
+        for i, (op, arg) in enumerate(out):
+            target = jump_target(op, arg)
+            if target is not None:
+                out[i] = (op, retarget(op, arg, new_index[target]))
+
+        for func in functions:
+            func["entry"] = new_index[func["entry"]]
+
+        for loop in loops:
+            backedge = loop["backedge"]
+            loop["start"] = new_index[loop["start"]]
+            loop["backedge"] = new_index[backedge]
+            if replace.get(backedge) == []:
+                loop["backedge"] -= 1
+
+        return out
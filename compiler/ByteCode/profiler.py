@@ -0,0 +1,139 @@
+"""
+Rayvn opcode profiler
+
+Collects, per bytecode offset, how often the instruction ran and how
+long its handler took, plus the Rayvn call stack it ran under. From
+that it reports hot opcodes, hot offsets and per-function self time,
+and writes collapsed stacks ("main;fib;fib 12345") that flamegraph
+tools such as flamegraph.pl or speedscope read directly.
+
+The data is gathered by VM.run_profiled, a separate copy of the
+dispatch loop, so VM.run pays nothing when profiling is off.
+"""
+
+from compiler.ByteCode.opcodes import OpCode, NO_ARG_OPS
+
+
+ROOT = "<main>"
+
+
+class Profiler:
+    def __init__(self, code):
+        # (OpCode, arg) per offset, decoded once from the CodeObject
+        self.code = code.instructions()
+        self.function_names = [func["name"] for func in code.functions]
+        n = len(self.code)
+
+        self.counts = [0] * n      # executions per offset
+        self.times = [0] * n       # ns spent in the handler per offset
+        self.owner = [None] * n    # Rayvn function an offset ran in
+        self.stacks = {}           # "main;f;g" -> ns
+        self.calls = {}            # function name -> times called
+
+    # ---------------------------------------------------------
+    # Aggregation
+    # ---------------------------------------------------------
+
+    def total_time(self):
+        return sum(self.times)
+
+    def by_opcode(self):
+        """
+        [(opcode name, count, ns)], hottest first.
+        """
+        totals = {}
+        for i, (op, _) in enumerate(self.code):
+            if self.counts[i]:
+                count, ns = totals.get(op.name, (0, 0))
+                totals[op.name] = (count + self.counts[i], ns + self.times[i])
+
+        rows = [(name, count, ns) for name, (count, ns) in totals.items()]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def by_offset(self):
+        """
+        [(offset, count, ns)], hottest first.
+        """
+        rows = [
+            (i, self.counts[i], self.times[i])
+            for i in range(len(self.code))
+            if self.counts[i]
+        ]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def by_function(self):
+        """
+        [(function, calls, instructions, self ns)], hottest first.
+        """
+        totals = {}
+        for i, owner in enumerate(self.owner):
+            if owner is not None:
+                count, ns = totals.get(owner, (0, 0))
+                totals[owner] = (count + self.counts[i], ns + self.times[i])
+
+        rows = [
+            (name, self.calls.get(name, 1 if name == ROOT else 0), count, ns)
+            for name, (count, ns) in totals.items()
+        ]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    # ---------------------------------------------------------
+    # Output
+    # ---------------------------------------------------------
+
+    def report(self, limit=15):
+        total = self.total_time() or 1
+        executed = sum(self.counts)
+        lines = []
+
+        lines.append(f"Rayvn profile: {executed} instructions, {total / 1e6:.2f} ms in handlers")
+
+        lines.append("")
+        lines.append(f"{'opcode':<22}{'count':>12}{'ms':>10}{'%':>7}{'ns/op':>9}")
+        for name, count, ns in self.by_opcode():
+            lines.append(
+                f"{name:<22}{count:>12}{ns / 1e6:>10.2f}{ns / total * 100:>7.1f}{ns / count:>9.0f}"
+            )
+
+        lines.append("")
+        lines.append(f"{'function':<22}{'calls':>12}{'instrs':>12}{'self ms':>10}{'%':>7}")
+        for name, calls, count, ns in self.by_function():
+            lines.append(
+                f"{name:<22}{calls:>12}{count:>12}{ns / 1e6:>10.2f}{ns / total * 100:>7.1f}"
+            )
+
+        lines.append("")
+        lines.append(f"{'offset':>6}  {'instruction':<28}{'function':<16}{'count':>10}{'ms':>9}{'%':>7}")
+        for i, count, ns in self.by_offset()[:limit]:
+            op, arg = self.code[i]
+            text = f"{op.name} {format_arg(op, arg, self.function_names)}".rstrip()
+            lines.append(
+                f"{i:>6}  {text:<28.28}{self.owner[i]:<16.16}{count:>10}{ns / 1e6:>9.2f}{ns / total * 100:>7.1f}"
+            )
+
+        return "\n".join(lines)
+
+    def collapsed(self):
+        """
+        Collapsed stack lines, weighted in nanoseconds.
+        """
+        return "".join(
+            f"{stack} {ns}\n"
+            for stack, ns in sorted(self.stacks.items())
+            if ns
+        )
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+
+def format_arg(op, arg, function_names):
+    if arg is None or op in NO_ARG_OPS:
+        return ""
+    if op in (OpCode.CALL, OpCode.TAIL_CALL):
+        return function_names[arg[0]]
+    return repr(arg)
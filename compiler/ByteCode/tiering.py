@@ -0,0 +1,299 @@
+"""
+Rayvn tiered execution
+
+The VM starts every program as plain bytecode (tier 0) and counts, per
+function, how often it is called and, per loop, how often its backedge
+is taken. Code that crosses a threshold moves to tier 1: the program's
+AST, folded, compiled by the closure backend (Closure/compiler.py).
+
+    hot function   every call site switches to the tier-1 version at
+                   its next call; the activations already running
+                   finish as bytecode
+    hot loop       in a function, counts towards promoting the function
+                   (its next call runs tier 1). At top level the loop
+                   itself is replaced: on its next iteration the VM
+                   hands the global table to a tier-1 closure that runs
+                   the rest of the loop, then resumes after it (OSR,
+                   on-stack replacement)
+
+Nothing is compiled until something is hot, so cold code costs only
+the counting. The AST comes from a loader the VM is given (the source
+is parsed again, with the same front end, on the first tier-up); if it
+is unavailable or doesn't match the bytecode, tiering switches itself
+off and the program carries on as bytecode.
+
+Tier-1 calls are Python calls, so tier-1 recursion is Python
+recursion; past TIER_DEPTH nested calls the rest runs as bytecode,
+which recurses on the VM's own call stack (see bounded_invoke).
+
+Tier-1 code shares the VM's global table. The tier-1 compiler lays
+globals out in the VM's slot order first, so a global has the same
+slot in both tiers, and its loop numbering is the stack compiler's
+loop table (both number loops in source order). Memoized functions
+keep their VM cache in tier 1 too (see memoize).
+"""
+
+import contextlib
+import sys
+import time
+
+from compiler.rayvn_ast import *
+from compiler.flat_ast import FlatAST
+from compiler.Closure.compiler import ClosureCompiler, RECURSION_LIMIT, TAIL, commas, join, run_tail
+from compiler.ByteCode.memo import MISS, SKIP, make_key
+
+
+TIER_UP_CALLS = 1000       # calls before a function is promoted
+TIER_UP_BACKEDGES = 1000   # iterations before a loop is promoted
+
+# Nested tier-1 calls before calls go back to bytecode. A tier-1 call
+# is a few Python frames, which must stay well inside RECURSION_LIMIT
+# (much lower before 3.11, where Python calls also take C stack).
+TIER_DEPTH = 10_000 if sys.version_info >= (3, 11) else 500
+
+# Globals an OSR entry reads where the loop left off: the remaining
+# range (start, end, step) or the live iterator. Not Rayvn identifiers.
+OSR_NAMES = ("<osr 0>", "<osr 1>", "<osr 2>")
+
+
+@contextlib.contextmanager
+def deep_recursion():
+    """
+    Tier-1 calls are Python calls, so deep Rayvn recursion is deep
+    Python recursion.
+    """
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+def bounded_invoke(fallback, limit=TIER_DEPTH):
+    """
+    invoke() for tier-1 code: the same, except that a call nested
+    `limit` deep in tier-1 calls runs as fallback(func, args) instead
+    (as bytecode), which returns its value.
+    """
+    depth = 0
+
+    def invoke(func, frame):
+        nonlocal depth
+        if depth >= limit:
+            return fallback(func, frame)
+
+        # A Rayvn error ends the program, so no need to unwind this
+        depth += 1
+        frame += func.padding
+        if func.body(frame) is TAIL:
+            value = run_tail(frame)
+        else:
+            value = frame[-1]
+        depth -= 1
+        return value
+
+    return invoke
+
+
+def memoize(func, cache):
+    """
+    Wrap a tier-1 Function's body so calls go through the MemoCache
+    the VM keeps for it.
+    """
+    body = func.body
+    argc = len(func.params)
+
+    def memoized(frame):
+        key = make_key(frame[:argc])
+        value = cache.lookup(key)
+
+        if value is MISS or value is SKIP:
+            if body(frame) is TAIL:
+                # run_tail takes the (callee, args) out of the last slot
+                frame.append(run_tail(frame))
+            if value is MISS:
+                cache.store(key, frame[-1])
+        else:
+            frame[-1] = value
+
+    func.body = memoized
+
+
+class TierCompiler(ClosureCompiler):
+    """
+    ClosureCompiler whose global table is the VM's, and which keeps
+    what it needs to compile a top-level loop again later as an OSR
+    entry.
+    """
+
+    def __init__(self, global_names, globals_, invoke):
+        super().__init__()
+        self.globals = globals_
+        self.invoke = invoke
+        for name in (*global_names, *OSR_NAMES):
+            self.var(name)
+
+        self.loop_nodes = []   # every loop, by loop table id
+        self.snapshots = {}    # top-level loop id -> function table snapshot on reaching it
+        self.recording = True
+
+    def statement(self, node):
+        if self.recording and isinstance(node, (WhileStmt, ForInLoop)):
+            if self.frame is self.main:
+                self.snapshots[len(self.loop_nodes)] = self.function_table.snapshot()
+            self.loop_nodes.append(node)
+        super().statement(node)
+
+    def call(self, node, args):
+        func = self.functions[self.function_table.resolve(node.name, len(args))]
+        return join(("{}({}, [", [self.invoke, func]), *commas(args), "])")
+
+    def compile_entry(self, loop_id):
+        """
+        Closure running top-level loop `loop_id` from its next
+        iteration. Calls in it resolve as they did where the loop is.
+        """
+        node = self.loop_nodes[loop_id]
+        resume = [Var(name) for name in OSR_NAMES]
+
+        if isinstance(node, WhileStmt):
+            entry = node
+        elif isinstance(node.iterable, RangeExpr):
+            entry = ForInLoop(node.var, RangeExpr(*resume), node.body)
+        else:
+            entry = ForInLoop(node.var, resume[0], node.body)
+
+        saved = self.function_table.snapshot()
+        self.function_table.restore(self.snapshots[loop_id])
+        self.recording = False
+        try:
+            self.run(self.statement, entry)
+            return self.results.pop().closure()
+        finally:
+            self.function_table.restore(saved)
+            self.recording = True
+
+
+class Tiering:
+    """
+    Tier-1 compilation and the record of what was promoted, for one VM.
+
+    load_ast: () -> the program's Program / FlatAST, or None if it is
+              no longer available (e.g. the source changed)
+    events:   one dict per tier-up, in order: kind ("function" or
+              "loop"), name, trigger ("calls" or "backedges"), count
+              (the counter when it fired), entries (OSR entries, loops
+              only)
+    """
+
+    def __init__(self, load_ast, calls=TIER_UP_CALLS, backedges=TIER_UP_BACKEDGES):
+        self.load_ast = load_ast
+        self.calls = calls
+        self.backedges = backedges
+
+        self.compiler = None
+        self.failed = None        # why tier 1 is unavailable
+        self.compile_time = 0.0
+        self.entries = {}         # loop id -> OSR closure
+        self.events = []
+
+    def compile(self, vm):
+        """
+        Compile the whole program for tier 1, once. Returns the
+        TierCompiler, or None if tier 1 is unavailable.
+        """
+        if self.compiler is not None or self.failed:
+            return self.compiler
+
+        start = time.perf_counter()
+        try:
+            ast = self.load_ast()
+            if ast is None:
+                self.failed = "source unavailable"
+                return None
+
+            # Function -> index, once there are Functions
+            indexes = {}
+
+            def fallback(func, args):
+                return vm.call_bytecode(indexes[func], args)
+
+            compiler = TierCompiler(vm.global_names, vm.globals, bounded_invoke(fallback))
+            if isinstance(ast, FlatAST):
+                compiler.compile_flat(ast)
+            else:
+                compiler.compile(ast)
+        except Exception as e:
+            self.failed = f"compile failed: {e}"
+            return None
+        finally:
+            self.compile_time += time.perf_counter() - start
+
+        # The AST must be the program the bytecode came from
+        ours = [(func.name, func.params) for func in compiler.functions]
+        theirs = [(func["name"], list(func["params"])) for func in vm.functions]
+        if ours != theirs or len(compiler.loop_nodes) < len(vm.code.loops):
+            self.failed = "source does not match the bytecode"
+            return None
+
+        # Slots for names only tier 1 has, then the slot top-level
+        # code returns through
+        vm.globals.extend([0] * (len(compiler.main.vars) + 1 - len(vm.globals)))
+
+        indexes.update((func, index) for index, func in enumerate(compiler.functions))
+        for target in vm.targets:
+            if target.memo is not None:
+                memoize(compiler.functions[target.index], target.memo)
+
+        self.compiler = compiler
+        return compiler
+
+    def function(self, vm, index):
+        """
+        Tier-1 Function for function `index`, or None.
+        """
+        compiler = self.compile(vm)
+        return None if compiler is None else compiler.functions[index]
+
+    def entry(self, vm, loop):
+        """
+        OSR closure for a top-level loop table entry, or None.
+        """
+        compiler = self.compile(vm)
+        if compiler is None:
+            return None
+
+        node = compiler.loop_nodes[loop["id"]]
+        kind = "while" if isinstance(node, WhileStmt) else "range" if isinstance(node.iterable, RangeExpr) else "for"
+        if kind != loop["kind"]:
+            self.failed = "source does not match the bytecode"
+            return None
+
+        if loop["id"] not in self.entries:
+            start = time.perf_counter()
+            self.entries[loop["id"]] = compiler.compile_entry(loop["id"])
+            self.compile_time += time.perf_counter() - start
+        return self.entries[loop["id"]]
+
+    def osr_slots(self):
+        return [self.compiler.main.vars[name] for name in OSR_NAMES]
+
+    def record(self, kind, name, trigger, count):
+        event = {"kind": kind, "name": name, "trigger": trigger, "count": count, "entries": 0}
+        self.events.append(event)
+        return event
+
+    def report(self):
+        lines = [f"{'tier-up':<28}{'trigger':>12}{'count':>10}{'entries':>10}"]
+        for event in self.events:
+            entries = event["entries"] if event["kind"] == "loop" else "-"
+            lines.append(f"{event['name']:<28}{event['trigger']:>12}{event['count']:>10}{entries:>10}")
+        if len(lines) == 1:
+            lines.append("(nothing promoted)")
+
+        if self.failed:
+            lines.append(f"tier 1 unavailable: {self.failed}")
+        elif self.compiler is not None:
+            lines.append(f"tier 1 compile: {self.compile_time * 1000:.1f}ms")
+        return "\n".join(lines)
@@ -1,207 +1,1105 @@
+import time
+
 from compiler.ByteCode.opcodes import OpCode
+from compiler.ByteCode.memo import MemoCache, MEMO_SIZE, MISS, SKIP, make_key, report as report_memo
+from compiler.ByteCode.tiering import deep_recursion
+from compiler.Closure.compiler import RETURN, invoke
+
+
+# Quickening (see VM.build_quickening)
+WARMUP = 8         # same-typed executions before an instruction specializes
+MAX_DEOPTS = 4     # guard misses before an instruction stays generic
+
+# INDEX_GET variant by the indexed value's type (the index must be an int)
+INDEX_GET_VARIANTS = {
+    list: "INDEX_GET_LIST",
+    str: "INDEX_GET_STR",
+    int: "INDEX_GET_DIGITS",
+}
+
+
+def trip_count(r):
+    """
+    How many values range r holds. len(r) would do, but raises
+    OverflowError past sys.maxsize.
+    """
+    step = r.step
+    return max(0, (r.stop - r.start + step - (1 if step > 0 else -1)) // step)
+
+
+class Halt(Exception):
+    """
+    Raised by HALT (and a top-level RETURN) to leave the dispatch loop.
+
+    Using an exception keeps the hot loop free of a per-instruction
+    "still running?" check.
+    """
+    def __init__(self, value=None):
+        self.value = value
+
+
+class Frame:
+    """
+    One function activation.
+
+    return_ip: where the caller resumes
+    base:      operand stack height when the call started; anything the
+               callee leaves above it is discarded on return
+    locals:    the callee's slot list (params first)
+    memo:      (MemoCache, key) the return value is stored under, for a
+               memoized call that missed; None otherwise
+
+    Frames are pooled by the VM and reused across calls.
+    """
+    __slots__ = ("return_ip", "base", "locals", "memo")
+
+    def __init__(self):
+        self.return_ip = 0
+        self.base = 0
+        self.locals = None
+        self.memo = None
+
+
+class CallTarget:
+    """
+    Pre-digested CALL argument, built once at decode time from the
+    compiler's function record.
+
+    calls is only counted while tiering watches the function; memo is
+    its MemoCache if it is memoized.
+    """
+    __slots__ = ("name", "index", "entry", "argc", "padding", "calls", "memo")
+
+    def __init__(self, func, index):
+        self.name = func["name"]
+        self.index = index
+        self.entry = func["entry"]
+        self.argc = len(func["params"])
+        # Slots past the params start at 0; shared, only ever copied
+        self.padding = [0] * (func["locals"] - self.argc)
+        self.calls = 0
+        self.memo = None
+
 
 class VM:
-    def __init__(self, code, functions):
-        self.code = code
+    def __init__(self, code, quicken=True, count_hits=False, tiering=None, memo_size=MEMO_SIZE):
+        self.code = code       # CodeObject
         self.stack = []
-        self.functions = functions
-        self.env = {}
-        self.call_stack = []
+        self.functions = code.functions
+        self.global_names = list(code.names)
+        self.globals = [0] * len(self.global_names)
+        # Top-level code runs with the global table as its frame
+        self.locals = self.globals
+        self.call_stack = []   # active Frames, innermost last
+        self.frame_pool = []   # returned Frames ready for reuse
         self.ip = 0
         # self.iter_stack = []
 
-    def run(self):
-        while True:
-            op, arg = self.code[self.ip]
-            self.ip += 1
+        self.handlers = self.build_handlers()
+        self.dispatch = self.dispatch_table(self.handlers)
+        self.targets = [CallTarget(func, i) for i, func in enumerate(code.functions)]
+        self.program = self.decode(code)
 
+        # variant -> {"specialized", "hits", "misses"}; hits only
+        # with count_hits, which costs a counter bump per execution
+        self.specialization_stats = {}
+        self.count_hits = count_hits
+        if quicken:
+            self.quicken()
 
-            # Instructions
-            if op == OpCode.PUSH_CONST:
-                self.stack.append(arg)
+        # Memoization (see ByteCode/memo.py); memo_size 0 turns it off
+        self.memo_caches = []
+        if memo_size:
+            self.install_memo(memo_size)
 
-            elif op == OpCode.LOAD_VAR:
-                self.stack.append(self.env.get(arg, 0))
+        # Tiering (see ByteCode/tiering.py); None runs bytecode only
+        self.tiering = tiering
+        if tiering is not None:
+            self.install_tiering()
 
-            elif op == OpCode.STORE_VAR:
-                if not self.stack:
-                    raise Exception(f"STORE_VAR {arg} with empty stack")
-                self.env[arg] = self.stack.pop()
+    # ---------------------------------------------------------
+    # Dispatch table
+    # ---------------------------------------------------------
 
-            # Iterators
-            elif op == OpCode.ITER_INIT:
-                iterable = self.stack.pop()
+    def dispatch_table(self, handlers):
+        """
+        Handler list indexed by opcode number (OpCode.value).
+        """
+        table = [self.unknown_op(n) for n in range(256)]
+        for op, handler in handlers.items():
+            table[op.value] = handler
+        return table
 
-                if isinstance(iterable, (list, str, range)):
-                    self.stack.append(iter(iterable))
+    def decode(self, code):
+        """
+        Pair every instruction of the CodeObject with its handler once,
+        up front, resolving operands on the way: constants out of the
+        pool, CALL to the shared CallTarget of its function index (the
+        compiler has already checked argc against it), other operands
+        as the plain ints they are.
 
-                elif isinstance(iterable, int):
-                    # iterate over digits
-                    digits = str(abs(iterable))
-                    self.stack.append(iter(digits))
+        Dispatching on code.ops / code.args directly would redo the
+        handler and constant lookups on every executed instruction;
+        measured 0-13% slower than this per-VM (handler, arg) list.
+        """
+        dispatch = self.dispatch
+        targets = self.targets
+        consts = code.consts
 
-                else:
-                    raise Exception("Object is not iterable")
+        push_const = OpCode.PUSH_CONST.value
+        for_range = OpCode.FOR_RANGE.value
+        call = OpCode.CALL.value
+        tail_call = OpCode.TAIL_CALL.value
+
+        program = []
+        for op, arg in zip(code.ops, code.args):
+            if op == push_const or op == for_range:
+                arg = consts[arg]
+            elif op == call or op == tail_call:
+                index, _ = consts[arg]
+                arg = targets[index]
+            program.append((dispatch[op], arg))
+
+        return program
+
+    def unknown_op(self, number):
+        def handler(arg):
+            try:
+                op = OpCode(number)
+            except ValueError:
+                op = number
+            raise Exception(f"Unknown opcode: {op}")
+        return handler
+
+    def build_handlers(self):
+        """
+        Build the OpCode -> handler table.
+
+        Handlers are closures so the operand stack's append/pop are
+        bound once and read as fast cell variables on every instruction.
+        """
+        vm = self
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        globals_ = self.globals
+
+        # Instructions
+        def push_const(arg):
+            push(arg)
+
+        def dup(arg):
+            push(stack[-1])
+
+        def load_local(arg):
+            push(vm.locals[arg])
+
+        def store_local(arg):
+            vm.locals[arg] = pop()
+
+        def load_global(arg):
+            push(globals_[arg])
+
+        def store_global(arg):
+            globals_[arg] = pop()
+
+        # Iterators
+        def iter_init(arg):
+            iterable = pop()
+
+            if isinstance(iterable, (list, str, range)):
+                push(iter(iterable))
+
+            elif isinstance(iterable, int):
+                # iterate over digits
+                digits = str(abs(iterable))
+                push(iter(digits))
+
+            else:
+                raise Exception("Object is not iterable")
+
+        def iter_next(arg):
+            it = pop()
+
+            try:
+                value = next(it)
+                push(it)        # keep iterator
+                push(value)     # current value
+                push(True)      # continue loop
+            except StopIteration:
+                push(False)     # stop loop
+
+        def iter_end(arg):
+            pass
+
+        # Counted loops
+        def range_init(arg):
+            step = pop()
+            end = pop()
+            start = pop()
+
+            # range() raises the same errors BUILD_RANGE would
+            r = range(start, end, step)
+
+            frame = vm.locals
+            frame[arg] = r.start          # next value
+            frame[arg + 1] = trip_count(r)    # iterations left
+            frame[arg + 2] = r.step
+
+        def for_range(arg):
+            exit_, var, state = arg
+            frame = vm.locals
+            left = frame[state + 1]
+
+            if left:
+                value = frame[state]
+                frame[var] = value
+                frame[state] = value + frame[state + 2]
+                frame[state + 1] = left - 1
+            else:
+                vm.ip = exit_
+
+        # Arithmetic and Comparison
+        def add(arg):
+            b = pop()
+            stack[-1] = stack[-1] + b
+
+        def sub(arg):
+            b = pop()
+            stack[-1] = stack[-1] - b
+
+        def mul(arg):
+            b = pop()
+            stack[-1] = stack[-1] * b
+
+        def div(arg):
+            b = pop()
+            stack[-1] = stack[-1] / b
+
+        def neg(arg):
+            stack[-1] = -stack[-1]
+
+        def eq(arg):
+            b = pop()
+            stack[-1] = stack[-1] == b
+
+        def neq(arg):
+            b = pop()
+            stack[-1] = stack[-1] != b
+
+        def gt(arg):
+            b = pop()
+            stack[-1] = stack[-1] > b
+
+        def gte(arg):
+            b = pop()
+            stack[-1] = stack[-1] >= b
+
+        def lt(arg):
+            b = pop()
+            stack[-1] = stack[-1] < b
+
+        def lte(arg):
+            b = pop()
+            stack[-1] = stack[-1] <= b
+
+        def not_(arg):
+            stack[-1] = not stack[-1]
+
+        # Boolean / Logic
+        def jump(arg):
+            vm.ip = arg
+
+        def jump_if_false(arg):
+            if not pop():
+                vm.ip = arg
+
+        def jump_if_true(arg):
+            if pop():
+                vm.ip = arg
+
+        def jump_if_false_or_pop(arg):
+            if stack[-1]:
+                pop()
+            else:
+                vm.ip = arg
+
+        def jump_if_true_or_pop(arg):
+            if stack[-1]:
+                vm.ip = arg
+            else:
+                pop()
+
+        call_stack = self.call_stack
+        frame_pool = self.frame_pool
+
+        def call(arg):
+            frame = frame_pool.pop() if frame_pool else Frame()
+
+            # Arguments are already on the stack in order: slice them
+            # off as the start of the callee's locals
+            base = len(stack) - arg.argc
+            frame_locals = stack[base:]
+            del stack[base:]
+            frame_locals += arg.padding
+
+            frame.return_ip = vm.ip
+            frame.base = base
+            frame.locals = frame_locals
+            call_stack.append(frame)
+
+            vm.locals = frame_locals
+            vm.ip = arg.entry
+
+        def tail_call(arg):
+            # Only emitted inside functions, so there is always a frame.
+            # It is reused as is: same return address, same stack base.
+            frame = call_stack[-1]
+
+            frame_locals = stack[len(stack) - arg.argc:]
+            # Drop the arguments and anything the caller left behind
+            del stack[frame.base:]
+            frame_locals += arg.padding
+
+            frame.locals = frame_locals
+            vm.locals = frame_locals
+            vm.ip = arg.entry
+
+        def return_(arg):
+            if not call_stack:
+                # Top-level return = program end
+                raise Halt(pop() if stack else None)
+
+            frame = call_stack.pop()
+            ret = pop()
+
+            memo = frame.memo
+            if memo is not None:
+                frame.memo = None
+                memo[0].store(memo[1], ret)
+
+            # Drop anything the callee left behind (e.g. an iterator
+            # from a loop it returned out of)
+            base = frame.base
+            if len(stack) > base:
+                del stack[base:]
+            push(ret)
+
+            vm.ip = frame.return_ip
+            vm.locals = call_stack[-1].locals if call_stack else globals_
+
+            frame.locals = None
+            frame_pool.append(frame)
+
+        def print_(arg):
+            print(pop())
+
+        def pop_(arg):
+            pop()
+
+        def build_range(arg):
+            step = pop()
+            end = pop()
+            start = pop()
+            push(range(start, end, step))
+
+        # Arrays
+        def build_array(arg):
+            count = arg
+            elements = [pop() for _ in range(count)][::-1]
+            push(elements)
+
+        def index_get(arg):
+            idx = pop()
+            value = pop()
+
+            if not isinstance(idx, int):
+                raise Exception("Index must be integer")
+
+            if isinstance(value, list):
+                push(value[idx])
 
-            elif op == OpCode.ITER_NEXT:
-                it = self.stack.pop()
-
-                try:
-                    value = next(it)
-                    self.stack.append(it)        # keep iterator
-                    self.stack.append(value)     # current value
-                    self.stack.append(True)      # continue loop
-                except StopIteration:
-                    self.stack.append(False)     # stop loop
+            elif isinstance(value, str):
+                push(value[idx])
 
-            elif op == OpCode.ITER_END:
-                pass
+            elif isinstance(value, int):
+                digits = str(abs(value))
+                push(int(digits[idx]))
 
-            # Arithmetic and Comparison
-            elif op == OpCode.ADD:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a + b)
+            else:
+                raise Exception("Indexing unsupported type")
 
-            elif op == OpCode.SUB:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a - b)
+        def index_set(arg):
+            val = pop()
+            idx = pop()
+            target = pop()
 
-            elif op == OpCode.MUL:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a * b)
-
-            elif op == OpCode.DIV:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a / b)
+            if not isinstance(idx, int):
+                raise Exception("Index must be integer")
 
-            elif op == OpCode.NEG:
-                self.stack.append(-self.stack.pop())
+            if isinstance(target, list):
+                target[idx] = val
+                push(val)
 
-            elif op == OpCode.EQ:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a == b)
+            else:
+                raise Exception("Assignment only supported for arrays")
 
-            elif op == OpCode.NEQ:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a != b)
+        def halt(arg):
+            raise Halt()
 
-            elif op == OpCode.GT:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a > b)
+        return {
+            OpCode.PUSH_CONST: push_const,
+            OpCode.DUP: dup,
+            OpCode.LOAD_LOCAL: load_local,
+            OpCode.STORE_LOCAL: store_local,
+            OpCode.LOAD_GLOBAL: load_global,
+            OpCode.STORE_GLOBAL: store_global,
 
-            elif op == OpCode.GTE:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a >= b)
+            OpCode.ITER_INIT: iter_init,
+            OpCode.ITER_NEXT: iter_next,
+            OpCode.ITER_END: iter_end,
+            OpCode.RANGE_INIT: range_init,
+            OpCode.FOR_RANGE: for_range,
 
-            elif op == OpCode.LT:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a < b)
+            OpCode.ADD: add,
+            OpCode.SUB: sub,
+            OpCode.MUL: mul,
+            OpCode.DIV: div,
+            OpCode.NEG: neg,
 
-            elif op == OpCode.LTE:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a <= b)
+            OpCode.EQ: eq,
+            OpCode.NEQ: neq,
+            OpCode.GT: gt,
+            OpCode.GTE: gte,
+            OpCode.LT: lt,
+            OpCode.LTE: lte,
+            OpCode.NOT: not_,
 
-            elif op == OpCode.NOT:
-                self.stack.append(not self.stack.pop())
+            OpCode.JUMP: jump,
+            OpCode.JUMP_IF_FALSE: jump_if_false,
+            OpCode.JUMP_IF_TRUE: jump_if_true,
+            OpCode.JUMP_IF_FALSE_OR_POP: jump_if_false_or_pop,
+            OpCode.JUMP_IF_TRUE_OR_POP: jump_if_true_or_pop,
 
-            # Boolean / Logic
-            elif op == OpCode.JUMP:
-                self.ip = arg
+            OpCode.CALL: call,
+            OpCode.TAIL_CALL: tail_call,
+            OpCode.RETURN: return_,
 
-            elif op == OpCode.JUMP_IF_FALSE:
-                if not self.stack.pop():
-                    self.ip = arg
+            OpCode.PRINT: print_,
+            OpCode.POP: pop_,
 
-            elif op == OpCode.CALL:
-                func = arg  # dict: { "entry", "params" }
+            OpCode.BUILD_RANGE: build_range,
+            OpCode.BUILD_ARRAY: build_array,
+            OpCode.INDEX_GET: index_get,
+            OpCode.INDEX_SET: index_set,
 
-                # Save return address and environment
-                self.call_stack.append((self.ip, self.env))
+            OpCode.HALT: halt,
+        }
 
-                # Build new environment
-                new_env = {}
+    # ---------------------------------------------------------
+    # Quickening
+    # ---------------------------------------------------------
 
-                argc = len(func["params"])
-                args = [self.stack.pop() for _ in range(argc)][::-1]
+    def quicken(self):
+        """
+        Start every instruction that has specialized variants out as
+        adaptive.
+        """
+        adaptive = self.build_quickening()
+        program = self.program
 
-                for name, value in zip(func["params"], args):
-                    new_env[name] = value
+        for i, op in enumerate(self.code.ops):
+            handler = adaptive.get(op)
+            if handler is not None:
+                program[i] = (handler, program[i][1])
 
-                self.env = new_env
-                self.ip = func["entry"]
+    def build_quickening(self):
+        """
+        Build the adaptive handlers, keyed by opcode number.
 
-            elif op == OpCode.RETURN:
-                ret = self.stack.pop() if self.stack else None
+        Only instructions whose generic handler dispatches on operand
+        types in Python have variants; ADD / LT and friends already
+        dispatch in C, where a type guard only adds work.
 
-                if not self.call_stack:
-                    # Top-level return = program end
-                    return ret
+        An adaptive instruction runs the generic handler and notes
+        which variant its operands would have suited. After WARMUP
+        executions in a row that agree, it rewrites itself in place in
+        self.program to that variant (or, if none fits, to the plain
+        generic handler). A variant checks its operand types first;
+        on a miss it runs the generic handler and turns the
+        instruction adaptive again, or generic for good after
+        MAX_DEOPTS misses.
+        """
+        vm = self
+        stack = self.stack
+        pop = stack.pop
+        program = self.program
+        handlers = self.handlers
+        stats = self.specialization_stats
+        count_hits = self.count_hits
 
-                self.ip, self.env = self.call_stack.pop()
-                self.stack.append(ret)
+        n = len(program)
+        seen = [None] * n      # variant the last adaptive run suited
+        streak = [0] * n       # how many runs in a row agreed
+        deopts = [0] * n
 
-            elif op == OpCode.PRINT:
-                print(self.stack.pop())
+        def record(variant, field):
+            entry = stats.get(variant)
+            if entry is None:
+                entry = stats[variant] = {"specialized": 0, "hits": 0, "misses": 0}
+            entry[field] += 1
 
-            elif op == OpCode.POP:
-                self.stack.pop()
+        def observe(op, variant):
+            ip = vm.ip - 1
 
-            elif op == OpCode.BUILD_RANGE:
-                step = self.stack.pop()
-                end = self.stack.pop()
-                start = self.stack.pop()
-                self.stack.append(range(start, end, step))
+            if variant != seen[ip]:
+                seen[ip] = variant
+                streak[ip] = 1
+                return
 
-            # Arrays
-            elif op == OpCode.BUILD_ARRAY:
-                count = arg
-                elements = [self.stack.pop() for _ in range(count)][::-1]
-                self.stack.append(elements)
+            streak[ip] += 1
+            if streak[ip] < WARMUP:
+                return
 
-            elif op == OpCode.INDEX_GET:
-                idx = self.stack.pop()
-                value = self.stack.pop()
+            arg = program[ip][1]
+            if variant is None:
+                program[ip] = (handlers[op], arg)
+            else:
+                program[ip] = (specialize(variant), arg)
+                record(variant, "specialized")
 
-                if not isinstance(idx, int):
-                    raise Exception("Index must be integer")
+        def miss(op, variant, arg):
+            ip = vm.ip - 1
+            record(variant, "misses")
 
-                if isinstance(value, list):
-                    self.stack.append(value[idx])
+            deopts[ip] += 1
+            seen[ip] = None
+            streak[ip] = 0
+            program[ip] = (adaptive[op] if deopts[ip] < MAX_DEOPTS else handlers[op], arg)
 
-                elif isinstance(value, str):
-                    self.stack.append(value[idx])
+            handlers[op](arg)
 
-                elif isinstance(value, int):
-                    digits = str(abs(value))
-                    self.stack.append(int(digits[idx]))
+        def specialize(variant):
+            handler = variants[variant]()
+            if not count_hits:
+                return handler
 
+            def counted(arg):
+                stats[variant]["hits"] += 1
+                handler(arg)
+            return counted
+
+        # Variants. Each is a factory, so a variant with an inline
+        # cache gets one cache per instruction.
+
+        def index_get_list():
+            def index_get_list(arg):
+                value = stack[-2]
+                idx = stack[-1]
+                if type(value) is list and type(idx) is int:
+                    pop()
+                    stack[-1] = value[idx]
                 else:
-                    raise Exception("Indexing unsupported type")
+                    miss(OpCode.INDEX_GET, "INDEX_GET_LIST", arg)
+            return index_get_list
 
-            elif op == OpCode.INDEX_SET:
-                val = self.stack.pop()
-                idx = self.stack.pop()
-                target = self.stack.pop()
+        def index_get_str():
+            def index_get_str(arg):
+                value = stack[-2]
+                idx = stack[-1]
+                if type(value) is str and type(idx) is int:
+                    pop()
+                    stack[-1] = value[idx]
+                else:
+                    miss(OpCode.INDEX_GET, "INDEX_GET_STR", arg)
+            return index_get_str
 
-                if not isinstance(idx, int):
-                    raise Exception("Index must be integer")
+        def index_get_digits():
+            # Inline cache: the digits of the last number indexed here,
+            # which loops like `for i in range(...) { n[i] }` reuse
+            cached = None
+            digits = ()
 
-                if isinstance(target, list):
-                    target[idx] = val
-                    self.stack.append(val)
+            def index_get_digits(arg):
+                nonlocal cached, digits
+                value = stack[-2]
+                idx = stack[-1]
+                if type(value) is int and type(idx) is int:
+                    if value != cached:
+                        cached = value
+                        digits = [int(d) for d in str(abs(value))]
+                    pop()
+                    stack[-1] = digits[idx]
+                else:
+                    miss(OpCode.INDEX_GET, "INDEX_GET_DIGITS", arg)
+            return index_get_digits
 
+        def index_set_list():
+            def index_set_list(arg):
+                if type(stack[-3]) is list and type(stack[-2]) is int:
+                    val = pop()
+                    idx = pop()
+                    stack[-1][idx] = val
+                    stack[-1] = val
                 else:
-                    raise Exception("Assignment only supported for arrays")
+                    miss(OpCode.INDEX_SET, "INDEX_SET_LIST", arg)
+            return index_set_list
+
+        variants = {
+            "INDEX_GET_LIST": index_get_list,
+            "INDEX_GET_STR": index_get_str,
+            "INDEX_GET_DIGITS": index_get_digits,
+            "INDEX_SET_LIST": index_set_list,
+        }
+
+        # Adaptive handlers
+
+        index_get = handlers[OpCode.INDEX_GET]
+        index_set = handlers[OpCode.INDEX_SET]
+
+        def index_get_adaptive(arg):
+            value = stack[-2]
+            variant = None
+            if type(stack[-1]) is int:
+                variant = INDEX_GET_VARIANTS.get(type(value))
+            index_get(arg)
+            observe(OpCode.INDEX_GET, variant)
+
+        def index_set_adaptive(arg):
+            variant = None
+            if type(stack[-3]) is list and type(stack[-2]) is int:
+                variant = "INDEX_SET_LIST"
+            index_set(arg)
+            observe(OpCode.INDEX_SET, variant)
+
+        adaptive = {
+            OpCode.INDEX_GET: index_get_adaptive,
+            OpCode.INDEX_SET: index_set_adaptive,
+        }
+        return {op.value: handler for op, handler in adaptive.items()}
+
+    def specialization_report(self):
+        lines = [f"{'variant':<20}{'specialized':>12}{'hits':>12}{'misses':>8}"]
+        for variant, entry in sorted(self.specialization_stats.items()):
+            hits = entry["hits"] if self.count_hits else "-"
+            lines.append(f"{variant:<20}{entry['specialized']:>12}{hits:>12}{entry['misses']:>8}")
+        if len(lines) == 1:
+            lines.append("(nothing specialized)")
+        return "\n".join(lines)
+
+    # ---------------------------------------------------------
+    # Memoization
+    # ---------------------------------------------------------
+
+    def install_memo(self, limit):
+        """
+        Give every function the compiler marked memo a MemoCache of
+        `limit` entries, and point its CALL / TAIL_CALL sites at
+        handlers that consult it.
+
+        A hit pushes the cached result without entering the function.
+        A miss calls it as usual, with the key on the new frame, and
+        RETURN stores the result. A tail call reuses its caller's
+        frame: on a miss the key goes on the frame only if the caller
+        isn't memoized itself (the value returned is the same either
+        way).
+        """
+        stack = self.stack
+        push = stack.append
+        call_stack = self.call_stack
+        program = self.program
+        call = self.handlers[OpCode.CALL]
+        tail_call = self.handlers[OpCode.TAIL_CALL]
+        return_ = self.handlers[OpCode.RETURN]
+
+        for target, func in zip(self.targets, self.functions):
+            if func["memo"]:
+                target.memo = MemoCache(func["name"], limit)
+                self.memo_caches.append(target.memo)
+
+        def call_memo(arg):
+            cache = arg.memo
+            base = len(stack) - arg.argc
+            key = make_key(stack[base:])
+            value = cache.lookup(key)
+
+            if value is MISS:
+                call(arg)
+                call_stack[-1].memo = (cache, key)
+            elif value is SKIP:
+                call(arg)
+            else:
+                del stack[base:]
+                push(value)
+
+        def tail_call_memo(arg):
+            cache = arg.memo
+            base = len(stack) - arg.argc
+            key = make_key(stack[base:])
+            value = cache.lookup(key)
+
+            if value is MISS or value is SKIP:
+                tail_call(arg)
+                frame = call_stack[-1]
+                if value is MISS and frame.memo is None:
+                    frame.memo = (cache, key)
+            else:
+                del stack[base:]
+                push(value)
+                return_(None)
+
+        call_op = OpCode.CALL.value
+        tail_call_op = OpCode.TAIL_CALL.value
+
+        for ip, op in enumerate(self.code.ops):
+            if op == call_op or op == tail_call_op:
+                arg = program[ip][1]
+                if arg.memo is not None:
+                    program[ip] = (call_memo if op == call_op else tail_call_memo, arg)
+
+    def memo_report(self):
+        return report_memo(self.memo_caches)
+
+    # ---------------------------------------------------------
+    # Tiering
+    # ---------------------------------------------------------
+
+    def install_tiering(self):
+        """
+        Swap counting handlers in for every CALL / TAIL_CALL and every
+        loop backedge: any jump back to the start of the innermost loop
+        around it, which continues are too, and so are tests that the
+        peephole pass threaded into the backedge. A conditional one
+        counts when it is taken.
+
+        A function whose calls reach tiering.calls is promoted: every
+        call site of it is rewritten in self.program to invoke the
+        tier-1 version, so the next call runs it. A loop whose
+        backedges reach tiering.backedges promotes the function it is
+        in the same way, or, at top level, is entered in tier 1 right
+        away (OSR): its jumps become an entry that hands the loop's
+        state to the tier-1 closure and continues past the loop when
+        it finishes.
+
+        Once a counter has fired its handlers are replaced by plain
+        ones, so steady-state code pays nothing. If tier 1 turns out
+        to be unavailable, every counter is removed.
+
+        Calls to memoized functions are left to their memo handlers
+        and not counted; tier-1 code calling them shares their cache.
+
+        Recursion too deep for tier 1 carries on in bytecode (see
+        call_bytecode below).
+        """
+        vm = self
+        tiering = self.tiering
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        call_stack = self.call_stack
+        globals_ = self.globals
+        program = self.program
+        ops = self.code.ops
+        plain = self.dispatch
+        call = self.handlers[OpCode.CALL]
+        tail_call = self.handlers[OpCode.TAIL_CALL]
+        return_ = self.handlers[OpCode.RETURN]
+
+        call_op = OpCode.CALL.value
+        tail_call_op = OpCode.TAIL_CALL.value
+        jump_op = OpCode.JUMP.value
+        backedge_ops = {jump_op, OpCode.JUMP_IF_FALSE.value, OpCode.JUMP_IF_TRUE.value}
+
+        sites = {}          # function index -> ips calling it
+        loop_sites = {}     # loop id -> ips of its backedges
+        promoted = set()    # function indexes running tier 1
+
+        for ip, op in enumerate(ops):
+            if (op == call_op or op == tail_call_op) and program[ip][1].memo is None:
+                sites.setdefault(program[ip][1].index, []).append(ip)
+
+        for loop in self.code.loops:
+            # Inner loops come later in the table and take over their jumps
+            for ip in range(loop["start"], loop["backedge"] + 1):
+                if ops[ip] in backedge_ops and program[ip][1] == loop["start"]:
+                    loop_sites[ip] = loop
+        by_loop = {}
+        for ip, loop in loop_sites.items():
+            by_loop.setdefault(loop["id"], []).append(ip)
+
+        def restore(ips):
+            for ip in ips:
+                program[ip] = (plain[ops[ip]], program[ip][1])
+
+        def disable():
+            for ips in sites.values():
+                restore(ips)
+            for ips in by_loop.values():
+                restore(ips)
+
+        # Functions
+
+        def promote(target, trigger, count):
+            index = target.index
+            if index in promoted or index not in sites:
+                return
+            func = tiering.function(vm, index)
+            if func is None:
+                disable()
+                return
+
+            promoted.add(index)
+            tiering.record("function", target.name, trigger, count)
+            for ip in sites.get(index, ()):
+                make = call_optimized if ops[ip] == call_op else tail_call_optimized
+                program[ip] = (make(func), program[ip][1])
+
+        def call_optimized(func):
+            def call_optimized(arg):
+                if nested:
+                    call(arg)
+                    return
+                base = len(stack) - arg.argc
+                args = stack[base:]
+                del stack[base:]
+                push(invoke(func, args))
+            return call_optimized
+
+        def tail_call_optimized(func):
+            # The tier-1 call returns a value, which this frame returns
+            def tail_call_optimized(arg):
+                if nested:
+                    tail_call(arg)
+                    return
+                base = len(stack) - arg.argc
+                args = stack[base:]
+                del stack[base:]
+                push(invoke(func, args))
+                return_(None)
+            return tail_call_optimized
+
+        # Tier 1 calls back into bytecode once it is TIER_DEPTH calls
+        # deep (see tiering.bounded_invoke). The function runs in a
+        # dispatch loop of its own and returns to an extra HALT past
+        # the end of the program; until it does, nothing enters tier 1
+        # again, so the recursion goes on on the VM's call stack.
+        leave_ip = len(program)
+        program.append((plain[OpCode.HALT.value], None))
+        nested = 0
+
+        def call_bytecode(index, args):
+            nonlocal nested
+            ip = vm.ip
+            stack.extend(args)
+            call(vm.targets[index])
+            call_stack[-1].return_ip = leave_ip
+
+            nested += 1
+            try:
+                vm.dispatch_loop()
+            finally:
+                nested -= 1
+            vm.ip = ip
+            return pop()
+
+        self.call_bytecode = call_bytecode
+
+        threshold = tiering.calls
+
+        def call_counted(arg):
+            arg.calls += 1
+            if arg.calls >= threshold:
+                promote(arg, "calls", arg.calls)
+            call(arg)
+
+        def tail_call_counted(arg):
+            arg.calls += 1
+            if arg.calls >= threshold:
+                promote(arg, "calls", arg.calls)
+            tail_call(arg)
+
+        for ips in sites.values():
+            for ip in ips:
+                counted = call_counted if ops[ip] == call_op else tail_call_counted
+                program[ip] = (counted, program[ip][1])
+
+        # Loops
+
+        def backedge(ip, taken):
+            """
+            Handler for the backedge at `ip`: jumps as its plain
+            handler does, then runs taken(arg) if the jump was taken.
+            """
+            if ops[ip] == jump_op:
+                def backedge(arg):
+                    vm.ip = arg
+                    taken(arg)
+                return backedge
+
+            test = plain[ops[ip]]
+
+            def backedge(arg):
+                test(arg)
+                if vm.ip == arg:
+                    taken(arg)
+            return backedge
+
+        def backedge_counted(loop):
+            ips = by_loop[loop["id"]]
+            count = 0
+
+            def counted(arg):
+                nonlocal count
+                count += 1
+                if count < tiering.backedges:
+                    return
+
+                restore(ips)
+                if loop["function"] is not None:
+                    promote(vm.targets[loop["function"]], "backedges", count)
+                    return
+
+                if loop["exit"] is None:
+                    # Nowhere known to resume after it: stays bytecode
+                    return
+
+                entry = tiering.entry(vm, loop)
+                if entry is None:
+                    disable()
+                    return
+
+                event = tiering.record("loop", f"loop {loop['id']} ({loop['kind']})", "backedges", count)
+                osr = osr_entry(loop, entry, event)
+                for ip in ips:
+                    program[ip] = (backedge(ip, osr), program[ip][1])
+                osr(arg)
+            return counted
+
+        def osr_entry(loop, entry, event):
+            """
+            What a taken backedge of a hot top-level loop runs: the
+            rest of the loop, in tier 1.
+            """
+            kind = loop["kind"]
+            exit_ = loop["exit"]
+            resume, end, step = tiering.osr_slots()
+            if kind == "range":
+                state = program[loop["start"]][1][2]
+
+            def osr(arg):
+                event["entries"] += 1
+
+                if kind == "range":
+                    # Where FOR_RANGE left off, as a range
+                    next_ = globals_[state]
+                    globals_[resume] = next_
+                    globals_[end] = next_ + globals_[state + 1] * globals_[state + 2]
+                    globals_[step] = globals_[state + 2]
+                elif kind == "for":
+                    globals_[resume] = pop()
+
+                if entry(globals_) is RETURN:
+                    raise Halt(globals_[-1])
+                vm.ip = exit_
+            return osr
+
+        for ips in by_loop.values():
+            counted = backedge_counted(loop_sites[ips[0]])
+            for ip in ips:
+                program[ip] = (backedge(ip, counted), program[ip][1])
+
+    # ---------------------------------------------------------
+    # Dispatch loop
+    # ---------------------------------------------------------
+
+    def run(self):
+        if self.tiering is not None:
+            # Tier-1 calls recurse in Python
+            with deep_recursion():
+                return self.dispatch_loop()
+        return self.dispatch_loop()
+
+    def dispatch_loop(self):
+        program = self.program
+
+        try:
+            while True:
+                handler, arg = program[self.ip]
+                self.ip += 1
+                handler(arg)
+        except Halt as halt:
+            return halt.value
+
+    def run_profiled(self, profiler):
+        """
+        Same as run(), but times every instruction into `profiler`
+        (see compiler.ByteCode.profiler).
+
+        Kept as a separate loop so run() carries no instrumentation.
+        """
+        from compiler.ByteCode.profiler import ROOT
+
+        program = self.program
+        ops = self.code.ops
+        clock = time.perf_counter_ns
+
+        counts = profiler.counts
+        times = profiler.times
+        owner = profiler.owner
+        stacks = profiler.stacks
+        calls = profiler.calls
+
+        is_call = [op == OpCode.CALL.value for op in ops]
+        is_tail_call = [op == OpCode.TAIL_CALL.value for op in ops]
+        is_return = [op == OpCode.RETURN.value for op in ops]
+
+        call_stack = self.call_stack
+        names = [ROOT]          # Rayvn call stack, mirrors call_stack
+        stack_key = ROOT        # ";".join(names), kept incrementally
+        keys = [ROOT]
+
+        ip = self.ip
+        elapsed = 0
+
+        try:
+            while True:
+                ip = self.ip
+                handler, arg = program[ip]
+                self.ip = ip + 1
+
+                depth = len(call_stack)
+                start = clock()
+                handler(arg)
+                elapsed = clock() - start
+
+                counts[ip] += 1
+                times[ip] += elapsed
+                owner[ip] = names[-1]
+                stacks[stack_key] = stacks.get(stack_key, 0) + elapsed
+
+                # A memoized call that hits enters no frame (and a
+                # tail call that hits returns from the caller's)
+                if is_call[ip] and len(call_stack) > depth:
+                    names.append(arg.name)
+                    stack_key = f"{stack_key};{arg.name}"
+                    keys.append(stack_key)
+                    calls[arg.name] = calls.get(arg.name, 0) + 1
+
+                elif is_tail_call[ip] and len(call_stack) == depth:
+                    # The callee replaces the caller on the stack
+                    names[-1] = arg.name
+                    stack_key = f"{keys[-2]};{arg.name}"
+                    keys[-1] = stack_key
+                    calls[arg.name] = calls.get(arg.name, 0) + 1
+
+                elif (is_return[ip] or is_tail_call[ip]) and len(names) > 1:
+                    names.pop()
+                    keys.pop()
+                    stack_key = keys[-1]
+
+        except Halt as halt:
+            # The instruction that halted never reached the bookkeeping
+            counts[ip] += 1
+            owner[ip] = names[-1]
+            return halt.value
 
-            elif op == OpCode.HALT:
-                break
\ No newline at end of file
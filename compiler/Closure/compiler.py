@@ -0,0 +1,778 @@
+"""
+Rayvn closure compiler
+
+Turns the same (optimized) AST the VMs run into a tree of pre-bound
+Python closures, one per statement (and per block, loop and function
+body), each taking the current frame:
+
+    total = total + i * j      def run(f):
+                                   f[0] = (f[0] + (f[1] * f[2]))
+
+There is no instruction dispatch: a statement runs as one Python call
+and Rayvn loops are Python loops.
+
+Frames are plain lists: variables (params first) by slot, then a last
+slot for the return value. Top-level code runs with the global table
+as its frame. Statements return None, or a signal (BREAK, CONTINUE,
+RETURN, TAIL) that enclosing blocks pass up until a loop or call
+consumes it.
+
+Closures are specialized to their operands rather than composed from
+one closure per expression node. Small expression trees are rendered
+as fragments of Python source, and each statement's closure is built
+from its fragments by a cached factory (see specialize()). Loops and
+if-branches whose bodies are only simple statements (assignments,
+log, index stores, return) take those statements inline too, so a
+tight numeric loop runs without any call per iteration.
+
+Like the other compilers this never recurses over statements or
+unbounded expressions: handlers push (method, *args) actions onto
+self.work and leave finished pieces on self.results.
+"""
+
+import sys
+from collections.abc import Iterator
+
+from compiler.rayvn_ast import *
+from compiler.lexer import TokenType
+from compiler.analysis import assigned_names, function_defs
+from compiler.codegen import AND_OPS, OR_OPS, FunctionTable, WorkStack
+
+BINARY_OPS = {
+    TokenType.PLUS: "+",
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.SLASH: "/",
+
+    TokenType.GT: ">",
+    TokenType.GTE: ">=",
+    TokenType.LT: "<",
+    TokenType.LTE: "<=",
+    TokenType.EQEQ: "==",
+    TokenType.NOTEQ: "!=",
+}
+
+CONSTANTS = (Number, Boolean, String)
+
+# Operator nesting rendered into one closure; deeper subtrees get
+# closures of their own
+INLINE_DEPTH = 3
+
+# Most simple statements a block joins into one closure
+INLINE_STATEMENTS = 6
+
+# Deep Rayvn recursion is deep Python recursion here. From 3.11,
+# Python-to-Python calls don't use the C stack, so the limit only bounds
+# memory; before that each call takes C stack too, and an 8 MB stack
+# overflows (a segfault, not a RecursionError) at about 15,000 frames.
+RECURSION_LIMIT = 1_000_000 if sys.version_info >= (3, 11) else 8_000
+
+
+# ---------------------------------------------------------
+# Signals
+# ---------------------------------------------------------
+
+BREAK = object()
+CONTINUE = object()
+RETURN = object()     # value is in the frame's last slot
+TAIL = object()       # (Function, args) is in the frame's last slot
+
+
+# ---------------------------------------------------------
+# Runtime
+# ---------------------------------------------------------
+
+class Function:
+    """
+    A compiled function. body and padding are filled in once its
+    definition is compiled; calls read them at run time, so calls
+    compiled before the definition work.
+
+    padding: what follows the arguments in a new frame (the other
+             variables, 0, and the return slot, None)
+    """
+    __slots__ = ("name", "params", "body", "padding")
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = list(params)
+        self.body = None
+        self.padding = [None]
+
+
+def invoke(func, frame):
+    """
+    Call `func` with `frame` holding its arguments.
+    """
+    frame += func.padding
+    if func.body(frame) is TAIL:
+        return run_tail(frame)
+    return frame[-1]
+
+
+def run_tail(frame):
+    """
+    Finish a call whose body ended in a tail call: keep running the
+    callee in a fresh frame, without growing the Python stack.
+    """
+    while True:
+        # pop, so no frame keeps the next one (and the chain) alive
+        func, frame = frame.pop()
+        frame += func.padding
+        if func.body(frame) is not TAIL:
+            return frame[-1]
+
+
+def index_get(value, idx):
+    if type(idx) is int and type(value) is list:
+        return value[idx]
+
+    if not isinstance(idx, int):
+        raise Exception("Index must be integer")
+
+    if isinstance(value, (list, str)):
+        return value[idx]
+
+    elif isinstance(value, int):
+        digits = str(abs(value))
+        return int(digits[idx])
+
+    else:
+        raise Exception("Indexing unsupported type")
+
+
+def index_set(target, idx, value):
+    if not isinstance(idx, int):
+        raise Exception("Index must be integer")
+
+    if isinstance(target, list):
+        target[idx] = value
+
+    else:
+        raise Exception("Assignment only supported for arrays")
+
+
+def iterable(value):
+    """
+    What a for-in loop iterates over.
+    """
+    if isinstance(value, (list, str, range)):
+        return value
+
+    elif isinstance(value, int):
+        # iterate over digits
+        return str(abs(value))
+
+    elif isinstance(value, Iterator):
+        # a loop the stack VM started, resumed here (ByteCode/tiering.py)
+        return value
+
+    else:
+        raise Exception("Object is not iterable")
+
+
+# Names generated closures may use besides their operands
+RUNTIME = {
+    "BREAK": BREAK,
+    "CONTINUE": CONTINUE,
+    "RETURN": RETURN,
+    "TAIL": TAIL,
+    "invoke": invoke,
+    "index_get": index_get,
+    "index_set": index_set,
+    "iterable": iterable,
+}
+
+
+# ---------------------------------------------------------
+# Specialized closures
+# ---------------------------------------------------------
+# A fragment is (text, values): Python source with a {} for each
+# value, in order. Values are bound into the closure, never written
+# out as literals, so fragments differing only in constants, slots
+# or callees share one factory.
+
+_factories = {}
+
+
+def specialize(body, count):
+    """
+    A factory make(a0 .. a<count-1>) -> run(f) whose body is `body`
+    (Python source using a0..). Built once per body.
+    """
+    make = _factories.get(body)
+
+    if make is None:
+        names = ", ".join(f"a{i}" for i in range(count))
+        source = (
+            f"def make({names}):\n"
+            f"    def run(f):\n"
+            f"        {indent(body, 8)}\n"
+            f"    return run\n"
+        )
+        namespace = dict(RUNTIME)
+        exec(source, namespace)
+        make = _factories[body] = namespace["make"]
+
+    return make
+
+
+def build(fragment):
+    """
+    The closure running `fragment`.
+    """
+    text, values = fragment
+    body = text.format(*(f"a{i}" for i in range(len(values))))
+    return specialize(body, len(values))(*values)
+
+
+def join(*parts):
+    """
+    Concatenate literal text and fragments into one fragment.
+    """
+    texts = []
+    values = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+        else:
+            texts.append(part[0])
+            values.extend(part[1])
+    return "".join(texts), values
+
+
+def commas(parts):
+    out = []
+    for i, part in enumerate(parts):
+        if i:
+            out.append(", ")
+        out.append(part)
+    return out
+
+
+def indent(text, width=4):
+    return text.replace("\n", "\n" + " " * width)
+
+
+def indented(fragment):
+    text, values = fragment
+    return indent(text), values
+
+
+def noop(f):
+    return None
+
+
+# ---------------------------------------------------------
+# Compiled statements
+# ---------------------------------------------------------
+
+class Stmt:
+    """
+    A compiled statement or block.
+
+    lines:   fragment, if it is only simple statements that other
+             closures may take inline
+    signals: whether running it may return a signal
+    fn:      its closure, built on first use when it has lines
+    """
+    __slots__ = ("lines", "signals", "fn")
+
+    def __init__(self, lines=None, signals=False, fn=None):
+        self.lines = lines
+        self.signals = signals
+        self.fn = fn
+
+    def closure(self):
+        if self.fn is None:
+            self.fn = build(self.lines)
+        return self.fn
+
+
+EMPTY = Stmt(fn=noop)
+
+
+class ClosureProgram:
+    """
+    A compiled program: the top-level closure and the global table it
+    runs with (shared with every function that reads globals).
+    """
+
+    def __init__(self, main, globals_, nglobals, functions):
+        self.main = main
+        self.globals = globals_
+        self.nglobals = nglobals
+        self.functions = functions
+
+    def run(self):
+        frame = self.globals
+        frame[:] = [0] * self.nglobals + [None]
+
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            self.main(frame)
+        finally:
+            sys.setrecursionlimit(limit)
+
+        return frame[-1]
+
+
+class FrameLayout:
+    """
+    Variable slots of one frame (top-level code or a function body)
+    while it is being compiled.
+    """
+
+    def __init__(self):
+        self.vars = {}       # name -> slot
+        self.loops = 0       # enclosing loops, for break / continue
+
+
+class ClosureCompiler(WorkStack):
+    """
+    ClosureCompiler
+    ---------------
+    Walks the AST and builds closures.
+
+    Responsibilities:
+    - Assign variable slots (same scoping rules as the VMs)
+    - Render expressions and simple statements as specialized source
+    - Declare every function up front (same rules as the stack compiler)
+    - Thread break / continue / return as signals
+    """
+
+    def __init__(self):
+        self.main = FrameLayout()
+        self.frame = self.main
+        self.globals = []        # the global table; filled by ClosureProgram.run
+        self.functions = []      # Function objects, by index
+        self.function_table = FunctionTable()   # which function a call runs
+        self.work = []           # pending (method, *args) actions
+        self.results = []        # fragments and Stmts of finished nodes
+
+        self.statement_handlers = {
+            LetStmt: self.compile_binding,
+            AssignStmt: self.compile_binding,
+            PrintStmt: self.compile_print,
+            ExprStmt: self.compile_expr_stmt,
+            IndexAssign: self.compile_index_assign,
+
+            IfChain: self.compile_if_chain,
+            WhileStmt: self.compile_while,
+            ForInLoop: self.compile_for_in,
+
+            FunctionDef: self.compile_function_def,
+            ReturnStmt: self.compile_return,
+
+            BreakStmt: self.compile_break,
+            ContinueStmt: self.compile_continue,
+        }
+
+    # ---------------------------------------------------------
+    # Entry points
+    # ---------------------------------------------------------
+
+    def compile(self, program):
+        """
+        Compile a Program; returns a ClosureProgram.
+        """
+        for name in assigned_names(program.statements):
+            self.var(name)
+        for fn in function_defs(program.statements):
+            self.declare_function(fn.name, fn.params)
+
+        for stmt in program.statements:
+            self.run(self.statement, stmt)
+
+        return self.link(len(program.statements))
+
+    def compile_flat(self, flat):
+        """
+        Compile a flat_ast.FlatAST, one top-level statement at a time.
+        """
+        for name in flat.global_names:
+            self.var(name)
+        for name, params in flat.functions:
+            self.declare_function(name, params)
+
+        count = 0
+        for stmt in flat:
+            self.run(self.statement, stmt)
+            count += 1
+
+        return self.link(count)
+
+    def link(self, count):
+        self.end_block(count)
+        main = self.results.pop().closure()
+        return ClosureProgram(main, self.globals, len(self.main.vars), self.functions)
+
+    def statement(self, node):
+        handler = self.statement_handlers.get(type(node))
+        if handler is None:
+            raise Exception(f"Compiler missing node: {type(node)}")
+        handler(node)
+
+    def pop(self, count):
+        if not count:
+            return []
+        items = self.results[-count:]
+        del self.results[-count:]
+        return items
+
+    # ---------------------------------------------------------
+    # Variables
+    # ---------------------------------------------------------
+
+    def var(self, name):
+        vars_ = self.frame.vars
+        if name not in vars_:
+            vars_[name] = len(vars_)
+        return vars_[name]
+
+    def is_global(self, name):
+        """
+        Inside a function: locals first, then globals, else a fresh
+        local that reads as 0.
+        """
+        frame = self.frame
+        return frame is not self.main and name not in frame.vars and name in self.main.vars
+
+    # =========================
+    # Expressions
+    # =========================
+    # operand(node) schedules whatever leaves node's fragment on
+    # self.results. Subtrees at INLINE_DEPTH are compiled to closures
+    # of their own first, and the fragment calls them.
+
+    def operand(self, node):
+        deep = []
+        self.collect_deep(node, INLINE_DEPTH, deep)
+        return [*((self.compile_deep, sub) for sub in deep), (self.end_operand, node, len(deep))]
+
+    def operands(self, nodes):
+        return [item for node in nodes for item in self.operand(node)]
+
+    def compile_deep(self, node):
+        self.schedule(*self.operand(node), (self.end_deep,))
+
+    def end_deep(self):
+        fn = build(join("return ", self.results.pop()))
+        self.results.append(("{}(f)", [fn]))
+
+    def end_operand(self, node, count):
+        closures = iter(self.pop(count))
+        self.results.append(self.render(node, INLINE_DEPTH, closures))
+
+    def children(self, node):
+        """
+        An expression's operands, in evaluation order.
+        """
+        if isinstance(node, (Binary, Logical)):
+            return [node.left, node.right]
+        if isinstance(node, (Unary, Not)):
+            return [node.expr]
+        if isinstance(node, CallExpr):
+            return node.args
+        if isinstance(node, ArrayLiteral):
+            return node.elements
+        if isinstance(node, IndexExpr):
+            return [node.array, node.index]
+        if isinstance(node, RangeExpr):
+            return [node.start, node.end, node.step or Number(1)]
+        return []
+
+    def collect_deep(self, node, depth, out):
+        # Recursion is bounded by INLINE_DEPTH
+        children = self.children(node)
+        if depth == 0 and children:
+            out.append(node)
+            return
+        for child in children:
+            self.collect_deep(child, depth - 1, out)
+
+    def render(self, node, depth, closures):
+        """
+        Fragment evaluating `node`. Mirrors collect_deep: a subtree
+        it collected is the next fragment in `closures`.
+        """
+        children = self.children(node)
+        if depth == 0 and children:
+            return next(closures)
+
+        parts = [self.render(child, depth - 1, closures) for child in children]
+
+        if isinstance(node, CONSTANTS):
+            return ("{}", [node.value])
+
+        if isinstance(node, Var):
+            if self.is_global(node.name):
+                return ("{}[{}]", [self.globals, self.main.vars[node.name]])
+            return ("f[{}]", [self.var(node.name)])
+
+        if isinstance(node, (Binary, Logical)):
+            left, right = parts
+            if node.op in AND_OPS:
+                return join("(", left, " and ", right, ")")
+            if node.op in OR_OPS:
+                return join("(", left, " or ", right, ")")
+            if node.op in BINARY_OPS:
+                return join("(", left, f" {BINARY_OPS[node.op]} ", right, ")")
+
+        elif isinstance(node, Unary):
+            if node.op == TokenType.MINUS:
+                return join("(-", parts[0], ")")
+            return parts[0]
+
+        elif isinstance(node, Not):
+            return join("(not ", parts[0], ")")
+
+        elif isinstance(node, CallExpr):
+            return self.call(node, parts)
+
+        elif isinstance(node, ArrayLiteral):
+            return join("[", *commas(parts), "]")
+
+        elif isinstance(node, IndexExpr):
+            return join("index_get(", parts[0], ", ", parts[1], ")")
+
+        elif isinstance(node, RangeExpr):
+            return join("range(", *commas(parts), ")")
+
+        raise Exception(f"Compiler missing node: {type(node)}")
+
+    # =========================
+    # Simple statements
+    # =========================
+    # Each leaves a Stmt with lines that other closures may inline.
+
+    def simple(self, nodes, make, signals=False):
+        """
+        Schedule `nodes` as operands, then a simple statement whose
+        lines are make(*fragments).
+        """
+        self.schedule(*self.operands(nodes), (self.end_simple, len(nodes), make, signals))
+
+    def end_simple(self, count, make, signals):
+        self.results.append(Stmt(make(*self.pop(count)), signals))
+
+    def compile_binding(self, node):
+        # Assignments always bind in the current frame
+        slot = self.var(node.name)
+        self.simple([node.value], lambda value: join(("f[{}] = ", [slot]), value))
+
+    def compile_print(self, node):
+        self.simple([node.expr], lambda value: join("print(", value, ")"))
+
+    def compile_expr_stmt(self, node):
+        self.simple([node.expr], lambda value: value)
+
+    def compile_index_assign(self, node):
+        self.simple(
+            [node.array, node.index, node.value],
+            lambda array, index, value: join("index_set(", array, ", ", index, ", ", value, ")"),
+        )
+
+    def compile_return(self, node):
+        value = node.value
+
+        if isinstance(value, CallExpr) and self.frame is not self.main:
+            # return f(...) in a function: the caller runs the callee
+            # in place of this one (see run_tail)
+            self.simple(value.args, lambda *args: self.tail_call(value, args), signals=True)
+
+        elif value is None:
+            self.results.append(Stmt(("f[-1] = None\nreturn RETURN", []), True))
+
+        else:
+            self.simple([value], lambda value: join("f[-1] = ", value, "\nreturn RETURN"), signals=True)
+
+    def call(self, node, args):
+        func = self.functions[self.function_table.resolve(node.name, len(args))]
+        return join(("invoke({}, [", [func]), *commas(args), "])")
+
+    def tail_call(self, node, args):
+        func = self.functions[self.function_table.resolve(node.name, len(args))]
+        return join(("f[-1] = ({}, [", [func]), *commas(args), "])\nreturn TAIL")
+
+    # =========================
+    # Blocks
+    # =========================
+
+    def block(self, body):
+        """
+        Actions that leave one Stmt for a statement list.
+        """
+        return [*((self.statement, stmt) for stmt in body), (self.end_block, len(body))]
+
+    def end_block(self, count):
+        # None: a function definition, which does nothing at run time
+        stmts = [stmt for stmt in self.pop(count) if stmt is not None]
+        signals = any(stmt.signals for stmt in stmts)
+
+        if not stmts:
+            self.results.append(EMPTY)
+            return
+
+        if len(stmts) == 1:
+            self.results.append(stmts[0])
+            return
+
+        if len(stmts) <= INLINE_STATEMENTS and all(stmt.lines for stmt in stmts):
+            parts = []
+            for stmt in stmts:
+                parts.extend(("\n", stmt.lines))
+            self.results.append(Stmt(join(*parts[1:]), signals))
+            return
+
+        fns = [stmt.closure() for stmt in stmts]
+
+        if signals:
+            def run(f):
+                for stmt in fns:
+                    signal = stmt(f)
+                    if signal is not None:
+                        return signal
+        else:
+            def run(f):
+                for stmt in fns:
+                    stmt(f)
+
+        self.results.append(Stmt(signals=signals, fn=run))
+
+    def body_text(self, stmt, loop):
+        """
+        Fragment running a block inside a branch or loop: its lines
+        when it has them, else a call to its closure. In a loop,
+        BREAK and CONTINUE from the call act on that loop.
+        """
+        if stmt.lines is not None:
+            return stmt.lines
+
+        fn = stmt.closure()
+        if not stmt.signals:
+            return ("{}(f)", [fn])
+        if not loop:
+            return ("return {}(f)", [fn])
+
+        return join(
+            ("s = {}(f)", [fn]),
+            "\nif s is not None:"
+            "\n    if s is BREAK:"
+            "\n        break"
+            "\n    if s is not CONTINUE:"
+            "\n        return s",
+        )
+
+    # =========================
+    # Control flow
+    # =========================
+
+    def compile_if_chain(self, node):
+        items = []
+        for condition, body in node.branches:
+            items.extend(self.operand(condition))
+            items.extend(self.block(body))
+        if node.else_body:
+            items.extend(self.block(node.else_body))
+
+        self.schedule(*items, (self.end_if_chain, len(node.branches), bool(node.else_body)))
+
+    def end_if_chain(self, count, has_else):
+        else_body = self.results.pop() if has_else else None
+        parts = self.pop(2 * count)
+
+        texts = []
+        signals = else_body is not None and else_body.signals
+
+        for i in range(count):
+            cond, body = parts[2 * i], parts[2 * i + 1]
+            signals = signals or body.signals
+            texts.extend(("\nelif " if i else "if ", cond, ":\n    ", indented(self.body_text(body, False))))
+
+        if else_body is not None:
+            texts.extend(("\nelse:\n    ", indented(self.body_text(else_body, False))))
+
+        self.results.append(Stmt(signals=signals, fn=build(join(*texts))))
+
+    def begin_loop(self):
+        self.frame.loops += 1
+
+    def end_loop(self):
+        self.frame.loops -= 1
+
+    def compile_while(self, node):
+        self.begin_loop()
+        self.schedule(*self.operand(node.condition), *self.block(node.body), (self.end_while,))
+
+    def end_while(self):
+        self.end_loop()
+        body = self.results.pop()
+        cond = self.results.pop()
+
+        text = join("while ", cond, ":\n    ", indented(self.body_text(body, True)))
+        self.results.append(Stmt(signals=body.signals, fn=build(text)))
+
+    def compile_for_in(self, node):
+        slot = self.var(node.var)
+        self.begin_loop()
+
+        if isinstance(node.iterable, RangeExpr):
+            # for i in range(...) is a Python range loop
+            rng = node.iterable
+            nodes = [rng.start, rng.end, rng.step or Number(1)]
+            header = lambda start, end, step: join("for v in range(", start, ", ", end, ", ", step, "):")
+        else:
+            nodes = [node.iterable]
+            header = lambda source: join("for v in iterable(", source, "):")
+
+        self.schedule(*self.operands(nodes), *self.block(node.body), (self.end_for, slot, len(nodes), header))
+
+    def end_for(self, slot, count, header):
+        self.end_loop()
+        body = self.results.pop()
+        head = header(*self.pop(count))
+
+        text = join(head, ("\n    f[{}] = v\n    ", [slot]), indented(self.body_text(body, True)))
+        self.results.append(Stmt(signals=body.signals, fn=build(text)))
+
+    def compile_break(self, node):
+        if not self.frame.loops:
+            raise Exception("break outside loop")
+        self.results.append(Stmt(signals=True, fn=lambda f: BREAK))
+
+    def compile_continue(self, node):
+        if not self.frame.loops:
+            raise Exception("continue outside loop")
+        self.results.append(Stmt(signals=True, fn=lambda f: CONTINUE))
+
+    # =========================
+    # Functions
+    # =========================
+    # Declared up front, and calls resolved, by the FunctionTable (see
+    # compiler/codegen.py).
+
+    def declare_function(self, name, params):
+        self.function_table.declare(name, params)
+        self.functions.append(Function(name, params))
+
+    def compile_function_def(self, node):
+        func = self.functions[self.function_table.define(node.name)]
+
+        outer = self.frame
+        self.frame = FrameLayout()
+
+        # Params occupy the first slots, then every name the body binds
+        for name in node.params:
+            self.var(name)
+        for name in assigned_names(node.body):
+            self.var(name)
+
+        self.schedule(*self.block(node.body), (self.end_function, func, outer))
+
+    def end_function(self, func, outer):
+        func.body = self.results.pop().closure()
+        func.padding = [0] * (len(self.frame.vars) - len(func.params)) + [None]
+        self.frame = outer
+        self.results.append(None)
@@ -0,0 +1,771 @@
+"""
+Rayvn register compiler
+
+Compiles the same (optimized) AST as ByteCode/compiler.py, but to the
+three-address instructions of Register/opcodes.py:
+
+    total = total + i * j      MUL  t0, i, j
+                               ADD  total, total, t0
+
+Registers are referenced during compilation as (space, index) pairs,
+VAR / TEMP / CONST, because a frame's variable and temporary counts are
+only known once all of its code is compiled. link() then lays every
+frame out as variables, temporaries, constants, turns the pairs into
+plain register numbers and concatenates the code: top-level first, then
+each function in definition order.
+
+Like the stack compiler this never recurses. Handlers push
+(method, *args) actions onto self.work; an expression leaves the
+register holding its value on self.results for whoever consumes it.
+"""
+
+from compiler.Register.opcodes import RegOp, SHAPES
+from compiler.rayvn_ast import *
+from compiler.lexer import TokenType
+from compiler.analysis import assigned_names, function_defs
+from compiler.codegen import AND_OPS, OR_OPS, FunctionTable, WorkStack
+
+
+# Register spaces
+VAR, TEMP, CONST = range(3)
+
+BINARY_OPS = {
+    TokenType.PLUS: RegOp.ADD,
+    TokenType.MINUS: RegOp.SUB,
+    TokenType.STAR: RegOp.MUL,
+    TokenType.SLASH: RegOp.DIV,
+
+    TokenType.GT: RegOp.GT,
+    TokenType.GTE: RegOp.GTE,
+    TokenType.LT: RegOp.LT,
+    TokenType.LTE: RegOp.LTE,
+    TokenType.EQEQ: RegOp.EQ,
+    TokenType.NOTEQ: RegOp.NEQ,
+}
+
+# Comparisons used as a condition compile to a single compare-and-branch
+COMPARE_BRANCH = {
+    TokenType.GT: RegOp.JUMP_UNLESS_GT,
+    TokenType.GTE: RegOp.JUMP_UNLESS_GTE,
+    TokenType.LT: RegOp.JUMP_UNLESS_LT,
+    TokenType.LTE: RegOp.JUMP_UNLESS_LTE,
+    TokenType.EQEQ: RegOp.JUMP_UNLESS_EQ,
+    TokenType.NOTEQ: RegOp.JUMP_UNLESS_NEQ,
+}
+
+
+def contains_call(node):
+    """
+    Whether evaluating an expression may run a function (which can
+    assign globals).
+    """
+    pending = [node]
+
+    while pending:
+        node = pending.pop()
+
+        if isinstance(node, CallExpr):
+            return True
+        if isinstance(node, (Binary, Logical)):
+            pending.append(node.left)
+            pending.append(node.right)
+        elif isinstance(node, (Unary, Not)):
+            pending.append(node.expr)
+        elif isinstance(node, IndexExpr):
+            pending.append(node.array)
+            pending.append(node.index)
+        elif isinstance(node, ArrayLiteral):
+            pending.extend(node.elements)
+        elif isinstance(node, RangeExpr):
+            pending.extend(part for part in (node.start, node.end, node.step) if part)
+
+    return False
+
+
+class FrameLayout:
+    """
+    The code and register allocation of one frame (top-level code or
+    a function body) while it is being compiled.
+    """
+
+    def __init__(self):
+        self.code = []           # [op, [operands]], jump targets local to this frame
+        self.vars = {}           # name -> variable index
+        self.temps = 0           # temporaries in use; allocated and freed like a stack
+        self.max_temps = 0
+        self.consts = []
+        self.const_index = {}
+        self.loop_stack = []
+
+
+class RegisterCode:
+    """
+    A linked register program.
+
+    code       [(RegOp, operand or operand tuple)]
+    functions  records {name, entry, params, varnames, temps, template}
+    main       the same for top-level code, whose frame is the global table
+
+    template is a frame's initial register file: variables and
+    temporaries 0, then the constants.
+    """
+
+    def __init__(self, code, functions, main):
+        self.code = code
+        self.functions = functions
+        self.main = main
+
+
+class RegisterCompiler(WorkStack):
+    """
+    RegisterCompiler
+    ----------------
+    Walks the AST and emits register instructions.
+
+    Responsibilities:
+    - Allocate variables, temporaries and constants to frame registers
+    - Emit three-address instructions, compare-and-branch for conditions
+    - Declare every function up front (same rules as the stack compiler)
+    - Track loop state for break / continue
+    """
+
+    def __init__(self):
+        self.main = FrameLayout()
+        self.frame = self.main   # frame being compiled
+        self.functions = []      # { name, entry, params, layout }
+        self.function_table = FunctionTable()   # which function a call runs
+        self.work = []           # pending (method, *args) actions
+        self.results = []        # registers holding finished expressions
+
+        self.statement_handlers = {
+            LetStmt: self.compile_binding,
+            AssignStmt: self.compile_binding,
+            PrintStmt: self.compile_print,
+            ExprStmt: self.compile_expr_stmt,
+            IndexAssign: self.compile_index_assign,
+
+            IfChain: self.compile_if_chain,
+            WhileStmt: self.compile_while,
+            ForInLoop: self.compile_for_in,
+
+            FunctionDef: self.compile_function_def,
+            ReturnStmt: self.compile_return,
+
+            BreakStmt: self.compile_break,
+            ContinueStmt: self.compile_continue,
+        }
+
+        self.expression_handlers = {
+            Number: self.compile_constant,
+            Boolean: self.compile_constant,
+            String: self.compile_constant,
+            Var: self.compile_var,
+
+            Unary: self.compile_unary,
+            Not: self.compile_not,
+            Binary: self.compile_binary,
+            Logical: self.compile_binary,
+
+            CallExpr: self.compile_call,
+            ArrayLiteral: self.compile_array,
+            IndexExpr: self.compile_index,
+            RangeExpr: self.compile_range,
+        }
+
+    # ---------------------------------------------------------
+    # Entry points
+    # ---------------------------------------------------------
+
+    def compile(self, program):
+        """
+        Compile a Program; returns the linked RegisterCode.
+        """
+        for name in assigned_names(program.statements):
+            self.var(name)
+        for fn in function_defs(program.statements):
+            self.declare_function(fn.name, fn.params)
+
+        for stmt in program.statements:
+            self.run(self.statement, stmt)
+        self.emit(RegOp.HALT)
+
+        return self.link()
+
+    def compile_flat(self, flat):
+        """
+        Compile a flat_ast.FlatAST, one top-level statement at a time.
+        """
+        for name in flat.global_names:
+            self.var(name)
+        for name, params in flat.functions:
+            self.declare_function(name, params)
+
+        for stmt in flat:
+            self.run(self.statement, stmt)
+        self.emit(RegOp.HALT)
+
+        return self.link()
+
+    def statement(self, node):
+        handler = self.statement_handlers.get(type(node))
+        if handler is None:
+            raise Exception(f"Compiler missing node: {type(node)}")
+        handler(node)
+
+    def expr(self, node, want=None):
+        """
+        Compile an expression. Its register ends up on self.results;
+        if `want` is given, that register is `want`.
+        """
+        handler = self.expression_handlers.get(type(node))
+        if handler is None:
+            raise Exception(f"Compiler missing node: {type(node)}")
+        handler(node, want)
+
+    def statements(self, body):
+        return [(self.statement, stmt) for stmt in body]
+
+    # ---------------------------------------------------------
+    # Registers
+    # ---------------------------------------------------------
+
+    def var(self, name):
+        vars_ = self.frame.vars
+        if name not in vars_:
+            vars_[name] = len(vars_)
+        return (VAR, vars_[name])
+
+    def hidden(self, count):
+        """
+        `count` consecutive variables for compiler-internal state.
+        """
+        first = None
+        for _ in range(count):
+            ref = self.var(f"<hidden {len(self.frame.vars)}>")
+            if first is None:
+                first = ref
+        return first
+
+    def temp(self):
+        frame = self.frame
+        ref = (TEMP, frame.temps)
+        frame.temps += 1
+        frame.max_temps = max(frame.max_temps, frame.temps)
+        return ref
+
+    def free(self, ref):
+        """
+        Release a temporary, and any allocated after it.
+        """
+        if ref[0] == TEMP and ref[1] < self.frame.temps:
+            self.frame.temps = ref[1]
+
+    def const(self, value):
+        frame = self.frame
+        # Keyed by type and repr, so 1 / 1.0 / True stay distinct
+        key = (type(value), repr(value))
+        index = frame.const_index.get(key)
+        if index is None:
+            index = frame.const_index[key] = len(frame.consts)
+            frame.consts.append(value)
+        return (CONST, index)
+
+    def target(self, want):
+        return want if want is not None else self.temp()
+
+    def deliver(self, ref, want):
+        """
+        Finish an expression whose value is in `ref`.
+        """
+        if want is not None and ref != want:
+            self.emit(RegOp.MOVE, want, ref)
+            self.free(ref)
+            ref = want
+        self.results.append(ref)
+
+    def pin(self):
+        """
+        Copy a just-compiled operand that is a variable into a
+        temporary, so a call in a later operand can't change it first.
+        """
+        ref = self.results.pop()
+        if ref[0] == VAR:
+            t = self.temp()
+            self.emit(RegOp.MOVE, t, ref)
+            ref = t
+        self.results.append(ref)
+
+    def drop(self):
+        self.free(self.results.pop())
+
+    def operands(self, nodes, then):
+        """
+        Schedule `nodes` left to right, then the action `then`, which
+        pops their registers.
+        """
+        self.schedule(*self.operand_items(nodes), then)
+
+    def operand_items(self, nodes):
+        """
+        Actions that evaluate `nodes` left to right.
+
+        Operand registers are read when the instruction runs, after
+        every operand is evaluated. At top level, where variables are
+        globals, an operand followed by one that makes a call is pinned.
+        """
+        items = []
+        last = len(nodes) - 1
+
+        for i, node in enumerate(nodes):
+            items.append((self.expr, node))
+            if i < last and self.frame is self.main and any(contains_call(n) for n in nodes[i + 1:]):
+                items.append((self.pin,))
+        return items
+
+    def finish(self, op, count, want):
+        """
+        Emit `op dst, operands...` over the last `count` results.
+        """
+        args = self.results[-count:]
+        del self.results[-count:]
+        for ref in reversed(args):
+            self.free(ref)
+
+        dst = self.target(want)
+        self.emit(op, dst, *args)
+        self.results.append(dst)
+
+    # ---------------------------------------------------------
+    # Emitting
+    # ---------------------------------------------------------
+
+    def emit(self, op, *operands):
+        code = self.frame.code
+        code.append([op, list(operands)])
+        return len(code) - 1
+
+    # A label is a list of jump indices that all land on the same,
+    # not yet emitted, position. Jump operands start out as None.
+
+    def emit_jump(self, op, label, *operands):
+        label.append(self.emit(op, *operands, None))
+
+    def place(self, label):
+        self.patch(label, len(self.frame.code))
+
+    def patch(self, label, target):
+        code = self.frame.code
+        for index in label:
+            op, operands = code[index]
+            operands[SHAPES[op].index("j")] = target
+
+    # =========================
+    # Literals & variables
+    # =========================
+
+    def compile_constant(self, node, want):
+        self.deliver(self.const(node.value), want)
+
+    def compile_var(self, node, want):
+        name = node.name
+
+        # Inside a function: locals first, then globals, else a fresh
+        # local that reads as 0
+        if self.frame is not self.main and name not in self.frame.vars and name in self.main.vars:
+            dst = self.target(want)
+            self.emit(RegOp.LOAD_GLOBAL, dst, self.main.vars[name])
+            self.results.append(dst)
+            return
+
+        self.deliver(self.var(name), want)
+
+    # =========================
+    # Statements
+    # =========================
+
+    def compile_binding(self, node):
+        # Assignments always bind in the current frame
+        self.schedule((self.expr, node.value, self.var(node.name)), (self.drop,))
+
+    def compile_print(self, node):
+        self.schedule((self.expr, node.expr), (self.emit_print,))
+
+    def emit_print(self):
+        src = self.results.pop()
+        self.free(src)
+        self.emit(RegOp.PRINT, src)
+
+    def compile_expr_stmt(self, node):
+        self.schedule((self.expr, node.expr), (self.drop,))
+
+    def compile_index_assign(self, node):
+        self.operands([node.array, node.index, node.value], (self.emit_index_set,))
+
+    def emit_index_set(self):
+        array, index, value = self.results[-3:]
+        del self.results[-3:]
+        for ref in (value, index, array):
+            self.free(ref)
+        self.emit(RegOp.INDEX_SET, array, index, value)
+
+    # =========================
+    # Operators
+    # =========================
+
+    def compile_unary(self, node, want):
+        if node.op == TokenType.MINUS:
+            self.operands([node.expr], (self.finish, RegOp.NEG, 1, want))
+        else:
+            self.schedule((self.expr, node.expr, want))
+
+    def compile_not(self, node, want):
+        self.operands([node.expr], (self.finish, RegOp.NOT, 1, want))
+
+    def compile_binary(self, node, want):
+        if node.op in AND_OPS or node.op in OR_OPS:
+            self.compile_short_circuit(node, want)
+            return
+        if node.op not in BINARY_OPS:
+            raise Exception(f"Compiler missing node: {type(node)}")
+
+        self.operands([node.left, node.right], (self.finish, BINARY_OPS[node.op], 2, want))
+
+    def compile_short_circuit(self, node, want):
+        # a and b  ->  t = a; JUMP_IF_FALSE t end; t = b; end:
+        # A fresh temporary (not `want`, which `b` may read) holds the
+        # deciding operand.
+        t = want if want is not None and want[0] == TEMP else self.temp()
+        jump = RegOp.JUMP_IF_FALSE if node.op in AND_OPS else RegOp.JUMP_IF_TRUE
+        end = []
+
+        self.schedule(
+            (self.expr, node.left, t),
+            (self.drop_jump, jump, t, end),
+            (self.expr, node.right, t),
+            (self.end_short_circuit, end, want),
+        )
+
+    def drop_jump(self, op, src, label):
+        self.results.pop()
+        self.emit_jump(op, label, src)
+
+    def end_short_circuit(self, end, want):
+        self.place(end)
+        self.deliver(self.results.pop(), want)
+
+    # =========================
+    # Conditions
+    # =========================
+
+    def branch_false(self, cond, label):
+        """
+        Jump to `label` when `cond` is falsy.
+        """
+        if isinstance(cond, (Binary, Logical)) and cond.op in COMPARE_BRANCH:
+            self.operands([cond.left, cond.right], (self.emit_compare_branch, COMPARE_BRANCH[cond.op], label))
+
+        elif isinstance(cond, (Binary, Logical)) and cond.op in AND_OPS:
+            self.schedule((self.branch_false, cond.left, label), (self.branch_false, cond.right, label))
+
+        elif isinstance(cond, Not):
+            self.schedule((self.expr, cond.expr), (self.emit_test, RegOp.JUMP_IF_TRUE, label))
+
+        else:
+            self.schedule((self.expr, cond), (self.emit_test, RegOp.JUMP_IF_FALSE, label))
+
+    def emit_compare_branch(self, op, label):
+        b = self.results.pop()
+        a = self.results.pop()
+        self.free(b)
+        self.free(a)
+        self.emit_jump(op, label, a, b)
+
+    def emit_test(self, op, label):
+        src = self.results.pop()
+        self.free(src)
+        self.emit_jump(op, label, src)
+
+    def compile_if_chain(self, node):
+        end = []
+        items = []
+        last = len(node.branches) - 1
+
+        for i, (condition, body) in enumerate(node.branches):
+            skip = []
+            items.append((self.branch_false, condition, skip))
+            items.extend(self.statements(body))
+            if i < last or node.else_body:
+                items.append((self.emit_jump, RegOp.JUMP, end))
+            items.append((self.place, skip))
+
+        if node.else_body:
+            items.extend(self.statements(node.else_body))
+
+        items.append((self.place, end))
+        self.schedule(*items)
+
+    # =========================
+    # Loops
+    # =========================
+    # loop = {"start", "breaks", "continues"}, per frame
+
+    def new_loop(self):
+        return {"start": None, "breaks": [], "continues": []}
+
+    def begin_loop(self, loop):
+        loop["start"] = len(self.frame.code)
+        self.frame.loop_stack.append(loop)
+
+    def end_loop(self, loop, exits):
+        self.emit(RegOp.JUMP, loop["start"])
+        self.frame.loop_stack.pop()
+
+        self.place(exits)
+        self.place(loop["breaks"])
+        self.patch(loop["continues"], loop["start"])
+
+    def compile_while(self, node):
+        loop = self.new_loop()
+        exits = []
+
+        self.schedule(
+            (self.begin_loop, loop),
+            (self.branch_false, node.condition, exits),
+            *self.statements(node.body),
+            (self.end_loop, loop, exits),
+        )
+
+    def compile_for_in(self, node):
+        if isinstance(node.iterable, RangeExpr):
+            self.compile_range_loop(node)
+            return
+
+        loop = self.new_loop()
+        exits = []
+
+        self.schedule(
+            (self.expr, node.iterable),
+            (self.begin_iter_loop, node, loop, exits),
+            *self.statements(node.body),
+            (self.end_iter_loop, loop, exits),
+        )
+
+    def begin_iter_loop(self, node, loop, exits):
+        src = self.results.pop()
+        self.free(src)
+
+        # The iterator holds its temporary for the whole loop
+        it = self.temp()
+        self.emit(RegOp.ITER_INIT, it, src)
+
+        self.begin_loop(loop)
+        self.emit_jump(RegOp.ITER_NEXT, exits, self.var(node.var), it)
+        loop["iterator"] = it
+
+    def end_iter_loop(self, loop, exits):
+        self.end_loop(loop, exits)
+        self.free(loop["iterator"])
+
+    def compile_range_loop(self, node):
+        """
+        `for i in range(...)`: RANGE_INIT keeps the next value, the
+        remaining count and the step in three hidden variables, and
+        FOR_RANGE tests, sets the loop variable and steps in one go.
+        """
+        rng = node.iterable
+        step = rng.step if rng.step else Number(1)
+        loop = self.new_loop()
+        exits = []
+
+        self.schedule(
+            *self.operand_items([rng.start, rng.end, step]),
+            (self.begin_range_loop, node, loop, exits),
+            *self.statements(node.body),
+            (self.end_loop, loop, exits),
+        )
+
+    def begin_range_loop(self, node, loop, exits):
+        start, end, step = self.results[-3:]
+        del self.results[-3:]
+        for ref in (step, end, start):
+            self.free(ref)
+
+        # Slots are taken only now, after the bounds are compiled
+        state = self.hidden(3)
+        var = self.var(node.var)
+
+        self.emit(RegOp.RANGE_INIT, state, start, end, step)
+        self.begin_loop(loop)
+        exits.append(self.emit(RegOp.FOR_RANGE, None, var, state))
+
+    # =========================
+    # Ranges, arrays & indexing
+    # =========================
+
+    def compile_range(self, node, want):
+        step = node.step if node.step else Number(1)
+        self.operands([node.start, node.end, step], (self.finish, RegOp.BUILD_RANGE, 3, want))
+
+    def compile_index(self, node, want):
+        self.operands([node.array, node.index], (self.finish, RegOp.INDEX_GET, 2, want))
+
+    def compile_array(self, node, want):
+        # Elements go to consecutive temporaries
+        first, items = self.block(node.elements)
+        self.schedule(*items, (self.end_array, first, len(node.elements), want))
+
+    def end_array(self, first, count, want):
+        del self.results[len(self.results) - count:]
+        self.free(first)
+
+        dst = self.target(want)
+        self.emit(RegOp.BUILD_ARRAY, dst, first, count)
+        self.results.append(dst)
+
+    def block(self, nodes):
+        """
+        Reserve consecutive temporaries for `nodes`; returns the first
+        and the actions that evaluate each node into its own.
+        """
+        first = (TEMP, self.frame.temps)
+        items = [(self.expr, node, self.temp()) for node in nodes]
+        return first, items
+
+    # =========================
+    # Functions
+    # =========================
+    # Declared up front, and calls resolved, by the FunctionTable (see
+    # compiler/codegen.py).
+
+    def declare_function(self, name, params):
+        self.function_table.declare(name, params)
+        self.functions.append({
+            "name": name,
+            "entry": None,
+            "params": list(params),
+            "layout": None,
+        })
+
+    def compile_function_def(self, node):
+        func = self.functions[self.function_table.define(node.name)]
+
+        layout = FrameLayout()
+        outer = self.frame
+        self.frame = layout
+
+        # Params occupy the first registers, then every name the body binds
+        for name in node.params:
+            self.var(name)
+        for name in assigned_names(node.body):
+            self.var(name)
+
+        self.schedule(*self.statements(node.body), (self.end_function, func, layout, outer))
+
+    def end_function(self, func, layout, outer):
+        self.emit(RegOp.RETURN, self.const(None))
+        func["layout"] = layout
+        self.frame = outer
+
+    def compile_call(self, node, want):
+        first, items = self.block(node.args)
+        self.schedule(*items, (self.end_call, node, first, want))
+
+    def end_call(self, node, first, want):
+        argc = len(node.args)
+        del self.results[len(self.results) - argc:]
+        self.free(first)
+
+        index = self.function_table.resolve(node.name, argc)
+        dst = self.target(want)
+        self.emit(RegOp.CALL, dst, index, first, argc)
+        self.results.append(dst)
+
+    def compile_return(self, node):
+        value = node.value
+
+        if isinstance(value, CallExpr) and self.frame is not self.main:
+            # return f(...) in a function: the callee takes over the frame
+            first, items = self.block(value.args)
+            self.schedule(*items, (self.end_tail_call, value, first))
+            return
+
+        if value is None:
+            self.emit(RegOp.RETURN, self.const(None))
+        else:
+            self.schedule((self.expr, value), (self.emit_return,))
+
+    def end_tail_call(self, node, first):
+        argc = len(node.args)
+        del self.results[len(self.results) - argc:]
+        self.free(first)
+        self.emit(RegOp.TAIL_CALL, self.function_table.resolve(node.name, argc), first, argc)
+
+    def emit_return(self):
+        src = self.results.pop()
+        self.free(src)
+        self.emit(RegOp.RETURN, src)
+
+    # =========================
+    # Loop control
+    # =========================
+
+    def compile_break(self, node):
+        if not self.frame.loop_stack:
+            raise Exception("break outside loop")
+        self.emit_jump(RegOp.JUMP, self.frame.loop_stack[-1]["breaks"])
+
+    def compile_continue(self, node):
+        if not self.frame.loop_stack:
+            raise Exception("continue outside loop")
+        self.emit_jump(RegOp.JUMP, self.frame.loop_stack[-1]["continues"])
+
+    # ---------------------------------------------------------
+    # Linking
+    # ---------------------------------------------------------
+
+    def link(self):
+        """
+        Lay out every frame, resolve registers and jump targets, and
+        concatenate the code.
+        """
+        code = []
+        main = self.layout_record(self.main, code)
+
+        functions = []
+        for func in self.functions:
+            record = self.layout_record(func["layout"], code)
+            record["name"] = func["name"]
+            record["params"] = func["params"]
+            functions.append(record)
+
+        return RegisterCode(code, functions, main)
+
+    def layout_record(self, layout, code):
+        base = len(code)
+        nvars = len(layout.vars)
+        ntemps = layout.max_temps
+        offset = {VAR: 0, TEMP: nvars, CONST: nvars + ntemps}
+
+        for op, operands in layout.code:
+            out = []
+            for kind, value in zip(SHAPES[op], operands):
+                if kind == "r":
+                    space, index = value
+                    value = offset[space] + index
+                elif kind == "j":
+                    value = base + value
+                out.append(value)
+
+            if not out:
+                code.append((op, None))
+            elif len(out) == 1:
+                code.append((op, out[0]))
+            else:
+                code.append((op, tuple(out)))
+
+        return {
+            "entry": base,
+            "varnames": list(layout.vars),
+            "temps": ntemps,
+            "template": [0] * (nvars + ntemps) + layout.consts,
+        }
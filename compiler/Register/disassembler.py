@@ -0,0 +1,132 @@
+"""
+Rayvn register disassembler
+
+Renders RegisterCode as text, one instruction per line:
+
+    fn fib(n)  [entry 4, 1 var, 2 temps]
+           4  JUMP_UNLESS_LT       0, 3, 6        (n, 2)
+           5  RETURN               0              (n)
+    >>     6  SUB                  1, 0, 4        (t0 = n - 1)
+           7  CALL                 1, 0, 1, 1     (t0 = fib(t0))
+
+">>" marks jump targets. Register operands are named after what they
+hold: the variable, t<n> for a temporary, or the constant's value.
+Every frame's code is contiguous, <main> first, so a function's
+instructions are exactly those from its entry up to the next one's.
+
+    ./rayvn --backend register --dis example.rv
+"""
+
+from compiler.Register.opcodes import RegOp, SHAPES
+
+
+MAIN = "<main>"
+
+SYMBOLS = {
+    RegOp.ADD: "+",
+    RegOp.SUB: "-",
+    RegOp.MUL: "*",
+    RegOp.DIV: "/",
+    RegOp.EQ: "==",
+    RegOp.NEQ: "!=",
+    RegOp.GT: ">",
+    RegOp.GTE: ">=",
+    RegOp.LT: "<",
+    RegOp.LTE: "<=",
+}
+
+
+def disassemble(code):
+    frames = [(MAIN, code.main)] + [(func["name"], func) for func in code.functions]
+    targets = {
+        value
+        for op, arg in code.code
+        for kind, value in zip(SHAPES[op], operands(arg))
+        if kind == "j"
+    }
+
+    lines = []
+    for index, (name, frame) in enumerate(frames):
+        start = frame["entry"]
+        end = frames[index + 1][1]["entry"] if index + 1 < len(frames) else len(code.code)
+
+        lines.append(header(name, frame))
+
+        for i in range(start, end):
+            op, arg = code.code[i]
+            values = operands(arg)
+
+            marker = ">>" if i in targets else "  "
+            raw = ", ".join(str(value) for value in values)
+            text = f"{marker} {i:>5}  {op.name:<20} {raw:<14}"
+
+            note = describe(op, values, frame, code)
+            if note:
+                text += f" ({note})"
+
+            lines.append(text.rstrip())
+
+    return "\n".join(lines)
+
+
+def operands(arg):
+    if arg is None:
+        return ()
+    return arg if isinstance(arg, tuple) else (arg,)
+
+
+def header(name, frame):
+    nvars = len(frame["varnames"])
+    temps = frame["temps"]
+    counts = f"{nvars} var{'s' if nvars != 1 else ''}, {temps} temp{'s' if temps != 1 else ''}"
+
+    if name == MAIN:
+        return f"{MAIN}  [{counts}]"
+
+    params = ", ".join(frame["params"])
+    return f"fn {name}({params})  [entry {frame['entry']}, {counts}]"
+
+
+def register_name(frame, reg):
+    """
+    The variable, temporary or constant a register holds.
+    """
+    varnames = frame["varnames"]
+    nvars = len(varnames)
+
+    if reg < nvars:
+        return varnames[reg]
+    if reg < nvars + frame["temps"]:
+        return f"t{reg - nvars}"
+    return repr(frame["template"][reg])
+
+
+def describe(op, values, frame, code):
+    """
+    What the operands refer to, or "" if the raw numbers say it all.
+    """
+    def name(kind, value):
+        if kind == "r":
+            return register_name(frame, value)
+        if kind == "g":
+            return register_name(code.main, value)
+        if kind == "f":
+            return code.functions[value]["name"]
+        return None
+
+    if op in SYMBOLS:
+        dst, a, b = (register_name(frame, value) for value in values)
+        return f"{dst} = {a} {SYMBOLS[op]} {b}"
+
+    if op is RegOp.CALL:
+        dst, index, first, argc = values
+        args = ", ".join(register_name(frame, first + i) for i in range(argc))
+        return f"{register_name(frame, dst)} = {code.functions[index]['name']}({args})"
+
+    if op is RegOp.TAIL_CALL:
+        index, first, argc = values
+        args = ", ".join(register_name(frame, first + i) for i in range(argc))
+        return f"{code.functions[index]['name']}({args})"
+
+    names = [name(kind, value) for kind, value in zip(SHAPES[op], values)]
+    return ", ".join(n for n in names if n is not None)
@@ -0,0 +1,132 @@
+"""
+Rayvn register instruction set
+
+Three-address instructions over a per-frame register file. Every frame
+(a function activation, or top-level code, whose frame is the global
+table) has the same layout:
+
+    variables    params first, then every name the body binds
+    temporaries  intermediate values, allocated like a stack
+    constants    the frame's constant pool, preset when it is created
+
+so a constant is just another register and no instruction needs a
+separate "constant operand" form.
+
+SHAPES gives each instruction's operands, in order:
+
+    r   register in the current frame
+    g   register in the global frame (a top-level variable)
+    j   jump target
+    f   function index
+    n   count (arguments, array elements)
+
+An instruction with one operand carries it as a plain int, otherwise
+as a tuple.
+"""
+
+from enum import Enum, auto
+
+
+class RegOp(Enum):
+
+    # --- Moves ---
+    MOVE = auto()            # dst = src
+    LOAD_GLOBAL = auto()     # dst = global (functions only assign locals)
+
+    # --- Arithmetic ---
+    ADD = auto()             # dst = a + b
+    SUB = auto()
+    MUL = auto()
+    DIV = auto()
+    NEG = auto()             # dst = -src
+
+    # --- Comparison ---
+    EQ = auto()              # dst = a == b
+    NEQ = auto()
+    GT = auto()
+    GTE = auto()
+    LT = auto()
+    LTE = auto()
+    NOT = auto()             # dst = not src
+
+    # --- Control Flow ---
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()   # jump if src is falsy
+    JUMP_IF_TRUE = auto()    # jump if src is truthy
+    JUMP_UNLESS_EQ = auto()  # jump unless a == b (compare and branch)
+    JUMP_UNLESS_NEQ = auto()
+    JUMP_UNLESS_GT = auto()
+    JUMP_UNLESS_GTE = auto()
+    JUMP_UNLESS_LT = auto()
+    JUMP_UNLESS_LTE = auto()
+
+    # --- Functions ---
+    CALL = auto()            # dst = function(args in first .. first + argc)
+    TAIL_CALL = auto()       # call in place of the current function
+    RETURN = auto()          # return src
+
+    # --- Loops ---
+    ITER_INIT = auto()       # dst = iterator over src
+    ITER_NEXT = auto()       # var = next(iterator), or jump to exit
+    RANGE_INIT = auto()      # counted-loop state slots from start/end/step
+    FOR_RANGE = auto()       # counted-loop step: set var or jump to exit
+
+    # --- Arrays ---
+    BUILD_ARRAY = auto()     # dst = [first .. first + count]
+    BUILD_RANGE = auto()     # dst = range(start, end, step)
+    INDEX_GET = auto()       # dst = array[index]
+    INDEX_SET = auto()       # array[index] = value
+
+    # --- Builtins ---
+    PRINT = auto()           # print src
+
+    # --- Program ---
+    HALT = auto()
+
+
+SHAPES = {
+    RegOp.MOVE: "rr",
+    RegOp.LOAD_GLOBAL: "rg",
+
+    RegOp.ADD: "rrr",
+    RegOp.SUB: "rrr",
+    RegOp.MUL: "rrr",
+    RegOp.DIV: "rrr",
+    RegOp.NEG: "rr",
+
+    RegOp.EQ: "rrr",
+    RegOp.NEQ: "rrr",
+    RegOp.GT: "rrr",
+    RegOp.GTE: "rrr",
+    RegOp.LT: "rrr",
+    RegOp.LTE: "rrr",
+    RegOp.NOT: "rr",
+
+    RegOp.JUMP: "j",
+    RegOp.JUMP_IF_FALSE: "rj",
+    RegOp.JUMP_IF_TRUE: "rj",
+    RegOp.JUMP_UNLESS_EQ: "rrj",
+    RegOp.JUMP_UNLESS_NEQ: "rrj",
+    RegOp.JUMP_UNLESS_GT: "rrj",
+    RegOp.JUMP_UNLESS_GTE: "rrj",
+    RegOp.JUMP_UNLESS_LT: "rrj",
+    RegOp.JUMP_UNLESS_LTE: "rrj",
+
+    RegOp.CALL: "rfrn",
+    RegOp.TAIL_CALL: "frn",
+    RegOp.RETURN: "r",
+
+    RegOp.ITER_INIT: "rr",
+    RegOp.ITER_NEXT: "rrj",
+    RegOp.RANGE_INIT: "rrrr",
+    RegOp.FOR_RANGE: "jrr",
+
+    RegOp.BUILD_ARRAY: "rrn",
+    RegOp.BUILD_RANGE: "rrrr",
+    RegOp.INDEX_GET: "rrr",
+    RegOp.INDEX_SET: "rrr",
+
+    RegOp.PRINT: "r",
+
+    RegOp.HALT: "",
+}
@@ -0,0 +1,413 @@
+"""
+Rayvn register VM
+
+Runs RegisterCode (see Register/compiler.py). Same dispatch scheme as
+the stack VM: every instruction is decoded once into a
+(handler, operands) pair, and handlers are closures over the VM.
+
+Instead of an operand stack each frame has a register file, a list
+laid out as variables, temporaries, constants. A call slices the
+arguments out of the caller's registers and appends the callee's
+template (zeros, then its constants) to make the new frame; the
+top-level frame is the global table.
+"""
+
+from compiler.Register.opcodes import RegOp
+from compiler.ByteCode.vm import Halt, trip_count
+
+
+DONE = object()    # ITER_NEXT's end-of-iteration sentinel
+
+
+class Frame:
+    """
+    One function activation, as seen by its caller.
+
+    return_ip: where the caller resumes
+    dst:       caller register that receives the return value
+    regs:      the caller's register file
+    """
+    __slots__ = ("return_ip", "dst", "regs")
+
+
+class CallTarget:
+    """
+    Pre-digested CALL operand: where the function starts and the part
+    of its initial register file that follows the arguments.
+    """
+    __slots__ = ("name", "entry", "padding")
+
+    def __init__(self, func):
+        self.name = func["name"]
+        self.entry = func["entry"]
+        # Shared; only ever copied into a new frame
+        self.padding = func["template"][len(func["params"]):]
+
+
+class RegisterVM:
+    def __init__(self, code):
+        self.code = code       # RegisterCode
+        self.globals = list(code.main["template"])
+        self.regs = self.globals
+        self.call_stack = []   # caller Frames, innermost last
+        self.frame_pool = []
+        self.ip = 0
+
+        self.handlers = self.build_handlers()
+        self.program = self.decode(code)
+
+    def decode(self, code):
+        """
+        Pair every instruction with its handler, with CALL /
+        TAIL_CALL's function index resolved to a shared CallTarget.
+        """
+        handlers = self.handlers
+        targets = [CallTarget(func) for func in code.functions]
+
+        program = []
+        for op, arg in code.code:
+            if op is RegOp.CALL:
+                dst, index, first, argc = arg
+                arg = (dst, targets[index], first, argc)
+            elif op is RegOp.TAIL_CALL:
+                index, first, argc = arg
+                arg = (targets[index], first, argc)
+
+            handler = handlers.get(op)
+            if handler is None:
+                raise Exception(f"Unknown opcode: {op}")
+            program.append((handler, arg))
+
+        return program
+
+    def build_handlers(self):
+        """
+        Build the RegOp -> handler table. The current register file is
+        vm.regs, read once per instruction.
+        """
+        vm = self
+        globals_ = self.globals
+
+        # Moves
+        def move(arg):
+            dst, src = arg
+            regs = vm.regs
+            regs[dst] = regs[src]
+
+        def load_global(arg):
+            dst, index = arg
+            vm.regs[dst] = globals_[index]
+
+        # Arithmetic and Comparison
+        def add(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] + regs[b]
+
+        def sub(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] - regs[b]
+
+        def mul(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] * regs[b]
+
+        def div(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] / regs[b]
+
+        def neg(arg):
+            dst, src = arg
+            regs = vm.regs
+            regs[dst] = -regs[src]
+
+        def eq(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] == regs[b]
+
+        def neq(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] != regs[b]
+
+        def gt(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] > regs[b]
+
+        def gte(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] >= regs[b]
+
+        def lt(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] < regs[b]
+
+        def lte(arg):
+            dst, a, b = arg
+            regs = vm.regs
+            regs[dst] = regs[a] <= regs[b]
+
+        def not_(arg):
+            dst, src = arg
+            regs = vm.regs
+            regs[dst] = not regs[src]
+
+        # Control flow
+        def jump(arg):
+            vm.ip = arg
+
+        def jump_if_false(arg):
+            src, target = arg
+            if not vm.regs[src]:
+                vm.ip = target
+
+        def jump_if_true(arg):
+            src, target = arg
+            if vm.regs[src]:
+                vm.ip = target
+
+        def jump_unless_eq(arg):
+            a, b, target = arg
+            regs = vm.regs
+            if not regs[a] == regs[b]:
+                vm.ip = target
+
+        def jump_unless_neq(arg):
+            a, b, target = arg
+            regs = vm.regs
+            if not regs[a] != regs[b]:
+                vm.ip = target
+
+        def jump_unless_gt(arg):
+            a, b, target = arg
+            regs = vm.regs
+            if not regs[a] > regs[b]:
+                vm.ip = target
+
+        def jump_unless_gte(arg):
+            a, b, target = arg
+            regs = vm.regs
+            if not regs[a] >= regs[b]:
+                vm.ip = target
+
+        def jump_unless_lt(arg):
+            a, b, target = arg
+            regs = vm.regs
+            if not regs[a] < regs[b]:
+                vm.ip = target
+
+        def jump_unless_lte(arg):
+            a, b, target = arg
+            regs = vm.regs
+            if not regs[a] <= regs[b]:
+                vm.ip = target
+
+        # Functions
+        call_stack = self.call_stack
+        frame_pool = self.frame_pool
+
+        def call(arg):
+            dst, target, first, argc = arg
+            regs = vm.regs
+
+            frame = frame_pool.pop() if frame_pool else Frame()
+            frame.return_ip = vm.ip
+            frame.dst = dst
+            frame.regs = regs
+            call_stack.append(frame)
+
+            vm.regs = regs[first:first + argc] + target.padding
+            vm.ip = target.entry
+
+        def tail_call(arg):
+            # Only emitted inside functions; the caller's Frame stays
+            target, first, argc = arg
+            vm.regs = vm.regs[first:first + argc] + target.padding
+            vm.ip = target.entry
+
+        def return_(arg):
+            value = vm.regs[arg]
+
+            if not call_stack:
+                # Top-level return = program end
+                raise Halt(value)
+
+            frame = call_stack.pop()
+            regs = frame.regs
+            regs[frame.dst] = value
+
+            vm.regs = regs
+            vm.ip = frame.return_ip
+
+            frame.regs = None
+            frame_pool.append(frame)
+
+        # Iterators
+        def iter_init(arg):
+            dst, src = arg
+            regs = vm.regs
+            iterable = regs[src]
+
+            if isinstance(iterable, (list, str, range)):
+                regs[dst] = iter(iterable)
+
+            elif isinstance(iterable, int):
+                # iterate over digits
+                regs[dst] = iter(str(abs(iterable)))
+
+            else:
+                raise Exception("Object is not iterable")
+
+        def iter_next(arg):
+            var, it, exit_ = arg
+            regs = vm.regs
+            value = next(regs[it], DONE)
+
+            if value is DONE:
+                vm.ip = exit_
+            else:
+                regs[var] = value
+
+        # Counted loops
+        def range_init(arg):
+            state, start, end, step = arg
+            regs = vm.regs
+
+            # range() raises the same errors BUILD_RANGE would
+            r = range(regs[start], regs[end], regs[step])
+
+            regs[state] = r.start          # next value
+            regs[state + 1] = trip_count(r)    # iterations left
+            regs[state + 2] = r.step
+
+        def for_range(arg):
+            exit_, var, state = arg
+            regs = vm.regs
+            left = regs[state + 1]
+
+            if left:
+                value = regs[state]
+                regs[var] = value
+                regs[state] = value + regs[state + 2]
+                regs[state + 1] = left - 1
+            else:
+                vm.ip = exit_
+
+        # Arrays
+        def build_array(arg):
+            dst, first, count = arg
+            regs = vm.regs
+            regs[dst] = regs[first:first + count]
+
+        def build_range(arg):
+            dst, start, end, step = arg
+            regs = vm.regs
+            regs[dst] = range(regs[start], regs[end], regs[step])
+
+        def index_get(arg):
+            dst, array, index = arg
+            regs = vm.regs
+            idx = regs[index]
+            value = regs[array]
+
+            if not isinstance(idx, int):
+                raise Exception("Index must be integer")
+
+            if isinstance(value, (list, str)):
+                regs[dst] = value[idx]
+
+            elif isinstance(value, int):
+                digits = str(abs(value))
+                regs[dst] = int(digits[idx])
+
+            else:
+                raise Exception("Indexing unsupported type")
+
+        def index_set(arg):
+            array, index, value = arg
+            regs = vm.regs
+            idx = regs[index]
+            target = regs[array]
+
+            if not isinstance(idx, int):
+                raise Exception("Index must be integer")
+
+            if isinstance(target, list):
+                target[idx] = regs[value]
+
+            else:
+                raise Exception("Assignment only supported for arrays")
+
+        def print_(arg):
+            print(vm.regs[arg])
+
+        def halt(arg):
+            raise Halt()
+
+        return {
+            RegOp.MOVE: move,
+            RegOp.LOAD_GLOBAL: load_global,
+
+            RegOp.ADD: add,
+            RegOp.SUB: sub,
+            RegOp.MUL: mul,
+            RegOp.DIV: div,
+            RegOp.NEG: neg,
+
+            RegOp.EQ: eq,
+            RegOp.NEQ: neq,
+            RegOp.GT: gt,
+            RegOp.GTE: gte,
+            RegOp.LT: lt,
+            RegOp.LTE: lte,
+            RegOp.NOT: not_,
+
+            RegOp.JUMP: jump,
+            RegOp.JUMP_IF_FALSE: jump_if_false,
+            RegOp.JUMP_IF_TRUE: jump_if_true,
+            RegOp.JUMP_UNLESS_EQ: jump_unless_eq,
+            RegOp.JUMP_UNLESS_NEQ: jump_unless_neq,
+            RegOp.JUMP_UNLESS_GT: jump_unless_gt,
+            RegOp.JUMP_UNLESS_GTE: jump_unless_gte,
+            RegOp.JUMP_UNLESS_LT: jump_unless_lt,
+            RegOp.JUMP_UNLESS_LTE: jump_unless_lte,
+
+            RegOp.CALL: call,
+            RegOp.TAIL_CALL: tail_call,
+            RegOp.RETURN: return_,
+
+            RegOp.ITER_INIT: iter_init,
+            RegOp.ITER_NEXT: iter_next,
+            RegOp.RANGE_INIT: range_init,
+            RegOp.FOR_RANGE: for_range,
+
+            RegOp.BUILD_ARRAY: build_array,
+            RegOp.BUILD_RANGE: build_range,
+            RegOp.INDEX_GET: index_get,
+            RegOp.INDEX_SET: index_set,
+
+            RegOp.PRINT: print_,
+            RegOp.HALT: halt,
+        }
+
+    # ---------------------------------------------------------
+    # Dispatch loop
+    # ---------------------------------------------------------
+
+    def run(self):
+        program = self.program
+
+        try:
+            while True:
+                handler, arg = program[self.ip]
+                self.ip += 1
+                handler(arg)
+        except Halt as halt:
+            return halt.value
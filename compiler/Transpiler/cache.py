@@ -0,0 +1,76 @@
+"""
+Rayvn transpiled-module cache (.rvpy)
+
+Stores the code object of a transpiled program (see transpiler.py) so
+repeated runs of an unchanged script skip the front end and the
+transpile, and go straight to CPython's eval loop.
+
+Same rules as the bytecode cache (ByteCode/cache.py): a file is only
+used when it was written by the same transpiler version, the same
+Python (code objects are not portable between versions), at the same
+optimization level, for byte-identical source. `foo.rv` caches to
+`foo.rvpy` next to it, or into RAYVN_CACHE_DIR when that is set.
+"""
+
+import marshal
+import sys
+import types
+
+from compiler.ByteCode.cache import cache_path, read, write
+from compiler.Transpiler.transpiler import PythonProgram, TRANSPILER_VERSION
+
+
+MAGIC = "RAYVN-RVPY"
+SUFFIX = ".rvpy"
+
+
+def serialize(digest, opt_level, code):
+    return marshal.dumps({
+        "magic": MAGIC,
+        "version": TRANSPILER_VERSION,
+        "python": sys.implementation.cache_tag,
+        "opt": opt_level,
+        "hash": digest,
+        "code": code,
+    })
+
+
+def deserialize(data, digest, opt_level):
+    """
+    Return the PythonProgram if the blob is valid for the source with
+    this hash, transpiler, Python and optimization level, otherwise None.
+    """
+    try:
+        blob = marshal.loads(data)
+    except (EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(blob, dict):
+        return None
+    if blob.get("magic") != MAGIC:
+        return None
+    if blob.get("version") != TRANSPILER_VERSION:
+        return None
+    if blob.get("python") != sys.implementation.cache_tag:
+        return None
+    if blob.get("opt") != opt_level:
+        return None
+    if blob.get("hash") != digest:
+        return None
+
+    code = blob.get("code")
+    if not isinstance(code, types.CodeType):
+        return None
+    return PythonProgram(code)
+
+
+def load(path, digest, opt_level):
+    """
+    Load the cached module for `path`, or None on a miss.
+    """
+    data = read(cache_path(path, SUFFIX))
+    return None if data is None else deserialize(data, digest, opt_level)
+
+
+def store(path, digest, opt_level, program):
+    write(cache_path(path, SUFFIX), serialize(digest, opt_level, program.code))
@@ -0,0 +1,699 @@
+"""
+Rayvn to Python transpiler
+
+Turns the same (optimized) AST the VMs run into the source of one
+Python module, compiles it with compile() and runs the code object:
+
+    fn fib(n) {                   def main():
+        if n < 2 {                    v_x = 0
+            return n                  def f0(v_n):
+        }                                 if (v_n < 2):
+        return fib(n - 1)                     return v_n
+             + fib(n - 2)                 return (f0((v_n - 1)) + f0((v_n - 2)))
+    }                                 v_x = f0(20)
+    let x = fib(20)                   print(v_x)
+    log x
+
+Top-level code is the body of main(), so globals are its locals, and
+every Rayvn function, however nested in the source, is a def directly
+inside main(). Function bodies therefore read globals as closure
+cells and never see each other's locals, the same two-level scoping
+the VMs have. Names are prefixed (v_ for variables, f<n> for function
+n, t<n> for temporaries, rt_ for the runtime), so no Rayvn name can
+shadow another or a Python builtin.
+
+What Python does not do the way Rayvn does is routed through the
+runtime: indexing and iteration (digits of integers, Rayvn's error
+messages) and tail calls. A tail call to the function itself becomes
+a jump back to the top of its body; any other returns a thunk that
+callers run (rt_settle) in place of the callee, so tail-recursive
+code runs in constant stack.
+
+Like the other compilers this never recurses over statements: handlers
+push (method, *args) actions onto self.work and emit indented lines.
+Expressions are rendered recursively only when they are shallow;
+deeper ones are spilled into temporaries in evaluation order.
+
+The generated module is cached on disk like bytecode (see cache.py).
+"""
+
+import keyword
+import math
+import re
+import sys
+import types
+
+from compiler.rayvn_ast import *
+from compiler.lexer import TokenType
+from compiler.analysis import assigned_names, function_defs
+from compiler.codegen import AND_OPS, OR_OPS, FunctionTable, WorkStack
+from compiler.Closure.compiler import index_get, index_set, iterable, RECURSION_LIMIT
+
+
+# Bump whenever the generated code changes shape; invalidates .rvpy files
+TRANSPILER_VERSION = 2
+
+BINARY_OPS = {
+    TokenType.PLUS: "+",
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.SLASH: "/",
+
+    TokenType.GT: ">",
+    TokenType.GTE: ">=",
+    TokenType.LT: "<",
+    TokenType.LTE: "<=",
+    TokenType.EQEQ: "==",
+    TokenType.NOTEQ: "!=",
+}
+
+CONSTANTS = (Number, Boolean, String)
+
+# Deepest expression rendered as one Python expression. CPython's
+# parser gives up at 200 nested parentheses, and a level here can
+# take three.
+MAX_EXPR_DEPTH = 50
+
+# Names per line when initializing variables to 0
+INIT_CHUNK = 32
+
+# Wrap a call to function <n>: they become rt_settle( ... ) or
+# nothing once every function is known. repr() never emits raw control
+# characters, so string constants cannot contain them.
+SETTLE_OPEN = "\0{}\0"
+SETTLE_CLOSE = "\1{}\1"
+SETTLE_RE = re.compile("([\0\1])(\\d+)[\0\1]")
+
+
+# ---------------------------------------------------------
+# Runtime
+# ---------------------------------------------------------
+
+def settle(result):
+    """
+    Run the thunks a tail call leaves behind until one returns a
+    value. Rayvn values are never Python functions.
+    """
+    while type(result) is types.FunctionType:
+        result = result()
+    return result
+
+
+# Module globals of every generated module
+RUNTIME = {
+    "rt_index": index_get,
+    "rt_index_set": index_set,
+    "rt_iterable": iterable,
+    "rt_settle": settle,
+}
+
+
+class PythonProgram:
+    """
+    A transpiled program: the module's code object, and its source
+    when it was just transpiled rather than loaded from the cache.
+    """
+
+    def __init__(self, code, source=None):
+        self.code = code
+        self.source = source
+
+    def run(self):
+        namespace = dict(RUNTIME)
+        exec(self.code, namespace)
+
+        # Deep Rayvn recursion is deep Python recursion here, bounded
+        # per Python version as in the closure backend
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            return namespace["main"]()
+        finally:
+            sys.setrecursionlimit(limit)
+
+
+def literal(value):
+    """
+    Python source for a constant.
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return f'float("{value}")'
+    if isinstance(value, int) and value.bit_length() > 4096:
+        # repr() refuses ints this long (sys.set_int_max_str_digits)
+        return hex(value)
+    return repr(value)
+
+
+def simple_name(text):
+    return text.isidentifier() and not keyword.iskeyword(text)
+
+
+class Scope:
+    """
+    Top-level code or one function body while it is being transpiled.
+
+    vars:  Rayvn name -> Python name of every local, params first
+    lines: (indent level, text), relative to the body
+    """
+
+    def __init__(self, params=()):
+        self.vars = {}
+        self.params = list(params)
+        self.lines = []
+        self.level = 0
+        self.loops = 0          # enclosing loops, for break / continue and tail calls
+        self.temps = 0
+        self.index = None       # function index; None for top-level code
+        self.self_tail = False  # whether the body jumps back to its top
+
+
+class Transpiler(WorkStack):
+    """
+    Transpiler
+    ----------
+    Walks the AST and writes a Python module.
+
+    Responsibilities:
+    - Map variables to Python locals (same scoping rules as the VMs)
+    - Render expressions, spilling deep ones into temporaries
+    - Declare every function up front (same rules as the stack compiler)
+    - Turn tail calls into loops or thunks
+    """
+
+    def __init__(self, filename="<rayvn>"):
+        self.filename = filename
+        self.main = Scope()
+        self.scope = self.main
+        self.functions = []       # (name, params) by index
+        self.blocks = {}          # index -> lines of its def, relative to main
+        self.function_table = FunctionTable()   # which function a call runs
+        self.trampolined = set()  # functions that may return a thunk
+        self.work = []            # pending (method, *args) actions
+        self.marks = []           # line counts at the start of open blocks
+
+        self.statement_handlers = {
+            LetStmt: self.compile_binding,
+            AssignStmt: self.compile_binding,
+            PrintStmt: self.compile_print,
+            ExprStmt: self.compile_expr_stmt,
+            IndexAssign: self.compile_index_assign,
+
+            IfChain: self.compile_if_chain,
+            WhileStmt: self.compile_while,
+            ForInLoop: self.compile_for_in,
+
+            FunctionDef: self.compile_function_def,
+            ReturnStmt: self.compile_return,
+
+            BreakStmt: self.compile_break,
+            ContinueStmt: self.compile_continue,
+        }
+
+    # ---------------------------------------------------------
+    # Entry points
+    # ---------------------------------------------------------
+
+    def compile(self, program):
+        """
+        Transpile a Program; returns a PythonProgram.
+        """
+        for name in assigned_names(program.statements):
+            self.var(name)
+        for fn in function_defs(program.statements):
+            self.declare_function(fn.name, fn.params)
+
+        for stmt in program.statements:
+            self.run(self.statement, stmt, 0)
+
+        return self.link()
+
+    def compile_flat(self, flat):
+        """
+        Transpile a flat_ast.FlatAST, one top-level statement at a time.
+        """
+        for name in flat.global_names:
+            self.var(name)
+        for name, params in flat.functions:
+            self.declare_function(name, params)
+
+        for stmt in flat:
+            self.run(self.statement, stmt, 0)
+
+        return self.link()
+
+    def link(self):
+        source = self.module_source()
+        return PythonProgram(compile(source, self.filename, "exec"), source)
+
+    def module_source(self):
+        lines = [(0, "# Rayvn program, transpiled to Python"), (0, "def main():")]
+        lines.extend(self.initializers(self.main.vars.values(), 1))
+        for index in sorted(self.blocks):
+            lines.extend((level + 1, text) for level, text in self.blocks[index])
+        lines.extend((level + 1, text) for level, text in self.main.lines)
+        if len(lines) == 2:
+            lines.append((1, "pass"))
+
+        def settle_mark(match):
+            if int(match.group(2)) not in self.trampolined:
+                return ""
+            return "rt_settle(" if match.group(1) == "\0" else ")"
+
+        source = "\n".join("    " * level + text for level, text in lines) + "\n"
+        return SETTLE_RE.sub(settle_mark, source)
+
+    def initializers(self, names, level):
+        names = list(names)
+        return [
+            (level, " = ".join(names[i:i + INIT_CHUNK]) + " = 0")
+            for i in range(0, len(names), INIT_CHUNK)
+        ]
+
+    def statement(self, node, level):
+        handler = self.statement_handlers.get(type(node))
+        if handler is None:
+            raise Exception(f"Compiler missing node: {type(node)}")
+        self.scope.level = level
+        handler(node)
+
+    def emit(self, text, level=None):
+        scope = self.scope
+        scope.lines.append((scope.level if level is None else level, text))
+
+    # ---------------------------------------------------------
+    # Variables
+    # ---------------------------------------------------------
+
+    def var(self, name):
+        """
+        Python name of a local of the current scope, added if new.
+        """
+        vars_ = self.scope.vars
+        if name not in vars_:
+            # Rayvn names are alphanumeric; only ASCII ones are safe
+            # from Python's identifier normalization
+            vars_[name] = f"v_{name}" if name.isascii() else f"u_{name.encode().hex()}"
+        return vars_[name]
+
+    def load(self, name):
+        """
+        Inside a function: locals first, then globals, else a fresh
+        local that reads as 0.
+        """
+        scope = self.scope
+        if scope is not self.main and name not in scope.vars and name in self.main.vars:
+            return self.main.vars[name]
+        return self.var(name)
+
+    def temp(self):
+        scope = self.scope
+        scope.temps += 1
+        return f"t{scope.temps}"
+
+    # =========================
+    # Expressions
+    # =========================
+
+    def expr(self, node):
+        """
+        Python expression for `node`. Deep trees are first spilled
+        into temporaries, emitted at the current level.
+        """
+        if self.too_deep(node):
+            return self.spill(node)
+        return self.render(node)
+
+    def children(self, node):
+        """
+        An expression's operands, in evaluation order.
+        """
+        if isinstance(node, (Binary, Logical)):
+            return [node.left, node.right]
+        if isinstance(node, (Unary, Not)):
+            return [node.expr]
+        if isinstance(node, CallExpr):
+            return node.args
+        if isinstance(node, ArrayLiteral):
+            return node.elements
+        if isinstance(node, IndexExpr):
+            return [node.array, node.index]
+        if isinstance(node, RangeExpr):
+            return [node.start, node.end, node.step or Number(1)]
+        return []
+
+    def too_deep(self, node):
+        stack = [(node, 1)]
+        while stack:
+            node, depth = stack.pop()
+            if depth > MAX_EXPR_DEPTH:
+                return True
+            stack.extend((child, depth + 1) for child in self.children(node))
+        return False
+
+    def render(self, node):
+        # Recursion is bounded by MAX_EXPR_DEPTH
+        return self.combine(node, [self.render(child) for child in self.children(node)])
+
+    def spill(self, root):
+        """
+        Evaluate `root` one node per line into temporaries, in the
+        order the VMs would; returns the text holding the result.
+        and / or become if statements so they still short-circuit.
+        """
+        values = []
+        stack = [("visit", root)]
+
+        while stack:
+            action, node, *rest = stack.pop()
+
+            if action == "visit":
+                if isinstance(node, (Binary, Logical)) and node.op in AND_OPS | OR_OPS:
+                    target = self.temp()
+                    stack.extend((
+                        ("join", node, target),
+                        ("visit", node.right),
+                        ("branch", node, target),
+                        ("visit", node.left),
+                    ))
+                else:
+                    children = self.children(node)
+                    stack.append(("build", node, len(children)))
+                    stack.extend(("visit", child) for child in reversed(children))
+
+            elif action == "branch":
+                target, = rest
+                self.emit(f"{target} = {values.pop()}")
+                self.emit(f"if {target}:" if node.op in AND_OPS else f"if not {target}:")
+                self.scope.level += 1
+
+            elif action == "join":
+                target, = rest
+                self.emit(f"{target} = {values.pop()}")
+                self.scope.level -= 1
+                values.append(target)
+
+            else:
+                count, = rest
+                parts = values[len(values) - count:]
+                del values[len(values) - count:]
+                text = self.combine(node, parts)
+
+                if parts or isinstance(node, CallExpr):
+                    target = self.temp()
+                    self.emit(f"{target} = {text}")
+                    text = target
+                values.append(text)
+
+        return values.pop()
+
+    def combine(self, node, parts):
+        """
+        Python expression for `node` given its operands' expressions.
+        """
+        if isinstance(node, CONSTANTS):
+            return literal(node.value)
+
+        if isinstance(node, Var):
+            return self.load(node.name)
+
+        if isinstance(node, (Binary, Logical)):
+            left, right = parts
+            if node.op in AND_OPS:
+                return f"({left} and {right})"
+            if node.op in OR_OPS:
+                return f"({left} or {right})"
+            if node.op in BINARY_OPS:
+                return f"({left} {BINARY_OPS[node.op]} {right})"
+
+        elif isinstance(node, Unary):
+            if node.op == TokenType.MINUS:
+                return f"(-{parts[0]})"
+            return parts[0]
+
+        elif isinstance(node, Not):
+            return f"(not {parts[0]})"
+
+        elif isinstance(node, CallExpr):
+            index = self.function_table.resolve(node.name, len(parts))
+            return f"{SETTLE_OPEN.format(index)}f{index}({', '.join(parts)}){SETTLE_CLOSE.format(index)}"
+
+        elif isinstance(node, ArrayLiteral):
+            return f"[{', '.join(parts)}]"
+
+        elif isinstance(node, IndexExpr):
+            array, index = parts
+            if not simple_name(array):
+                return f"rt_index({array}, {index})"
+
+            # Lists with int indices inline; anything else takes the
+            # runtime's path. Both operands are names or constants, so
+            # evaluating them twice is safe.
+            if isinstance(node.index, Number) and type(node.index.value) is int:
+                check = f"type({array}) is list"
+            elif simple_name(index):
+                check = f"type({index}) is int and type({array}) is list"
+            else:
+                return f"rt_index({array}, {index})"
+            return f"({array}[{index}] if {check} else rt_index({array}, {index}))"
+
+        elif isinstance(node, RangeExpr):
+            return f"range({', '.join(parts)})"
+
+        raise Exception(f"Compiler missing node: {type(node)}")
+
+    # =========================
+    # Simple statements
+    # =========================
+
+    def compile_binding(self, node):
+        # Assignments always bind in the current scope
+        value = self.expr(node.value)
+        self.emit(f"{self.var(node.name)} = {value}")
+
+    def compile_print(self, node):
+        self.emit(f"print({self.expr(node.expr)})")
+
+    def compile_expr_stmt(self, node):
+        self.emit(self.expr(node.expr))
+
+    def compile_index_assign(self, node):
+        array, index, value = (self.expr(part) for part in (node.array, node.index, node.value))
+
+        if simple_name(array) and simple_name(index):
+            self.emit(f"if type({index}) is int and type({array}) is list:")
+            self.emit(f"{array}[{index}] = {value}", self.scope.level + 1)
+            self.emit("else:")
+            self.emit(f"rt_index_set({array}, {index}, {value})", self.scope.level + 1)
+        else:
+            self.emit(f"rt_index_set({array}, {index}, {value})")
+
+    def compile_return(self, node):
+        value = node.value
+
+        if isinstance(value, CallExpr) and self.scope is not self.main:
+            self.tail_call(value)
+
+        elif value is None:
+            self.emit("return None")
+
+        else:
+            self.emit(f"return {self.expr(value)}")
+
+    def tail_call(self, node):
+        """
+        return f(...) in a function: jump back to the top of the body
+        when f is this function, else hand the caller a thunk.
+        """
+        args = [self.expr(arg) for arg in node.args]
+        index = self.function_table.resolve(node.name, len(args))
+        scope = self.scope
+
+        # Inside a Rayvn loop `continue` would restart that loop
+        if index == scope.index and not scope.loops:
+            scope.self_tail = True
+            if args:
+                params = self.param_names(scope)
+                self.emit(f"{', '.join(params)} = {', '.join(args)}")
+            self.emit("continue")
+            return
+
+        self.trampolined.add(scope.index)
+        names = [f"a{i}" for i in range(len(args))]
+        # Defaults, so the arguments are evaluated now
+        head = " ".join(["lambda", ", ".join(f"{name}={arg}" for name, arg in zip(names, args))]).rstrip()
+        self.emit(f"return {head}: f{index}({', '.join(names)})")
+
+    # =========================
+    # Blocks
+    # =========================
+
+    def block(self, body, level):
+        """
+        Actions that emit a statement list at `level`.
+        """
+        return [
+            (self.begin_block,),
+            *((self.statement, stmt, level) for stmt in body),
+            (self.end_block, level),
+        ]
+
+    def begin_block(self):
+        self.marks.append(len(self.scope.lines))
+
+    def end_block(self, level):
+        if len(self.scope.lines) == self.marks.pop():
+            # Empty, or only function definitions (emitted elsewhere)
+            self.emit("pass", level)
+
+    def condition(self, node, level):
+        """
+        Render a condition whose spilled lines, if any, must go at
+        `level`; returns (text, spilled lines).
+        """
+        scope = self.scope
+        mark = len(scope.lines)
+        saved, scope.level = scope.level, level
+
+        text = self.expr(node)
+        spilled = scope.lines[mark:]
+        del scope.lines[mark:]
+
+        scope.level = saved
+        return text, spilled
+
+    # =========================
+    # Control flow
+    # =========================
+
+    def compile_if_chain(self, node):
+        self.if_branch(node, 0, self.scope.level)
+
+    def if_branch(self, node, i, level):
+        """
+        Emit branch i of an if chain at `level`, then schedule its
+        body and the next branch. An elif whose condition spills
+        becomes an else: holding the spill and a new if.
+        """
+        if i == len(node.branches):
+            if node.else_body:
+                self.emit("else:", level)
+                self.schedule(*self.block(node.else_body, level + 1))
+            return
+
+        cond, body = node.branches[i]
+        if i == 0:
+            text, spilled = self.condition(cond, level)
+            keyword_ = "if"
+        else:
+            text, spilled = self.condition(cond, level + 1)
+            keyword_ = "elif"
+            if spilled:
+                self.emit("else:", level)
+                level += 1
+                keyword_ = "if"
+
+        self.scope.lines.extend(spilled)
+        self.emit(f"{keyword_} {text}:", level)
+        self.schedule(*self.block(body, level + 1), (self.if_branch, node, i + 1, level))
+
+    def begin_loop(self):
+        self.scope.loops += 1
+
+    def end_loop(self):
+        self.scope.loops -= 1
+
+    def compile_while(self, node):
+        level = self.scope.level
+        text, spilled = self.condition(node.condition, level + 1)
+
+        if spilled:
+            # Re-evaluated on every iteration, `continue` included
+            self.emit("while True:")
+            self.scope.lines.extend(spilled)
+            self.emit(f"if not {text}:", level + 1)
+            self.emit("break", level + 2)
+        else:
+            self.emit(f"while {text}:")
+
+        self.begin_loop()
+        self.schedule(*self.block(node.body, level + 1), (self.end_loop,))
+
+    def compile_for_in(self, node):
+        level = self.scope.level
+
+        if isinstance(node.iterable, RangeExpr):
+            # for i in range(...) is a Python range loop
+            rng = node.iterable
+            bounds = [self.expr(part) for part in (rng.start, rng.end, rng.step or Number(1))]
+            source = f"range({', '.join(bounds)})"
+        else:
+            source = f"rt_iterable({self.expr(node.iterable)})"
+
+        self.emit(f"for {self.var(node.var)} in {source}:")
+        self.begin_loop()
+        self.schedule(*self.block(node.body, level + 1), (self.end_loop,))
+
+    def compile_break(self, node):
+        if not self.scope.loops:
+            raise Exception("break outside loop")
+        self.emit("break")
+
+    def compile_continue(self, node):
+        if not self.scope.loops:
+            raise Exception("continue outside loop")
+        self.emit("continue")
+
+    # =========================
+    # Functions
+    # =========================
+    # Declared up front, and calls resolved, by the FunctionTable (see
+    # compiler/codegen.py).
+
+    def declare_function(self, name, params):
+        self.function_table.declare(name, params)
+        self.functions.append((name, params))
+
+    def compile_function_def(self, node):
+        index = self.function_table.define(node.name)
+
+        outer = self.scope
+        self.scope = Scope(node.params)
+        self.scope.index = index
+
+        for name in node.params:
+            self.var(name)
+        for name in assigned_names(node.body):
+            self.var(name)
+
+        self.schedule(*self.block(node.body, 0), (self.end_function, node, outer))
+
+    def end_function(self, node, outer):
+        scope = self.scope
+        index = scope.index
+        params = self.param_names(scope)
+        others = [name for rayvn, name in scope.vars.items() if rayvn not in node.params]
+
+        lines = [(0, f"def f{index}({', '.join(params)}):  # {node.name}")]
+        body = 1
+        if scope.self_tail:
+            # Each pass is a fresh activation: non-params start at 0
+            lines.append((1, "while True:"))
+            body = 2
+
+        lines.extend(self.initializers(others, body))
+        lines.extend((level + body, text) for level, text in scope.lines)
+        if scope.self_tail:
+            lines.append((body, "return None"))
+
+        self.blocks[index] = lines
+        self.scope = outer
+
+    def param_names(self, scope):
+        """
+        Python parameter list. A repeated Rayvn param is bound by its
+        first argument, as in the VMs; later ones get placeholders.
+        """
+        names = []
+        for i, name in enumerate(scope.params):
+            names.append(f"p{i}" if name in scope.params[:i] else scope.vars[name])
+        return names
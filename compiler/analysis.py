@@ -0,0 +1,297 @@
+"""
+Rayvn front-end analysis
+
+Checks over the AST that every backend shares. main.parse_for runs
+them on the parsed program before the optimizer touches it, so what
+they reject is rejected at every -O level, even in code the optimizer
+drops. Both take the top-level statements one at a time, as the flat
+front end produces them, and nothing here recurses.
+
+Also the AST walks the compilers share: assigned_names and
+function_defs.
+"""
+
+from itertools import chain
+
+from compiler.rayvn_ast import *
+
+
+def assigned_names(stmts):
+    """
+    Yield every name bound by a statement list.
+
+    Descends into nested blocks (if / while / for) but not into
+    function definitions, which open a scope of their own.
+    """
+    for stmt in stmts:
+        if isinstance(stmt, (LetStmt, AssignStmt)):
+            yield stmt.name
+
+        elif isinstance(stmt, ForInLoop):
+            yield stmt.var
+            yield from assigned_names(stmt.body)
+
+        elif isinstance(stmt, WhileStmt):
+            yield from assigned_names(stmt.body)
+
+        elif isinstance(stmt, IfChain):
+            for _, body in stmt.branches:
+                yield from assigned_names(body)
+            if stmt.else_body:
+                yield from assigned_names(stmt.else_body)
+
+
+def function_defs(stmts):
+    """
+    Yield every FunctionDef in a statement list, in source order,
+    including those nested in blocks and in other functions. This is
+    the order the compiler reaches them in.
+    """
+    pending = [iter(stmts)]
+
+    while pending:
+        for stmt in pending[-1]:
+            if isinstance(stmt, FunctionDef):
+                yield stmt
+                pending.append(iter(stmt.body))
+            elif isinstance(stmt, (WhileStmt, ForInLoop)):
+                pending.append(iter(stmt.body))
+            elif isinstance(stmt, IfChain):
+                blocks = [body for _, body in stmt.branches]
+                if stmt.else_body:
+                    blocks.append(stmt.else_body)
+                pending.append(chain.from_iterable(blocks))
+            else:
+                continue
+            break
+        else:
+            pending.pop()
+
+
+def if_chain_children(node):
+    children = []
+    if node.else_body:
+        children.extend(reversed(node.else_body))
+    for condition, body in reversed(node.branches):
+        children.extend(reversed(body))
+        children.append(condition)
+    return children
+
+
+# The nodes directly under a node, last first: pushed onto a work
+# stack, they pop in source order
+CHILDREN = {
+    LetStmt: lambda node: (node.value,),
+    AssignStmt: lambda node: (node.value,),
+    PrintStmt: lambda node: (node.expr,),
+    ExprStmt: lambda node: (node.expr,),
+    ReturnStmt: lambda node: () if node.value is None else (node.value,),
+    BreakStmt: lambda node: (),
+    ContinueStmt: lambda node: (),
+
+    IfChain: if_chain_children,
+    WhileStmt: lambda node: (*reversed(node.body), node.condition),
+    ForInLoop: lambda node: (*reversed(node.body), node.iterable),
+
+    FunctionDef: lambda node: node.body[::-1],
+    CallExpr: lambda node: node.args[::-1],
+
+    Number: lambda node: (),
+    Boolean: lambda node: (),
+    String: lambda node: (),
+    Var: lambda node: (),
+    Unary: lambda node: (node.expr,),
+    Not: lambda node: (node.expr,),
+    Binary: lambda node: (node.right, node.left),
+    Logical: lambda node: (node.right, node.left),
+
+    RangeExpr: lambda node: (node.step, node.end, node.start) if node.step else (node.end, node.start),
+    ArrayLiteral: lambda node: node.elements[::-1],
+    IndexExpr: lambda node: (node.index, node.array),
+    IndexAssign: lambda node: (node.value, node.index, node.array),
+}
+
+
+def check_arity(name, expected, argc):
+    if argc != expected:
+        raise Exception(
+            f"{name}() takes {expected} argument{'s' if expected != 1 else ''} but {argc} {'was' if argc == 1 else 'were'} given"
+        )
+
+
+class CallCheck:
+    """
+    CallCheck
+    ---------
+    Checks that every call names a function and passes it the right
+    number of arguments.
+
+    Calls bind like the compilers bind them: to the latest definition
+    of the name reached so far, or else to the first one ahead. A call
+    of the second kind waits in pending until that definition is
+    reached. Feed it the top-level statements in order with add(),
+    then call finish().
+    """
+
+    def __init__(self):
+        self.params = {}    # name -> params of the latest definition reached
+        self.pending = {}   # name -> argument counts of calls ahead of any definition
+
+    def add(self, stmt):
+        pending = [stmt]
+
+        while pending:
+            node = pending.pop()
+
+            if isinstance(node, FunctionDef):
+                self.params[node.name] = node.params
+                for argc in self.pending.pop(node.name, ()):
+                    check_arity(node.name, len(node.params), argc)
+
+            elif isinstance(node, CallExpr):
+                params = self.params.get(node.name)
+                if params is None:
+                    self.pending.setdefault(node.name, []).append(len(node.args))
+                else:
+                    check_arity(node.name, len(params), len(node.args))
+
+            pending.extend(CHILDREN[type(node)](node))
+
+    def finish(self):
+        for name in self.pending:
+            raise Exception(f"Undefined function: {name}")
+
+
+class Purity:
+    """
+    Purity
+    ------
+    Checks that every `memo fn` is pure: it doesn't log, assign into
+    an array or read a global, and only calls pure functions, so its
+    result depends on its arguments alone. The stack VM memoizes these
+    functions; the other backends don't, but reject an impure one just
+    the same.
+
+    A function reads a global when it reads a name it doesn't bind
+    that top-level code binds or reads, anywhere in the program. Calls
+    bind like CallCheck's. Since neither is known until the whole
+    program has been seen, each function keeps, in order, the effects
+    it has for certain and the global reads it may have, and check()
+    settles them. Feed it the top-level statements in order with add(),
+    then call check(), which raises if a `memo fn` is not pure.
+    """
+
+    def __init__(self):
+        self.globals = set()       # names top-level code binds or reads
+        self.names = []            # function name, by index (the n-th FunctionDef is n)
+        self.function_index = {}   # name -> latest definition reached
+        self.effects = {}          # function index -> [(why, global name or None)], up to its first certain effect
+        self.certain = set()       # indexes with a certain effect among their effects
+        self.callees = {}          # function index -> indexes of the functions it calls
+        self.ahead = {}            # name -> indexes of functions that called it before any definition
+        self.requested = []        # indexes of `memo fn` definitions
+
+    def effect(self, current, why, name=None):
+        if current is None or current in self.certain:
+            return
+        self.effects.setdefault(current, []).append((why, name))
+        if name is None or name in self.globals:
+            self.certain.add(current)
+
+    def call(self, current, name):
+        if current is None:
+            return
+        index = self.function_index.get(name)
+        if index is None:
+            self.ahead.setdefault(name, set()).add(current)
+        else:
+            self.callees.setdefault(current, set()).add(index)
+
+    def add(self, stmt):
+        """
+        Walk one top-level statement. Each pending node carries the
+        function it is in (None at top level) and that function's
+        locals.
+        """
+        pending = [(stmt, None, None)]
+
+        while pending:
+            node, current, scope = pending.pop()
+
+            if isinstance(node, FunctionDef):
+                index = len(self.names)
+                self.names.append(node.name)
+                self.function_index[node.name] = index
+                for caller in self.ahead.pop(node.name, ()):
+                    self.callees.setdefault(caller, set()).add(index)
+                if node.memo:
+                    self.requested.append(index)
+
+                current = index
+                scope = {*node.params, *assigned_names(node.body)}
+
+            elif isinstance(node, Var):
+                if current is None:
+                    # The VM gives a name read at top level a global slot
+                    self.globals.add(node.name)
+                elif node.name not in scope:
+                    self.effect(current, f"reads global {node.name}", node.name)
+
+            elif isinstance(node, (LetStmt, AssignStmt)):
+                if current is None:
+                    self.globals.add(node.name)
+
+            elif isinstance(node, ForInLoop):
+                if current is None:
+                    self.globals.add(node.var)
+
+            elif isinstance(node, PrintStmt):
+                self.effect(current, "logs")
+
+            elif isinstance(node, IndexAssign):
+                self.effect(current, "assigns into an array")
+
+            elif isinstance(node, CallExpr):
+                self.call(current, node.name)
+
+            for child in CHILDREN[type(node)](node):
+                pending.append((child, current, scope))
+
+    def impurity(self):
+        """
+        function index -> why it isn't pure, for every impure function.
+        Impurity spreads from callee to caller along the call graph.
+        """
+        impure = {}
+        for index, effects in self.effects.items():
+            for why, name in effects:
+                if name is None or name in self.globals:
+                    impure[index] = why
+                    break
+
+        callers = {}
+        for caller, callees in self.callees.items():
+            for callee in callees:
+                callers.setdefault(callee, []).append(caller)
+
+        pending = list(impure)
+        while pending:
+            callee = pending.pop()
+            for caller in callers.get(callee, ()):
+                if caller not in impure:
+                    impure[caller] = f"calls {self.names[callee]}(), which {impure[callee]}"
+                    pending.append(caller)
+
+        return impure
+
+    def check(self):
+        """
+        Raise if a `memo fn` is not pure.
+        """
+        if not self.requested:
+            return
+
+        impure = self.impurity()
+        for index in self.requested:
+            if index in impure:
+                raise Exception(f"memo fn {self.names[index]}() is not pure: it {impure[index]}")
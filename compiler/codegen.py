@@ -0,0 +1,91 @@
+"""
+Rayvn code generation helpers
+
+What the backends' compilers share: the function table every call is
+resolved through, the work stack that keeps them from recursing, and
+the short-circuit operators.
+"""
+
+from compiler.analysis import check_arity
+from compiler.lexer import TokenType
+
+
+AND_OPS = frozenset({TokenType.AND, TokenType.ANDAND})
+OR_OPS = frozenset({TokenType.OR, TokenType.OROR})
+
+
+class FunctionTable:
+    """
+    FunctionTable
+    -------------
+    Which function each call runs. Functions are declared in source
+    order before any code is compiled, and compiled in that same order,
+    so the n-th FunctionDef reached is function n. A call resolves to
+    the latest definition of its name compiled so far, or else to the
+    first one ahead (analysis.CallCheck binds calls the same way,
+    before the optimizer runs).
+    """
+
+    def __init__(self):
+        self.params = []     # params of each function, by index
+        self.index = {}      # name -> index a call to it resolves to
+        self.defined = 0     # FunctionDefs compiled so far
+
+    def declare(self, name, params):
+        self.index.setdefault(name, len(self.params))
+        self.params.append(params)
+
+    def define(self, name):
+        """
+        The next FunctionDef is reached: calls to name resolve to it
+        from now on. Returns its index.
+        """
+        index = self.defined
+        self.defined += 1
+        self.index[name] = index
+        return index
+
+    def resolve(self, name, argc):
+        """
+        Index of the function a call runs. The arity is checked here,
+        so no VM has to.
+        """
+        index = self.index.get(name)
+        if index is None:
+            raise Exception(f"Undefined function: {name}")
+
+        check_arity(name, len(self.params[index]), argc)
+        return index
+
+    def snapshot(self):
+        """
+        How calls resolve at this point, for restore() to come back to.
+        """
+        return dict(self.index), self.defined
+
+    def restore(self, snapshot):
+        index, self.defined = snapshot
+        self.index = dict(index)
+
+
+class WorkStack:
+    """
+    Mixin for compilers that never recurse. Handlers queue
+    (method, *args) actions on self.work with schedule(); run() calls
+    them until none are left, so nesting depth is bounded by memory,
+    not the Python recursion limit.
+    """
+
+    def run(self, *action):
+        work = self.work
+        work.append(action)
+
+        while work:
+            item = work.pop()
+            item[0](*item[1:])
+
+    def schedule(self, *items):
+        """
+        Queue actions to run next, in the order given.
+        """
+        self.work.extend(reversed(items))
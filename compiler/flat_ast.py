@@ -0,0 +1,248 @@
+"""
+Rayvn flat AST
+
+An array-backed encoding of rayvn_ast trees for very large programs.
+Instead of one Python object per node, the program is held in a few
+parallel arrays:
+
+    kind[i]    node type of node i (index into NODE_TYPES)
+    start[i]   where node i's fields begin in `data`
+    data       the fields of every node, back to back, as ints:
+                 child node   node index, or -1 for None
+                 node list    count, then that many node indices
+                              (count -1 for a None list)
+                 value        index into `values` (names, literals,
+                              operators, parameter lists)
+                 branches     count, then per branch the condition
+                              index and a node list
+    values     the payload pool, each distinct value stored once
+
+Top-level statements are appended one at a time. The nodes of each
+statement get consecutive indices in breadth-first order, so every
+child has a higher index than its parent. Iterating a FlatAST rebuilds
+one top-level statement as objects at a time. Flattening and
+rebuilding both use explicit loops, never recursion.
+
+Parser.statements() + FlatAST.append() + Compiler.compile_flat()
+keeps only a single top-level statement as objects at any moment.
+"""
+
+from array import array
+
+from compiler.rayvn_ast import *
+from compiler.analysis import assigned_names, function_defs
+
+
+# Field encodings
+NODE, NODES, VALUE, NAMES, BRANCHES = range(5)
+
+# Field layout per node type, in __slots__ (= constructor) order
+LAYOUT = {
+    LetStmt: (VALUE, NODE),
+    AssignStmt: (VALUE, NODE),
+    PrintStmt: (NODE,),
+    ExprStmt: (NODE,),
+    ReturnStmt: (NODE,),
+    BreakStmt: (),
+    ContinueStmt: (),
+
+    IfChain: (BRANCHES, NODES),
+    WhileStmt: (NODE, NODES),
+    ForInLoop: (VALUE, NODE, NODES),
+
+    FunctionDef: (VALUE, NAMES, NODES, VALUE),
+    CallExpr: (VALUE, NODES),
+
+    Number: (VALUE,),
+    Boolean: (VALUE,),
+    String: (VALUE,),
+    Var: (VALUE,),
+    Unary: (VALUE, NODE),
+    Not: (NODE,),
+    Binary: (NODE, VALUE, NODE),
+    Logical: (NODE, VALUE, NODE),
+
+    RangeExpr: (NODE, NODE, NODE),
+    ArrayLiteral: (NODES,),
+    IndexExpr: (NODE, NODE),
+    IndexAssign: (NODE, NODE, NODE),
+}
+
+NODE_TYPES = list(LAYOUT)
+KIND = {cls: i for i, cls in enumerate(NODE_TYPES)}
+
+
+class FlatAST:
+    """
+    FlatAST
+    -------
+    A program as parallel arrays; see the module docstring.
+
+    global_names collects every name the top-level statements bind and
+    functions the (name, params) of every FunctionDef in source order,
+    both of which the compiler declares before compiling anything.
+    """
+
+    def __init__(self):
+        self.kind = array("B")
+        self.start = array("i")
+        self.data = array("i")
+        self.values = []
+        self.value_index = {}        # type -> {value: index into values}
+
+        self.roots = array("i")      # first node index of each top-level statement
+        self.global_names = {}       # dict as an ordered set
+        self.functions = []          # (name, params) per FunctionDef
+
+    def __len__(self):
+        return len(self.roots)
+
+    def nbytes(self):
+        """
+        Approximate memory held by the arrays (not the value pool).
+        """
+        return sum(a.itemsize * len(a) for a in (self.kind, self.start, self.data, self.roots))
+
+    # ---------------------------------------------------------
+    # Encoding
+    # ---------------------------------------------------------
+
+    def value(self, value):
+        # One table per type, so True / 1 / 1.0 stay distinct
+        table = self.value_index.get(type(value))
+        if table is None:
+            table = self.value_index[type(value)] = {}
+
+        index = table.get(value)
+        if index is None:
+            index = table[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def append(self, stmt):
+        """
+        Flatten one top-level statement.
+        """
+        for name in assigned_names([stmt]):
+            self.global_names[name] = None
+        for fn in function_defs([stmt]):
+            self.functions.append((fn.name, fn.params))
+
+        kind = self.kind
+        start = self.start
+        data = self.data
+        push = data.append
+
+        first = len(kind)
+        self.roots.append(first)
+
+        pending = [stmt]     # pending[k] becomes node first + k
+
+        def child(node):
+            if node is None:
+                return -1
+            pending.append(node)
+            return first + len(pending) - 1
+
+        def children(nodes):
+            if nodes is None:
+                push(-1)
+                return
+            push(len(nodes))
+            for node in nodes:
+                push(child(node))
+
+        k = 0
+        while k < len(pending):
+            node = pending[k]
+            cls = type(node)
+
+            kind.append(KIND[cls])
+            start.append(len(data))
+
+            for field, encoding in zip(cls.__slots__, LAYOUT[cls]):
+                value = getattr(node, field)
+
+                if encoding == NODE:
+                    push(child(value))
+                elif encoding == NODES:
+                    children(value)
+                elif encoding == VALUE:
+                    push(self.value(value))
+                elif encoding == NAMES:
+                    push(self.value(tuple(value)))
+                else:
+                    push(len(value))
+                    for condition, body in value:
+                        push(child(condition))
+                        children(body)
+
+            k += 1
+
+    # ---------------------------------------------------------
+    # Decoding
+    # ---------------------------------------------------------
+
+    def __iter__(self):
+        """
+        Rebuild the top-level statements one at a time.
+        """
+        for i in range(len(self.roots)):
+            yield self.statement(i)
+
+    def statement(self, i):
+        first = self.roots[i]
+        end = self.roots[i + 1] if i + 1 < len(self.roots) else len(self.kind)
+
+        kind = self.kind
+        start = self.start
+        data = self.data
+        values = self.values
+
+        built = [None] * (end - first)
+
+        # Children have higher indices than their parent, so building
+        # back to front always finds them ready
+        for index in range(end - 1, first - 1, -1):
+            cls = NODE_TYPES[kind[index]]
+            p = start[index]
+            fields = []
+
+            for encoding in LAYOUT[cls]:
+                if encoding == NODE:
+                    c = data[p]
+                    fields.append(built[c - first] if c >= 0 else None)
+                    p += 1
+
+                elif encoding == NODES:
+                    count = data[p]
+                    p += 1
+                    if count < 0:
+                        fields.append(None)
+                    else:
+                        fields.append([built[c - first] for c in data[p:p + count]])
+                        p += count
+
+                elif encoding == VALUE:
+                    fields.append(values[data[p]])
+                    p += 1
+
+                elif encoding == NAMES:
+                    fields.append(list(values[data[p]]))
+                    p += 1
+
+                else:
+                    branches = []
+                    count = data[p]
+                    p += 1
+                    for _ in range(count):
+                        condition = built[data[p] - first]
+                        size = data[p + 1]
+                        body = [built[c - first] for c in data[p + 2:p + 2 + size]]
+                        branches.append((condition, body))
+                        p += 2 + size
+                    fields.append(branches)
+
+            built[index - first] = cls(*fields)
+
+        return built[0]
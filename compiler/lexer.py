@@ -1,3 +1,4 @@
+import re
 from enum import Enum, auto
 
 class TokenType(Enum):
@@ -81,17 +82,257 @@ KEYWORDS = {
 
 
 class Token:
-    def __init__(self, type_, value=None):
+    """
+    A token and where it starts in the source: offset is the 0-based
+    character index, line and column are 1-based.
+    """
+
+    # No per-token __dict__; large sources produce millions of these
+    __slots__ = ("type", "value", "offset", "line", "column")
+
+    def __init__(self, type_, value=None, offset=0, line=0, column=0):
         self.type = type_
         self.value = value
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+    def location(self):
+        return f"line {self.line}, column {self.column}"
 
     def __repr__(self):
         return f"{self.type.name}:{self.value}"
 
 
+SINGLE_CHAR_TOKENS = {
+    "=": TokenType.EQUAL,
+    "+": TokenType.PLUS,
+    "-": TokenType.MINUS,
+    "*": TokenType.STAR,
+    "/": TokenType.SLASH,
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "{": TokenType.LBRACE,
+    "}": TokenType.RBRACE,
+    "[": TokenType.LBRACKET,
+    "]": TokenType.RBRACKET,
+    ",": TokenType.COMMA,
+    ">": TokenType.GT,
+    "<": TokenType.LT,
+    "!": TokenType.NOT,
+}
+
+TWO_CHAR_TOKENS = {
+    "==": TokenType.EQEQ,
+    "!=": TokenType.NOTEQ,
+    ">=": TokenType.GTE,
+    "<=": TokenType.LTE,
+    "&&": TokenType.ANDAND,
+    "||": TokenType.OROR,
+}
+
+# Both match exactly what str.isspace() / str.isalnum() accept
+WHITESPACE = re.compile(r"\s+")
+ALNUM = re.compile(r"[^\W_]*")
+
+
+# Characters read per chunk when streaming a file
+CHUNK_SIZE = 1 << 16
+
+
+def cut_at_nul(src):
+    """
+    A NUL character has always ended the source (peek() returns "\0"
+    at the end), so cut there once instead of checking per char.
+    Returns (src, cut?).
+    """
+    nul = src.find("\0")
+    if nul == -1:
+        return src, False
+    return src[:nul], True
+
+
+def scan_tokens(src, pos, final, out, base=0, line=1, line_start=0):
+    """
+    Scan src from pos, appending Tokens to out. Returns
+    (stop position, line, line_start) so a later call can resume.
+
+    Lexemes are sliced out of the source rather than grown a character
+    at a time. With final=False, src is only a prefix of the input:
+    scanning stops before any token that might continue past its end
+    (an identifier or number touching the end, an unclosed string or
+    comment, or an operator without enough lookahead) so the caller can
+    append more input and resume from the returned position.
+
+    src[0] sits at offset `base` of the whole input; line is the current
+    line number and line_start the offset its first character is at.
+    """
+    n = len(src)
+
+    append = out.append
+
+    keywords = KEYWORDS
+    two_char = TWO_CHAR_TOKENS
+    single = SINGLE_CHAR_TOKENS
+    skip_space = WHITESPACE.match
+    match_alnum = ALNUM.match
+
+    IDENT = TokenType.IDENT
+    NUMBER = TokenType.NUMBER
+    STRING = TokenType.STRING
+
+    # column of src[pos] is pos - first
+    first = line_start - base - 1
+
+    while pos < n:
+        c = src[pos]
+
+        if c.isspace():
+            end = skip_space(src, pos).end()
+            newline = src.rfind("\n", pos, end)
+            if newline != -1:
+                line += src.count("\n", pos, end)
+                first = newline
+            pos = end
+            continue
+
+        if c.isalpha():
+            end = match_alnum(src, pos + 1).end()
+            if end == n and not final:
+                break
+            ident = src[pos:end]
+            append(Token(keywords.get(ident, IDENT), ident, base + pos, line, pos - first))
+            pos = end
+            continue
+
+        if c.isdigit():
+            end = pos + 1
+            while end < n and src[end].isdigit():
+                end += 1
+            if end == n and not final:
+                break
+            append(Token(NUMBER, int(src[pos:end]), base + pos, line, pos - first))
+            pos = end
+            continue
+
+        # Operators and comments look at most three characters ahead
+        if not final and pos + 3 > n:
+            break
+
+        # --- COMMENTS ---
+
+        if c == "*" and src.startswith("**", pos):
+            # Multi-line comment ***
+            if src.startswith("***", pos):
+                end = src.find("***", pos + 3)
+                if end == -1:
+                    if not final:
+                        break
+                    raise Exception(f"Unterminated block comment at line {line}, column {pos - first}")
+                end += 3
+                newline = src.rfind("\n", pos, end)
+                if newline != -1:
+                    line += src.count("\n", pos, end)
+                    first = newline
+                pos = end
+                continue
+
+            # Single-line comment **
+            end = src.find("\n", pos + 2)
+            if end == -1:
+                if not final:
+                    break
+                end = n
+            pos = end
+            continue
+
+        # Two-character operators
+        pair = two_char.get(src[pos:pos + 2])
+        if pair is not None:
+            append(Token(pair, None, base + pos, line, pos - first))
+            pos += 2
+            continue
+
+        if c == '"':
+            end = src.find('"', pos + 1)
+            if end == -1:
+                if not final:
+                    break
+                raise Exception(f"Unterminated string literal at line {line}, column {pos - first}")
+            append(Token(STRING, src[pos + 1:end], base + pos, line, pos - first))
+            newline = src.rfind("\n", pos, end)
+            if newline != -1:
+                line += src.count("\n", pos, end)
+                first = newline
+            pos = end + 1
+            continue
+
+        kind = single.get(c)
+        if kind is not None:
+            append(Token(kind, None, base + pos, line, pos - first))
+            pos += 1
+            continue
+
+        raise Exception(f"Unexpected character: {c} at line {line}, column {pos - first}")
+
+    return pos, line, base + first + 1
+
+
+def eof_token(offset, line, line_start):
+    return Token(TokenType.EOF, None, offset, line, offset - line_start + 1)
+
+
+def tokenize_stream(chunks):
+    """
+    Generate Tokens from an iterable of source text chunks.
+
+    Only the unscanned tail of the current chunk (plus at most one
+    chunk's worth of tokens) is held at a time, so memory stays flat
+    however long the input is.
+    """
+    buf = ""
+    pos = 0
+    base = 0
+    line = 1
+    line_start = 0
+
+    for chunk in chunks:
+        chunk, ended = cut_at_nul(chunk)
+
+        base += pos
+        buf = buf[pos:] + chunk
+        out = []
+        pos, line, line_start = scan_tokens(buf, 0, ended, out, base, line, line_start)
+        yield from out
+
+        if ended:
+            break
+
+    out = []
+    pos, line, line_start = scan_tokens(buf, pos, True, out, base, line, line_start)
+    yield from out
+    yield eof_token(base + pos, line, line_start)
+
+
+def read_chunks(path, size=CHUNK_SIZE):
+    with open(path, "r") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def tokenize_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Lazily tokenize a file, reading it chunk by chunk.
+    """
+    return tokenize_stream(read_chunks(path, chunk_size))
+
+
 class Lexer:
     def __init__(self, src):
-        self.src = src
+        self.src, _ = cut_at_nul(src)
         self.pos = 0
 
     def peek(self):
@@ -116,139 +357,6 @@ class Lexer:
 
     def tokenize(self):
         tokens = []
-
-        while self.peek() != "\0":
-            c = self.peek()
-
-            if c.isspace():
-                self.advance()
-                continue
-
-            if c.isalpha():
-                ident = ""
-                while self.peek().isalnum():
-                    ident += self.advance()
-                tokens.append(Token(KEYWORDS.get(ident, TokenType.IDENT), ident))
-                continue
-
-            if c.isdigit():
-                num = ""
-                while self.peek().isdigit():
-                    num += self.advance()
-                tokens.append(Token(TokenType.NUMBER, int(num)))
-                continue
-
-            # --- COMMENTS ---
-
-            # Multi-line comment ***
-            if c == "*" and self.peek_next() == "*" and self.peek_next_next() == "*":
-                # consume ***
-                self.advance()
-                self.advance()
-                self.advance()
-
-                while not (
-                    self.peek() == "*" and
-                    self.peek_next() == "*" and
-                    self.peek_next_next() == "*"
-                ):
-                    if self.peek() == "\0":
-                        raise Exception("Unterminated block comment")
-                    self.advance()
-
-                # consume closing ***
-                self.advance()
-                self.advance()
-                self.advance()
-                continue
-
-            # Single-line comment **
-            if c == "*" and self.peek_next() == "*":
-                # consume **
-                self.advance()
-                self.advance()
-
-                while self.peek() not in ("\n", "\0"):
-                    self.advance()
-                continue
-
-            # Two-character operators
-            if c == "=" and self.peek_next() == "=":
-                self.advance()
-                self.advance()
-                tokens.append(Token(TokenType.EQEQ))
-                continue
-
-            if c == "!" and self.peek_next() == "=":
-                self.advance()
-                self.advance()
-                tokens.append(Token(TokenType.NOTEQ))
-                continue
-
-            if c == ">" and self.peek_next() == "=":
-                self.advance()
-                self.advance()
-                tokens.append(Token(TokenType.GTE))
-                continue
-
-            if c == "<" and self.peek_next() == "=":
-                self.advance()
-                self.advance()
-                tokens.append(Token(TokenType.LTE))
-                continue
-
-            if c == "&" and self.peek_next() == "&":
-                self.advance()
-                self.advance()
-                tokens.append(Token(TokenType.ANDAND))
-                continue
-
-            if c == "|" and self.peek_next() == "|":
-                self.advance()
-                self.advance()
-                tokens.append(Token(TokenType.OROR))
-                continue
-
-            if c == '"':
-                self.advance()  # consume opening "
-                string_val = ""
-                while self.peek() != '"':
-                    if self.peek() == "\0":
-                        raise Exception("Unterminated string literal")
-                    string_val += self.advance()
-                self.advance()  # consume closing "
-                tokens.append(Token(TokenType.STRING, string_val))
-                continue
-
-            single = {
-                "=": TokenType.EQUAL,
-                "+": TokenType.PLUS,
-                "-": TokenType.MINUS,
-                "*": TokenType.STAR,
-                "/": TokenType.SLASH,
-                "(": TokenType.LPAREN,
-                ")": TokenType.RPAREN,
-                "{": TokenType.LBRACE,
-                "}": TokenType.RBRACE,
-                "[": TokenType.LBRACKET,
-                "]": TokenType.RBRACKET,
-                ",": TokenType.COMMA,
-                ">": TokenType.GT,
-                "<": TokenType.LT,
-                "!": TokenType.NOT,
-            }
-
-            if c in single:
-                tokens.append(Token(single[c]))
-                self.advance()
-                continue
-
-            if c == "=":
-                tokens.append(Token(TokenType.EQUAL))
-                self.advance()
-                continue
-
-            raise Exception(f"Unexpected character: {c}")
-
-        tokens.append(Token(TokenType.EOF))
-        return tokens
\ No newline at end of file
+        self.pos, line, line_start = scan_tokens(self.src, self.pos, True, tokens)
+        tokens.append(eof_token(self.pos, line, line_start))
+        return tokens
@@ -1,33 +1,227 @@
-from compiler.lexer import Lexer
+from compiler.lexer import Lexer, tokenize_file
 from compiler.parser import Parser
 # from interpreter import Interpreter
+import os
 import sys
 from compiler.ByteCode.compiler import Compiler
+from compiler.ByteCode.code_object import assemble
+from compiler.ByteCode.disassembler import disassemble
 from compiler.ByteCode.vm import VM
+from compiler.ByteCode import cache
+from compiler.ByteCode.peephole import Peephole
+from compiler.ByteCode.profiler import Profiler
+from compiler.ByteCode.tiering import Tiering
+from compiler.ByteCode.memo import MEMO_SIZE
+from compiler.optimizer import Optimizer, DEFAULT_OPT_LEVEL
+from compiler.analysis import CallCheck, Purity
+from compiler.flat_ast import FlatAST
+from compiler.Register.compiler import RegisterCompiler
+from compiler.Register.disassembler import disassemble as disassemble_registers
+from compiler.Register.vm import RegisterVM
+from compiler.Closure.compiler import ClosureCompiler
+from compiler.Transpiler.transpiler import Transpiler
+from compiler.Transpiler import cache as module_cache
 
-def run(source: str):
+BACKENDS = ("stack", "register", "closure", "python")
+
+def compile_source(source: str, opt_level: int = DEFAULT_OPT_LEVEL, report: bool = False):
     tokens = Lexer(source).tokenize()
     # ast = Parser(tokens).parse()
     # Interpreter().eval(ast)
 
-    ast = Parser(tokens).parse()
+    return compile_tokens(tokens, opt_level, report)
+
+def parse_for(tokens, opt_level: int = DEFAULT_OPT_LEVEL, flat: bool = False):
+    # tokens may be a lazy stream; the parser pulls from it as it goes.
+    # Returns the optimized Program (or FlatAST) and the optimizer.
+    # Calls and `memo fn` purity are checked for every backend, before
+    # the optimizer can drop any code.
+    parser = Parser(tokens)
+    optimizer = Optimizer(opt_level)
+    calls = CallCheck()
+    purity = Purity()
+
+    if not flat:
+        program = parser.parse()
+        for stmt in program.statements:
+            calls.add(stmt)
+            purity.add(stmt)
+        calls.finish()
+        purity.check()
+        return optimizer.optimize(program), optimizer
+
+    # Only one top-level statement exists as objects at a time
+    ast = FlatAST()
+    for stmt in parser.statements():
+        calls.add(stmt)
+        purity.add(stmt)
+        for optimized in optimizer.optimize_statement(stmt):
+            ast.append(optimized)
+    calls.finish()
+    purity.check()
+    return ast, optimizer
 
+def compile_tokens(tokens, opt_level: int = DEFAULT_OPT_LEVEL, report: bool = False,
+                   flat: bool = False):
+    ast, optimizer = parse_for(tokens, opt_level, flat)
     compiler = Compiler()
-    compiler.compile(ast)
 
-    vm = VM(compiler.code, compiler.functions)
+    if flat:
+        compiler.compile_flat(ast)
+    else:
+        compiler.compile(ast)
+
+    code = compiler.code
+    if opt_level >= 1:
+        peephole = Peephole()
+        code = peephole.optimize(code, compiler.functions, compiler.loops)
+
+        if report:
+            stats = ", ".join(f"{k}={v}" for k, v in optimizer.stats.items())
+            print(f"[rayvn -O{opt_level}] ast: {stats}", file=sys.stderr)
+            print(f"[rayvn -O{opt_level}] {peephole.report()}", file=sys.stderr)
+
+    return assemble(code, compiler.functions, compiler.globals, compiler.loops)
+
+def compile_for(compiler, tokens, opt_level: int = DEFAULT_OPT_LEVEL, report: bool = False,
+                flat: bool = False):
+    # Same front end and AST optimizer as compile_tokens, for the
+    # backends that compile the AST themselves (no peephole pass)
+    ast, optimizer = parse_for(tokens, opt_level, flat)
+    code = compiler.compile_flat(ast) if flat else compiler.compile(ast)
+
+    if report and opt_level >= 1:
+        stats = ", ".join(f"{k}={v}" for k, v in optimizer.stats.items())
+        print(f"[rayvn -O{opt_level}] ast: {stats}", file=sys.stderr)
+
+    return code
+
+def run_registers(path: str, opt_level: int = DEFAULT_OPT_LEVEL, report: bool = False,
+                  flat: bool = False, dis: bool = False):
+    # Register code has no .rvc format; it is always compiled fresh
+    code = compile_for(RegisterCompiler(), tokenize_file(path), opt_level, report, flat)
+
+    if dis:
+        print(disassemble_registers(code))
+        return
+
+    RegisterVM(code).run()
+
+def run_closures(path: str, opt_level: int = DEFAULT_OPT_LEVEL, report: bool = False,
+                 flat: bool = False):
+    compile_for(ClosureCompiler(), tokenize_file(path), opt_level, report, flat).run()
+
+def run_python(path: str, use_cache: bool = True, opt_level: int = DEFAULT_OPT_LEVEL,
+               report: bool = False, flat: bool = False, dis: bool = False):
+    digest = cache.file_hash(path) if use_cache else None
+
+    # --dis prints the generated source, which the cache doesn't keep,
+    # so like a report it needs a real transpile
+    program = None
+    if use_cache and not (report or dis):
+        program = module_cache.load(path, digest, opt_level)
+
+    if program is None:
+        program = compile_for(Transpiler(), tokenize_file(path), opt_level, report, flat)
+        if use_cache:
+            module_cache.store(path, digest, opt_level, program)
+
+    if dis:
+        print(program.source, end="")
+        return
+
+    program.run()
+
+def tier_loader(path: str, digest: str, opt_level: int = DEFAULT_OPT_LEVEL, flat: bool = False):
+    # Tier 1 compiles from the AST, so the source is parsed again on
+    # the first tier-up; only if it is still what the bytecode came
+    # from. At least -O1: folding is part of tier 1, and it leaves the
+    # functions and loops the bytecode has as they are.
+    def load():
+        if cache.file_hash(path) != digest:
+            return None
+        ast, _ = parse_for(tokenize_file(path), max(opt_level, 1), flat)
+        return ast
+    return load
+
+def run(source: str, opt_level: int = DEFAULT_OPT_LEVEL):
+    vm = VM(compile_source(source, opt_level))
     vm.run()
 
-def run_file(path: str):
-    with open(path, "r") as f:
-        source = f.read()
-    run(source)
+def run_file(path: str, use_cache: bool = True, opt_level: int = DEFAULT_OPT_LEVEL,
+             report: bool = False, profile: bool = False, profile_stacks: str = None,
+             flat: bool = False, dis: bool = False,
+             quicken: bool = True, quicken_stats: bool = False,
+             tier: bool = True, tier_stats: bool = False,
+             memo_size: int = MEMO_SIZE, memo_stats: bool = False,
+             backend: str = "stack"):
+    if backend == "register":
+        run_registers(path, opt_level, report, flat, dis)
+        return
+    if backend == "closure":
+        run_closures(path, opt_level, report, flat)
+        return
+    if backend == "python":
+        run_python(path, use_cache, opt_level, report, flat, dis)
+        return
+
+    # The source is never held whole: it is hashed, then tokenized,
+    # a chunk at a time
+    # Tiering needs the hash too, to know the source is unchanged
+    # when it parses it again
+    tier = tier and not profile
+    digest = cache.file_hash(path) if use_cache or tier else None
+
+    # A report needs a real compile, so it bypasses cache reads
+    program = cache.load(path, digest, opt_level, flat) if use_cache and not report else None
+
+    if program is None:
+        program = compile_tokens(tokenize_file(path), opt_level, report, flat)
+        if use_cache:
+            cache.store(path, digest, opt_level, program, flat)
+
+    if dis:
+        print(disassemble(program))
+        return
+
+    # The profiler times bytecode, so it runs without tiering
+    tiering = Tiering(tier_loader(path, digest, opt_level, flat)) if tier else None
+    vm = VM(program, quicken=quicken, count_hits=quicken_stats, tiering=tiering, memo_size=memo_size)
+
+    if not profile:
+        try:
+            vm.run()
+        finally:
+            if quicken_stats:
+                print(vm.specialization_report(), file=sys.stderr)
+            if tier_stats and tiering is not None:
+                print(tiering.report(), file=sys.stderr)
+            if memo_stats:
+                print(vm.memo_report(), file=sys.stderr)
+        return
+
+    profiler = Profiler(vm.code)
+    try:
+        vm.run_profiled(profiler)
+    finally:
+        # Still report when the program dies with a runtime error
+        print(profiler.report(), file=sys.stderr)
+        if quicken_stats:
+            print(vm.specialization_report(), file=sys.stderr)
+        if memo_stats:
+            print(vm.memo_report(), file=sys.stderr)
+
+        if profile_stacks is None:
+            profile_stacks = os.path.splitext(os.path.basename(path))[0] + ".folded"
+        profiler.write_collapsed(profile_stacks)
+        print(f"\ncollapsed stacks written to {profile_stacks}", file=sys.stderr)
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        run_file(sys.argv[1])
+    args = [arg for arg in sys.argv[1:] if arg != "--profile"]
+    if args:
+        run_file(args[0], profile="--profile" in sys.argv)
     else:
         run("""
         let x = 10
         log x
-        """)
\ No newline at end of file
+        """)
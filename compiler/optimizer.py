@@ -0,0 +1,521 @@
+"""
+Rayvn AST optimizer
+
+Runs between Parser.parse and Compiler.compile and rewrites the
+rayvn_ast tree in place.
+
+Optimization levels:
+    0  no changes
+    1  constant folding (arithmetic, comparisons, -x, not x, string +,
+       and / or with a constant left side)
+    2  level 1 + dead code elimination:
+         - constant if / elseif branches are resolved at compile time
+         - `while <falsy constant>` loops are dropped
+         - statements after return / break / continue are dropped
+         - functions that are never called are dropped
+
+Every rewrite preserves program behaviour. Expressions that would
+raise at runtime (1 / 0, "a" - 1) are left for the VM to report.
+"""
+
+import operator
+
+from compiler.rayvn_ast import *
+from compiler.lexer import TokenType
+from compiler.analysis import assigned_names
+from compiler.codegen import AND_OPS, OR_OPS
+
+
+DEFAULT_OPT_LEVEL = 2
+MAX_OPT_LEVEL = 2
+
+# Folded results larger than this stay as runtime work so a constant
+# like "ab" * 1000000 doesn't bloat the bytecode (or the .rvc cache).
+MAX_FOLDED_STR = 1024
+MAX_FOLDED_INT_BITS = 1024
+
+
+FOLDABLE = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.SLASH: operator.truediv,
+
+    TokenType.GT: operator.gt,
+    TokenType.GTE: operator.ge,
+    TokenType.LT: operator.lt,
+    TokenType.LTE: operator.le,
+    TokenType.EQEQ: operator.eq,
+    TokenType.NOTEQ: operator.ne,
+}
+
+TERMINATORS = (ReturnStmt, BreakStmt, ContinueStmt)
+
+# An expression node's operands, in evaluation order (see Optimizer.expr)
+OPERANDS = {
+    Binary: lambda node: (node.left, node.right),
+    Logical: lambda node: (node.left, node.right),
+    Unary: lambda node: (node.expr,),
+    Not: lambda node: (node.expr,),
+    CallExpr: lambda node: node.args,
+    ArrayLiteral: lambda node: node.elements,
+    IndexExpr: lambda node: (node.array, node.index),
+    RangeExpr: lambda node: (node.start, node.end, node.step) if node.step else (node.start, node.end),
+}
+
+
+def is_constant(node):
+    return isinstance(node, (Number, Boolean, String))
+
+
+def make_constant(value):
+    """
+    Wrap a folded Python value back into a literal node, or return
+    None when it has no literal form (or is too large to inline).
+    """
+    if isinstance(value, bool):
+        return Boolean(value)
+
+    if isinstance(value, int):
+        if value.bit_length() > MAX_FOLDED_INT_BITS:
+            return None
+        return Number(value)
+
+    if isinstance(value, float):
+        return Number(value)
+
+    if isinstance(value, str):
+        if len(value) > MAX_FOLDED_STR:
+            return None
+        return String(value)
+
+    return None
+
+
+def take(stack, count):
+    """
+    Pop the top count items off stack, as a list in stack order.
+    """
+    items = stack[len(stack) - count:]
+    del stack[len(stack) - count:]
+    return items
+
+
+class Optimizer:
+    """
+    Optimizer
+    ---------
+    Constant folding and dead code elimination over the AST.
+
+    stats counts what was rewritten so the effect of each level can be
+    measured alongside bytecode size and runtime.
+    """
+
+    def __init__(self, level=DEFAULT_OPT_LEVEL):
+        self.level = level
+        self.stats = {
+            "folded": 0,
+            "branches_removed": 0,
+            "statements_removed": 0,
+            "functions_removed": 0,
+        }
+
+        # Expression nodes with operands to optimize first (see expr)
+        self.rebuilders = {
+            Binary: self.rebuild_binary,
+            Logical: self.rebuild_binary,
+            Unary: self.rebuild_unary,
+            Not: self.rebuild_not,
+            CallExpr: self.rebuild_call,
+            ArrayLiteral: self.rebuild_array,
+            IndexExpr: self.rebuild_index,
+            RangeExpr: self.rebuild_range,
+        }
+
+    def optimize(self, program):
+        if self.level <= 0:
+            return program
+
+        program.statements = self.block(program.statements)
+
+        if self.level >= 2:
+            self.remove_uncalled_functions(program)
+
+        return program
+
+    def optimize_statement(self, stmt):
+        """
+        Optimize one top-level statement on its own, for front ends
+        that never hold the whole program (flat_ast). Returns a list.
+
+        Uncalled functions are not removed: that needs every call site.
+        """
+        if self.level <= 0:
+            return [stmt]
+        return self.block([stmt])
+
+    # ---------------------------------------------------------
+    # Statements
+    # ---------------------------------------------------------
+
+    def block(self, stmts):
+        """
+        Optimize a statement list, returning the new list.
+
+        Statements may expand into several (a resolved if splices its
+        body in place) or disappear entirely.
+        """
+        out = []
+
+        for i, stmt in enumerate(stmts):
+            out.extend(self.statement(stmt))
+
+            if self.level >= 2 and out and isinstance(out[-1], TERMINATORS):
+                out.extend(self.dead(stmts[i + 1:]))
+                break
+
+        return out
+
+    def dead(self, stmts):
+        """
+        Drop unreachable statements.
+
+        Function definitions are still registered by the compiler when
+        they sit in unreachable code, so they are kept (and optimized)
+        rather than dropped with their surroundings.
+        """
+        kept = []
+        self.collect_nested_functions(stmts, kept)
+
+        self.stats["statements_removed"] += len(stmts) - len(kept)
+
+        out = []
+        for fn in kept:
+            out.extend(self.statement(fn))
+        return out
+
+    def collect_nested_functions(self, stmts, found):
+        for stmt in stmts:
+            if isinstance(stmt, FunctionDef):
+                found.append(stmt)
+            else:
+                for body in self.child_blocks(stmt):
+                    self.collect_nested_functions(body, found)
+
+    def statement(self, node):
+        if isinstance(node, (LetStmt, AssignStmt)):
+            node.value = self.expr(node.value)
+
+        elif isinstance(node, (PrintStmt, ExprStmt)):
+            node.expr = self.expr(node.expr)
+
+        elif isinstance(node, ReturnStmt):
+            if node.value:
+                node.value = self.expr(node.value)
+
+        elif isinstance(node, IndexAssign):
+            node.array = self.expr(node.array)
+            node.index = self.expr(node.index)
+            node.value = self.expr(node.value)
+
+        elif isinstance(node, IfChain):
+            return self.if_chain(node)
+
+        elif isinstance(node, WhileStmt):
+            node.condition = self.expr(node.condition)
+
+            if self.level >= 2 and is_constant(node.condition) and not node.condition.value:
+                return self.dead([node])
+
+            node.body = self.block(node.body)
+
+        elif isinstance(node, ForInLoop):
+            node.iterable = self.expr(node.iterable)
+            node.body = self.block(node.body)
+
+        elif isinstance(node, FunctionDef):
+            self.function_def(node)
+
+        return [node]
+
+    def if_chain(self, node):
+        branches = []
+        else_body = node.else_body
+        removed = []
+
+        for i, (condition, body) in enumerate(node.branches):
+            condition = self.expr(condition)
+
+            if self.level >= 2 and is_constant(condition):
+                if not condition.value:
+                    # Never taken
+                    removed.append(body)
+                    continue
+
+                # Always taken: it becomes the else, the rest is dead
+                removed.extend(body for _, body in node.branches[i + 1:])
+                if node.else_body:
+                    removed.append(node.else_body)
+                else_body = body
+                break
+
+            branches.append((condition, self.block(body)))
+
+        salvaged = []
+        for body in removed:
+            self.stats["branches_removed"] += 1
+            salvaged.extend(self.dead(body))
+
+        if else_body:
+            else_body = self.block(else_body)
+
+        if not branches:
+            # Fully resolved: splice the surviving body in place
+            # (blocks don't open a scope, so this is safe)
+            return salvaged + (else_body or [])
+
+        node.branches = branches
+        node.else_body = else_body
+        return salvaged + [node]
+
+    def function_def(self, node):
+        before = list(assigned_names(node.body))
+        node.body = self.block(node.body)
+
+        # A name bound only in eliminated code must stay a local of this
+        # function rather than start resolving to a global of the same
+        # name. Locals start at 0, so an explicit `let x = 0` at entry
+        # keeps the slot without changing behaviour.
+        kept = set(assigned_names(node.body)) | set(node.params)
+        lost = []
+        for name in before:
+            if name not in kept and name not in lost:
+                lost.append(name)
+
+        if lost:
+            node.body = [LetStmt(name, Number(0)) for name in lost] + node.body
+
+    # ---------------------------------------------------------
+    # Expressions
+    # ---------------------------------------------------------
+
+    def expr(self, node):
+        """
+        Optimize an expression bottom-up, returning its replacement.
+
+        Nothing recurses, so long operator chains and deep nesting
+        don't run into Python's recursion limit. A node with operands
+        (see self.rebuilders) is popped twice: first it queues its
+        operands, then its rebuilder takes their optimized versions
+        off the done stack and folds the node if they allow.
+        """
+        rebuilders = self.rebuilders
+        work = [node]
+        done = []
+
+        while work:
+            item = work.pop()
+
+            if type(item) is tuple:
+                rebuild, node = item
+                done.append(rebuild(node, done))
+                continue
+
+            rebuild = rebuilders.get(type(item))
+            if rebuild is None:
+                # A leaf: nothing to fold
+                done.append(item)
+                continue
+
+            work.append((rebuild, item))
+            work.extend(reversed(OPERANDS[type(item)](item)))
+
+        return done[0]
+
+    def rebuild_binary(self, node, done):
+        node.right = done.pop()
+        node.left = done.pop()
+
+        if is_constant(node.left) and node.op in AND_OPS | OR_OPS:
+            # `true and x` is x, `false and x` is false (and vice versa)
+            decided = bool(node.left.value) == (node.op in OR_OPS)
+            self.stats["folded"] += 1
+            return node.left if decided else node.right
+
+        fn = FOLDABLE.get(node.op)
+        if fn and is_constant(node.left) and is_constant(node.right):
+            return self.fold(node, fn, node.left.value, node.right.value)
+        return node
+
+    def rebuild_unary(self, node, done):
+        node.expr = done.pop()
+
+        if is_constant(node.expr):
+            if node.op == TokenType.MINUS:
+                return self.fold(node, operator.neg, node.expr.value)
+            # The compiler emits nothing for other unary ops
+            return node.expr
+        return node
+
+    def rebuild_not(self, node, done):
+        node.expr = done.pop()
+
+        if is_constant(node.expr):
+            return self.fold(node, operator.not_, node.expr.value)
+        return node
+
+    def rebuild_call(self, node, done):
+        node.args = take(done, len(node.args))
+        return node
+
+    def rebuild_array(self, node, done):
+        node.elements = take(done, len(node.elements))
+        return node
+
+    def rebuild_index(self, node, done):
+        node.index = done.pop()
+        node.array = done.pop()
+        return node
+
+    def rebuild_range(self, node, done):
+        if node.step:
+            node.step = done.pop()
+        node.end = done.pop()
+        node.start = done.pop()
+        return node
+
+    def fold(self, node, fn, *values):
+        """
+        Evaluate fn(*values) at compile time, keeping the original node
+        if it raises or the result has no literal form.
+        """
+        try:
+            result = make_constant(fn(*values))
+        except Exception:
+            return node
+
+        if result is None:
+            return node
+
+        self.stats["folded"] += 1
+        return result
+
+    # ---------------------------------------------------------
+    # Unused functions
+    # ---------------------------------------------------------
+
+    def remove_uncalled_functions(self, program):
+        defs = {}
+        self.collect_functions(program.statements, defs)
+        if not defs:
+            return
+
+        # Reachability over the call graph, rooted at top-level code
+        reachable = set()
+        pending = list(self.called_names(program.statements))
+
+        while pending:
+            name = pending.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+
+            for fn in defs.get(name, ()):
+                pending.extend(self.called_names(fn.body))
+
+        program.statements = self.drop_functions(program.statements, reachable)
+
+    def collect_functions(self, stmts, defs):
+        for stmt in stmts:
+            if isinstance(stmt, FunctionDef):
+                defs.setdefault(stmt.name, []).append(stmt)
+            for body in self.child_blocks(stmt):
+                self.collect_functions(body, defs)
+
+    def drop_functions(self, stmts, reachable):
+        out = []
+
+        for stmt in stmts:
+            if isinstance(stmt, FunctionDef) and stmt.name not in reachable:
+                self.stats["functions_removed"] += 1
+                continue
+
+            if isinstance(stmt, IfChain):
+                stmt.branches = [
+                    (cond, self.drop_functions(body, reachable))
+                    for cond, body in stmt.branches
+                ]
+                if stmt.else_body:
+                    stmt.else_body = self.drop_functions(stmt.else_body, reachable)
+
+            elif isinstance(stmt, (WhileStmt, ForInLoop, FunctionDef)):
+                stmt.body = self.drop_functions(stmt.body, reachable)
+
+            out.append(stmt)
+
+        return out
+
+    def child_blocks(self, stmt):
+        if isinstance(stmt, IfChain):
+            for _, body in stmt.branches:
+                yield body
+            if stmt.else_body:
+                yield stmt.else_body
+
+        elif isinstance(stmt, (WhileStmt, ForInLoop, FunctionDef)):
+            yield stmt.body
+
+    def called_names(self, stmts):
+        """
+        Yield the name of every call in a statement list, without
+        descending into nested function definitions.
+        """
+        stack = list(stmts)
+
+        while stack:
+            node = stack.pop()
+
+            if node is None or isinstance(node, FunctionDef):
+                continue
+
+            if isinstance(node, CallExpr):
+                yield node.name
+                stack.extend(node.args)
+
+            elif isinstance(node, (LetStmt, AssignStmt, ReturnStmt)):
+                stack.append(node.value)
+
+            elif isinstance(node, (PrintStmt, ExprStmt, Unary, Not)):
+                stack.append(node.expr)
+
+            elif isinstance(node, (Binary, Logical)):
+                stack.append(node.left)
+                stack.append(node.right)
+
+            elif isinstance(node, IfChain):
+                for condition, body in node.branches:
+                    stack.append(condition)
+                    stack.extend(body)
+                if node.else_body:
+                    stack.extend(node.else_body)
+
+            elif isinstance(node, WhileStmt):
+                stack.append(node.condition)
+                stack.extend(node.body)
+
+            elif isinstance(node, ForInLoop):
+                stack.append(node.iterable)
+                stack.extend(node.body)
+
+            elif isinstance(node, RangeExpr):
+                stack.extend((node.start, node.end, node.step))
+
+            elif isinstance(node, ArrayLiteral):
+                stack.extend(node.elements)
+
+            elif isinstance(node, IndexExpr):
+                stack.append(node.array)
+                stack.append(node.index)
+
+            elif isinstance(node, IndexAssign):
+                stack.extend((node.array, node.index, node.value))
@@ -1,10 +1,46 @@
 from compiler.rayvn_ast import *
 from compiler.lexer import TokenType
 
+# Binding power of each binary operator; higher binds tighter.
+# All of them are left-associative.
+BINARY_POWER = {
+    TokenType.OR: 1,
+    TokenType.OROR: 1,
+
+    TokenType.AND: 2,
+    TokenType.ANDAND: 2,
+
+    TokenType.GT: 3,
+    TokenType.LT: 3,
+    TokenType.GTE: 3,
+    TokenType.LTE: 3,
+    TokenType.EQEQ: 3,
+    TokenType.NOTEQ: 3,
+
+    TokenType.PLUS: 4,
+    TokenType.MINUS: 4,
+
+    TokenType.STAR: 5,
+    TokenType.SLASH: 5,
+}
+
+# Prefix operators bind tighter than every binary operator, and
+# postfix indexing/calls tighter still
+PREFIX_OPS = {
+    TokenType.NOT: lambda operand: Not(operand),
+    TokenType.MINUS: lambda operand: Unary(TokenType.MINUS, operand),
+}
+
+# Markers for what is pending on the expression stack
+PREFIX, GROUP, BINARY = range(3)
+
 class Parser:
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.pos = 0
+        # Tokens may be a list or a lazy stream (lexer.tokenize_stream);
+        # only the two the grammar looks at are held at a time
+        self.tokens = iter(tokens)
+        self.current = next(self.tokens)
+        self.following = next(self.tokens, self.current)
 
     def finish_call(self, callee):
         self.expect(TokenType.LPAREN)
@@ -20,23 +56,27 @@ class Parser:
         return CallExpr(callee.name, args)
 
     def peek_next(self):
-        if self.pos + 1 >= len(self.tokens):
-            return self.tokens[-1]
-        return self.tokens[self.pos + 1]
+        return self.following
 
     def peek(self):
-        return self.tokens[self.pos]
+        return self.current
 
     def advance(self):
-        tok = self.peek()
-        self.pos += 1
+        tok = self.current
+        self.current = self.following
+        # Once the stream runs out, EOF keeps repeating
+        self.following = next(self.tokens, self.following)
         return tok
 
     def parse(self):
-        stmts = []
+        return Program(list(self.statements()))
+
+    def statements(self):
+        """
+        Yield top-level statements as they are parsed.
+        """
         while self.peek().type != TokenType.EOF:
-            stmts.append(self.statement())
-        return Program(stmts)
+            yield self.statement()
     
     def if_chain(self):
         branches = []
@@ -73,10 +113,11 @@ class Parser:
 
         var_tok = self.advance()
         if var_tok.type != TokenType.IDENT:
-            raise Exception("Expected identifier after 'for'")
+            raise self.error("Expected identifier after 'for'", var_tok)
 
-        if self.advance().type != TokenType.IN:
-            raise Exception("Expected 'in' after loop variable")
+        in_tok = self.advance()
+        if in_tok.type != TokenType.IN:
+            raise self.error("Expected 'in' after loop variable", in_tok)
 
         iterable = self.expression()
         body = self.block()
@@ -86,7 +127,10 @@ class Parser:
     def expect(self, type_):
         tok = self.advance()
         if tok.type != type_:
-            raise Exception(f"Expected {type_}, got {tok.type}")
+            raise self.error(f"Expected {type_}, got {tok.type}", tok)
+
+    def error(self, message, tok):
+        return Exception(f"{message} at {tok.location()}")
     
     def block(self):
         self.expect(TokenType.LBRACE)
@@ -102,18 +146,18 @@ class Parser:
         tok = self.peek()
 
         if tok.type == TokenType.ELSEIF:
-            raise Exception("Unexpected 'else' without matching 'if'")
+            raise self.error("Unexpected 'else' without matching 'if'", tok)
 
         if tok.type == TokenType.LET:
             self.advance()
 
             name_tok = self.advance()
             if name_tok.type != TokenType.IDENT:
-                raise Exception("Expected identifier after 'let'")
+                raise self.error("Expected identifier after 'let'", name_tok)
 
             eq = self.advance()
             if eq.type != TokenType.EQUAL:
-                raise Exception("Expected '=' after identifier")
+                raise self.error("Expected '=' after identifier", eq)
 
             value = self.expression()
             return LetStmt(name_tok.value, value)
@@ -156,6 +200,12 @@ class Parser:
 
         if tok.type == TokenType.FN:
             return self.function_def()
+
+        # `memo` is only a modifier in front of fn; elsewhere it is
+        # an ordinary name
+        if tok.type == TokenType.IDENT and tok.value == "memo" and self.peek_next().type == TokenType.FN:
+            self.advance()  # memo
+            return self.function_def(memo=True)
         
         if tok.type == TokenType.RETURN:
             self.advance()
@@ -179,9 +229,22 @@ class Parser:
 
     def primary(self):
         tok = self.peek()
+        type_ = tok.type
+
+        # --- Base expression (most common first) ---
+        if type_ == TokenType.IDENT and tok.value != "range":
+            self.advance()
+            expr = Var(tok.value)
+
+        elif type_ == TokenType.NUMBER:
+            self.advance()
+            expr = Number(tok.value)
 
-        # --- Base expression ---
-        if tok.type == TokenType.LBRACKET:
+        elif type_ == TokenType.STRING:
+            self.advance()
+            expr = String(tok.value)
+
+        elif type_ == TokenType.LBRACKET:
             self.advance()
             elements = []
 
@@ -194,7 +257,8 @@ class Parser:
             self.expect(TokenType.RBRACKET)
             expr = ArrayLiteral(elements)
 
-        elif tok.type == TokenType.IDENT and tok.value == "range":
+        elif type_ == TokenType.IDENT:
+            # range(start, end[, step])
             self.advance()
             self.expect(TokenType.LPAREN)
 
@@ -210,34 +274,25 @@ class Parser:
             self.expect(TokenType.RPAREN)
             expr = RangeExpr(start, end, step)
 
-        elif tok.type == TokenType.TRUE:
+        elif type_ == TokenType.TRUE:
             self.advance()
             expr = Boolean(True)
 
-        elif tok.type == TokenType.FALSE:
+        elif type_ == TokenType.FALSE:
             self.advance()
             expr = Boolean(False)
 
-        elif tok.type == TokenType.IDENT:
-            self.advance()
-            expr = Var(tok.value)
-
-        elif tok.type == TokenType.NUMBER:
-            self.advance()
-            expr = Number(tok.value)
-
-        elif tok.type == TokenType.STRING:
-            self.advance()
-            expr = String(tok.value)
-
-        elif tok.type == TokenType.LPAREN:
+        elif type_ == TokenType.LPAREN:
             self.advance()
             expr = self.expression()
             self.expect(TokenType.RPAREN)
 
         else:
-            raise Exception(f"Invalid expression starting with {tok.type}")
+            raise self.error(f"Invalid expression starting with {tok.type}", tok)
 
+        return self.postfix(expr)
+
+    def postfix(self, expr):
         # --- Postfix operations: indexing + calls ---
         while True:
             # Indexing: a[expr]
@@ -257,7 +312,7 @@ class Parser:
 
         return expr
 
-    def function_def(self):
+    def function_def(self, memo=False):
         self.advance()  # fn
         name = self.advance().value  # function name
 
@@ -273,7 +328,7 @@ class Parser:
         self.expect(TokenType.RPAREN)
         body = self.block()
 
-        return FunctionDef(name, params, body)
+        return FunctionDef(name, params, body, memo)
 
     def call_expression(self):
         name = self.advance().value
@@ -289,72 +344,62 @@ class Parser:
         self.expect(TokenType.RPAREN)
         return CallExpr(name, args)
 
-    def or_expr(self):
-        left = self.and_expr()
+    def expression(self):
+        """
+        Operator-precedence (Pratt) parsing with an explicit stack.
+
+        The stack holds what is still waiting for its right-hand side:
+        prefix operators, open parentheses and binary operators with
+        their left operand. Nesting depth costs list entries, not
+        Python frames, so deep generated expressions cannot hit the
+        recursion limit.
+        """
+        stack = []
+
+        while True:
+            # --- Operand position: prefixes and "(" stack up ---
+            tok = self.peek()
+            type_ = tok.type
+
+            if type_ in PREFIX_OPS:
+                self.advance()
+                stack.append((PREFIX, type_))
+                continue
+
+            if type_ == TokenType.LPAREN:
+                self.advance()
+                stack.append((GROUP,))
+                continue
 
-        while self.peek().type in (TokenType.OROR, TokenType.OR):
-            op = self.advance().type
-            right = self.and_expr()
-            left = Binary(left, op, right)
+            left = self.primary()
 
-        return left
+            # --- Operator position: reduce while the stack binds tighter ---
+            while True:
+                type_ = self.peek().type
+                power = BINARY_POWER.get(type_)
 
-    def and_expr(self):
-        left = self.comparison()
+                while stack:
+                    top = stack[-1]
+                    kind = top[0]
 
-        while self.peek().type in (TokenType.ANDAND, TokenType.AND):
-            op = self.advance().type
-            right = self.comparison()
-            left = Binary(left, op, right)
+                    if kind == PREFIX:
+                        left = PREFIX_OPS[top[1]](left)
+                    elif kind == BINARY and (power is None or top[3] >= power):
+                        left = Binary(top[1], top[2], left)
+                    else:
+                        break
 
-        return left
+                    stack.pop()
 
-    def expression(self):
-        return self.or_expr()
-    
-    def comparison(self):
-        left = self.term()
-
-        while self.peek().type in (
-            TokenType.GT,
-            TokenType.LT,
-            TokenType.GTE,
-            TokenType.LTE,
-            TokenType.EQEQ,
-            TokenType.NOTEQ,
-        ):
-            op = self.advance().type
-            right = self.term()
-            left = Binary(left, op, right)
-
-        return left
-    
-    def term(self):
-        left = self.factor()
+                if power is not None:
+                    self.advance()
+                    stack.append((BINARY, left, type_, power))
+                    break
 
-        while self.peek().type in (TokenType.PLUS, TokenType.MINUS):
-            op = self.advance().type
-            right = self.factor()
-            left = Binary(left, op, right)
+                if not stack:
+                    return left
 
-        return left
-    
-    def unary(self):
-        if self.peek().type == TokenType.NOT:
-            self.advance()
-            return Not(self.unary())
-
-        if self.peek().type == TokenType.MINUS:
-            op = self.advance().type
-            expr = self.unary()
-            return Unary(op, expr)
-
-        return self.primary()
-
-    def factor(self):
-        left = self.unary()
-        while self.peek().type in (TokenType.STAR, TokenType.SLASH):
-            op = self.advance().type
-            right = self.unary()
-            left = Binary(left, op, right)
-        return left
+                # Only an open "(" can be left on top here
+                self.expect(TokenType.RPAREN)
+                stack.pop()
+                left = self.postfix(left)
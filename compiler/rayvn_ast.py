@@ -6,6 +6,10 @@ Each class represents one syntactic construct in the language.
 
 The parser produces instances of these classes.
 The compiler / interpreter consumes them.
+
+Nodes use __slots__ (no per-instance __dict__): generated programs
+produce millions of them. Each __slots__ lists the fields in
+constructor order, which flat_ast relies on to rebuild nodes.
 """
 
 
@@ -20,6 +24,8 @@ class Program:
     Represents an entire Rayvn program.
     Contains a list of top-level statements.
     """
+    __slots__ = ("statements",)
+
     def __init__(self, statements):
         self.statements = statements
 
@@ -35,6 +41,8 @@ class LetStmt:
     Example:
         let x = 5
     """
+    __slots__ = ("name", "value")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
@@ -47,6 +55,8 @@ class AssignStmt:
     Example:
         x = x + 1
     """
+    __slots__ = ("name", "value")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
@@ -59,6 +69,8 @@ class PrintStmt:
     Example:
         log x
     """
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
 
@@ -70,6 +82,8 @@ class ExprStmt:
     Example:
         add(1, 2)
     """
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
 
@@ -81,6 +95,8 @@ class ReturnStmt:
     Example:
         return x + 1
     """
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -92,7 +108,7 @@ class BreakStmt:
     Example:
         break
     """
-    pass
+    __slots__ = ()
 
 
 class ContinueStmt:
@@ -102,7 +118,7 @@ class ContinueStmt:
     Example:
         continue
     """
-    pass
+    __slots__ = ()
 
 
 # =========================
@@ -116,6 +132,8 @@ class IfChain:
     branches: list of (condition, body) tuples
     else_body: optional list of statements
     """
+    __slots__ = ("branches", "else_body")
+
     def __init__(self, branches, else_body=None):
         self.branches = branches
         self.else_body = else_body
@@ -128,6 +146,8 @@ class WhileStmt:
     Example:
         while x < 10 { ... }
     """
+    __slots__ = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -140,6 +160,8 @@ class ForInLoop:
     Example:
         for i in range(0, 10) { ... }
     """
+    __slots__ = ("var", "iterable", "body")
+
     def __init__(self, var, iterable, body):
         self.var = var
         self.iterable = iterable
@@ -156,11 +178,18 @@ class FunctionDef:
 
     Example:
         fn add(a, b) { return a + b }
+        memo fn fib(n) { ... }
+
+    memo asks for the function's results to be cached by argument
+    (see ByteCode/memo.py).
     """
-    def __init__(self, name, params, body):
+    __slots__ = ("name", "params", "body", "memo")
+
+    def __init__(self, name, params, body, memo=False):
         self.name = name
         self.params = params
         self.body = body
+        self.memo = memo
 
 
 class CallExpr:
@@ -170,6 +199,8 @@ class CallExpr:
     Example:
         add(1, 2)
     """
+    __slots__ = ("name", "args")
+
     def __init__(self, name, args):
         self.name = name
         self.args = args
@@ -186,6 +217,8 @@ class Number:
     Example:
         42
     """
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -197,6 +230,8 @@ class Boolean:
     Example:
         true / false
     """
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -208,6 +243,8 @@ class String:
     Example:
         "hello"
     """
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -219,6 +256,8 @@ class Var:
     Example:
         x
     """
+    __slots__ = ("name",)
+
     def __init__(self, name):
         self.name = name
 
@@ -230,6 +269,8 @@ class Unary:
     Example:
         -x
     """
+    __slots__ = ("op", "expr")
+
     def __init__(self, op, expr):
         self.op = op
         self.expr = expr
@@ -242,6 +283,8 @@ class Not:
     Example:
         not x
     """
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
 
@@ -254,6 +297,8 @@ class Binary:
         x + y
         a > b
     """
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -267,6 +312,8 @@ class Logical:
     Example:
         x and y
     """
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -285,6 +332,8 @@ class RangeExpr:
         range(0, 10)
         range(10, 0, -1)
     """
+    __slots__ = ("start", "end", "step")
+
     def __init__(self, start, end, step=None):
         self.start = start
         self.end = end
@@ -302,6 +351,8 @@ class ArrayLiteral:
     Example:
         [1, 2, 3]
     """
+    __slots__ = ("elements",)
+
     def __init__(self, elements):
         self.elements = elements
 
@@ -313,6 +364,8 @@ class IndexExpr:
     Example:
         a[0]
     """
+    __slots__ = ("array", "index")
+
     def __init__(self, array, index):
         self.array = array
         self.index = index
@@ -325,6 +378,8 @@ class IndexAssign:
     Example:
         a[1] = 42
     """
+    __slots__ = ("array", "index", "value")
+
     def __init__(self, array, index, value):
         self.array = array
         self.index = index
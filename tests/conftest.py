@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAYVN = os.path.join(ROOT, "rayvn")
+
+BACKENDS = ("stack", "register", "closure", "python")
+
+
+@pytest.fixture
+def rayvn(tmp_path):
+    """
+    Run a Rayvn source string through the launcher; returns the
+    CompletedProcess (stdout / stderr as text).
+    """
+    def run(source, *options):
+        path = tmp_path / "program.rv"
+        path.write_text(source)
+        return subprocess.run(
+            [sys.executable, RAYVN, "--no-cache", *options, str(path)],
+            capture_output=True, text=True, timeout=120,
+        )
+    return run
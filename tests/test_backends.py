@@ -0,0 +1,75 @@
+import pytest
+
+from conftest import BACKENDS
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_index_assign_in_for_in(rayvn, backend):
+    # the for-in iterator stays on the stack under the loop body
+    source = (
+        "let ga = [1, 2, 3]\n"
+        'for c in "hey" { ga[1] = 5 }\n'
+        "log ga\n"
+        "fn bump(a) {\n"
+        "  for x in [1, 2] { a[0] = a[0] + x }\n"
+        "  return a\n"
+        "}\n"
+        "log bump([10])\n"
+    )
+    result = rayvn(source, "--backend", backend)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split("\n") == ["[1, 5, 3]", "[13]", ""]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("source, reason", [
+    ("memo fn f(n) { log n\n return n }\nlog f(1)\n", "logs"),
+    ("let g = 2\nmemo fn f(n) { return n + g }\nlog f(1)\n", "reads global g"),
+    (
+        "fn h(a) { a[0] = 1\n return 0 }\nmemo fn f(n) { return h([n]) }\nlog f(1)\n",
+        "calls h(), which assigns into an array",
+    ),
+    # Settled over the whole program, and before dead code is dropped
+    ("memo fn f(n) { return h(n) }\nfn h(n) { log n\n return n }\nlog f(1)\n", "calls h(), which logs"),
+    ("memo fn f(n) { return n + g }\nlet g = 2\nlog f(1)\n", "reads global g"),
+    ("memo fn f(n) { if false { log n } return n }\nlog f(1)\n", "logs"),
+])
+def test_impure_memo_fn_is_rejected(rayvn, backend, source, reason):
+    for options in ((), ("--flat-ast",)):
+        result = rayvn(source, "--backend", backend, *options)
+        assert result.returncode != 0
+        assert result.stdout == ""
+        assert f"memo fn f() is not pure: it {reason}" in result.stderr
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_pure_memo_fn_runs(rayvn, backend):
+    source = "memo fn fib(n) { if n < 2 { return n } return fib(n - 1) + fib(n - 2) }\nlog fib(20)\n"
+    result = rayvn(source, "--backend", backend)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "6765\n"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_range_longer_than_maxsize(rayvn, backend):
+    source = (
+        "let big = 100000000000\n"
+        "for i in range(0, big * big) { if i == 3 { break } log i }\n"
+        "for i in range(10, 0, -3) { log i }\n"
+    )
+    result = rayvn(source, "--backend", backend)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["0", "1", "2", "10", "7", "4", "1"]
+
+
+def test_only_memo_fn_is_memoized(rayvn):
+    source = (
+        "fn fib(n) { if n < 2 { return n } return fib(n - 1) + fib(n - 2) }\n"
+        "memo fn fib2(n) { if n < 2 { return n } return fib2(n - 1) + fib2(n - 2) }\n"
+        "log fib(15) + fib2(15)\n"
+    )
+    result = rayvn(source, "--memo-stats")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "1220\n"
+    memoized = [line.split()[0] for line in result.stderr.splitlines()[1:]]
+    assert memoized == ["fib2"]
@@ -0,0 +1,35 @@
+import pytest
+
+
+DEEP_EXPRESSIONS = [
+    ("log " + " + ".join(["a"] * 20000), "20000"),
+    ("log " + "(" * 3000 + "a" + ")" * 3000, "1"),
+    ("log " + "-" * 3000 + "a", "1"),
+    ("log " + " and ".join(["a"] * 5000), "1"),
+    ("log " + " + ".join(["1"] * 20000), "20000"),
+]
+
+
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+@pytest.mark.parametrize("source, expected", DEEP_EXPRESSIONS)
+def test_deep_expressions(rayvn, source, expected, level):
+    # folding walks expressions without recursing
+    result = rayvn("let a = 1\n" + source + "\n", "-O", level)
+    assert result.returncode == 0, result.stderr[-500:]
+    assert result.stdout == expected + "\n"
+
+
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+@pytest.mark.parametrize("source, error", [
+    ("if false { nope(1) }\nlog 1\n", "Undefined function: nope"),
+    ("log false and nope()\n", "Undefined function: nope"),
+    ("fn f(a) { return a }\nif false { log f(1, 2) }\nlog 1\n", "f() takes 1 argument but 2 were given"),
+    ("log g(2)\nfn g(a, b) { return a }\n", "g() takes 2 arguments but 1 was given"),
+])
+def test_bad_call_in_dead_code(rayvn, source, error, level):
+    # calls are checked before the optimizer drops any
+    for options in ((), ("--flat-ast",)):
+        result = rayvn(source, "-O", level, *options)
+        assert result.returncode != 0
+        assert result.stdout == ""
+        assert error in result.stderr
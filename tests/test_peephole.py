@@ -0,0 +1,154 @@
+import pytest
+
+
+def peephole_report(stderr):
+    return next(line for line in stderr.splitlines() if "peephole:" in line)
+
+
+JUMP_CHAINS = """
+let total = 0
+for i in range(0, 20) {
+  if i < 10 {
+    if i < 5 {
+      total = total + 100
+    } else {
+      total = total + 10
+    }
+  } else {
+    if i > 15 { continue }
+    total = total + 1
+  }
+}
+log total
+let a = 1
+let b = 0
+log a and b or 7
+log b or a and 0
+log (a or b) and (b or 5)
+"""
+
+NOT_JUMP = """
+let done = false
+let n = 0
+while not done {
+  n = n + 1
+  if not (n < 3) { done = true }
+}
+log n
+"""
+
+STORE_LOAD = """
+let n = 1
+n = n + 1
+log n
+fn f(a) {
+  let b = a * 2
+  return b
+}
+log f(n)
+"""
+
+
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+@pytest.mark.parametrize("source, expected, rewrites", [
+    (JUMP_CHAINS, "556\n7\n0\n5\n", ["threaded", "inverted_jump"]),
+    (NOT_JUMP, "3\n", ["not_jump"]),
+    (STORE_LOAD, "2\n4\n", ["store_load"]),
+])
+def test_rewrites_keep_behaviour(rayvn, source, expected, rewrites, level):
+    result = rayvn(source, "-O", level, "--opt-report")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == expected
+
+    if level != "0":
+        report = peephole_report(result.stderr)
+        for name in rewrites:
+            assert f"{name}=" in report
+
+
+STORE_THEN_JUMP_TARGET = """
+let flag = false
+let x = 0
+if flag { x = 5 }
+log x
+let y = 1
+while y < 40 { y = y * 3 }
+log y
+let z = 2
+if flag { z = 3 } else { z = 4 }
+log z
+"""
+
+
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+def test_no_dup_for_load_at_jump_target(rayvn, level):
+    # Each LOAD follows a STORE but is also where a jump lands, so the
+    # value the STORE took is not on the stack there
+    result = rayvn(STORE_THEN_JUMP_TARGET, "-O", level, "--opt-report")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "0\n81\n4\n"
+    if level != "0":
+        assert "store_load=" not in peephole_report(result.stderr)
+
+
+LOOP_EXITS = """
+let done = false
+let n = 0
+while not done {
+  n = n + 1
+  if n == 5000 { done = true }
+}
+log n
+let found = 0
+for i in range(0, 100000) {
+  if i * i > 4000000 {
+    found = i
+    break
+  }
+}
+log found
+let k = 0
+while true {
+  k = k + 1
+  if k < 6000 { continue }
+  break
+}
+k = k + 1
+log k
+
+let mode = 1
+let m = 0
+if mode == 1 {
+  while not (m == 5000) { m = m + 1 }
+} else {
+  m = 0 - 1
+}
+log m
+let s = 0
+if mode == 1 {
+  for j in range(0, 5000) {
+    if j > 2500 { break }
+    s = s + j
+  }
+} else {
+  log "mode is not 1"
+}
+log s
+"""
+
+
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+def test_loop_exits_after_rewrites(rayvn, level):
+    # The loop table is relocated with the code: each loop tiers up
+    # mid-run and must leave to where the bytecode loop would, which
+    # for a loop in an if is past the else, not after its backedge
+    result = rayvn(LOOP_EXITS, "-O", level, "--tier-stats")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "5000\n2001\n6001\n5000\n3126250\n"
+    for name in ("loop 0 (while)", "loop 1 (range)", "loop 2 (while)",
+                 "loop 3 (while)", "loop 4 (range)"):
+        assert name in result.stderr
+
+    result = rayvn(LOOP_EXITS, "-O", level, "--no-tier")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "5000\n2001\n6001\n5000\n3126250\n"
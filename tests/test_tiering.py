@@ -0,0 +1,116 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import RAYVN
+
+
+@pytest.mark.parametrize("loop, name", [
+    ("for i in range(0, 5000) { let x = i }", "loop 0 (range)"),
+    ("let n = 0\n  while n < 5000 { n = n + 1 }", "loop 0 (while)"),
+])
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+def test_osr_loop_resumes_after_if(rayvn, loop, name, level):
+    # The loop's exit is the end of the if, and the end of the program;
+    # threading used to leave it pointing into the else branch
+    source = (
+        "let mode = 1\n"
+        "if mode == 1 {\n"
+        f"  {loop}\n"
+        "} else {\n"
+        '  log "mode is not 1"\n'
+        "}\n"
+    )
+    result = rayvn(source, "-O", level, "--tier-stats")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
+    assert name in result.stderr
+
+
+def test_deep_recursion(rayvn):
+    # Deeper than tier 1 can recurse in Python: the rest runs as bytecode
+    source = (
+        "fn depth(n) { if n == 0 { return 0 } return 1 + depth(n - 1) }\n"
+        "fn odd(n) { if n == 0 { return false } return even(n - 1) }\n"
+        "fn even(n) { if n == 0 { return true } let r = odd(n - 1)\n return r }\n"
+        "log depth(400000)\n"
+        "log even(300001)\n"
+    )
+    for options in ((), ("--no-tier",)):
+        result = rayvn(source, *options)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == "400000\nFalse\n"
+
+
+LOOPS_ENDING_IN_IF = """
+let n = 0
+let hits = 0
+while n < 5000 {
+  n = n + 1
+  if n == 3 { hits = hits + 1 }
+}
+log hits
+
+let m = 0
+while true {
+  m = m + 1
+  if m == 5000 { break }
+}
+log m
+
+let total = 0
+for i in range(0, 3) {
+  let j = 0
+  while j < 2000 {
+    j = j + 1
+    if j == 5 { total = total + 1 }
+  }
+}
+log total
+
+fn count(k) {
+  let i = 0
+  let s = 0
+  while i < k {
+    i = i + 1
+    if i < 0 { s = s + 1 }
+  }
+  return s
+}
+log count(3000)
+"""
+
+
+@pytest.mark.parametrize("level", ["0", "1", "2"])
+def test_conditional_backedges_count(rayvn, level):
+    # At -O2 these loops' backedges are threaded into their last test
+    result = rayvn(LOOPS_ENDING_IN_IF, "-O", level, "--tier-stats")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "1\n5000\n3\n0\n"
+    promoted = [line.split("  ")[0] for line in result.stderr.splitlines()]
+    for name in ("loop 0 (while)", "loop 1 (while)", "loop 3 (while)", "count"):
+        assert name in promoted
+
+
+def test_cache_keeps_ast_mode(tmp_path):
+    # Flat bytecode keeps unused functions; tier 1 must not reparse a
+    # flat cache entry as a tree and find it doesn't match
+    path = tmp_path / "hot.rv"
+    path.write_text(
+        "fn unused(x) { return x }\n"
+        "fn sq(x) { return x * x }\n"
+        "let s = 0\n"
+        "for i in range(0, 3000) { s = s + sq(i) }\n"
+        "log s\n"
+    )
+
+    for options in (["--flat-ast"], [], ["--flat-ast"]):
+        result = subprocess.run(
+            [sys.executable, RAYVN, "--tier-stats", *options, str(path)],
+            capture_output=True, text=True, timeout=120,
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == "8995500500\n"
+        assert "sq " in result.stderr
+        assert "unavailable" not in result.stderr